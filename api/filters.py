@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.filters import SearchFilter
+
+from catalog.search import INDEXED_FIELDS, search_books
+
+
+class BookSearchFilter(SearchFilter):
+    """SearchFilter backed by the catalog full-text index instead of icontains scans.
+
+    The view's ``search_fields`` pick which indexed columns are matched; each must be
+    one of ``catalog.search.INDEXED_FIELDS`` (``category__name`` names the category
+    column), and the ``^``/``=``/``@``/``$`` lookup prefixes do not apply. Results are
+    ranked by relevance unless the client asks for an explicit ordering.
+    """
+
+    def get_indexed_fields(self, view, request) -> list[str]:
+        fields = []
+        for field in self.get_search_fields(view, request) or ():
+            field = field.lstrip("^=@$")
+            field = "category" if field == "category__name" else field
+            if field not in INDEXED_FIELDS:
+                raise ImproperlyConfigured(f"{type(view).__name__}.search_fields: {field!r} is not indexed.")
+            fields.append(field)
+        return fields
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        fields = self.get_indexed_fields(view, request)
+        if not terms or not fields:
+            return queryset
+        order_by_rank = not request.query_params.get("ordering")
+        return search_books(queryset, " ".join(terms), order_by_rank=order_by_rank, fields=fields)
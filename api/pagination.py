@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from library_management.pagination import InvalidCursor, paginate_keyset
+
+
+class PageOrCursorPagination(PageNumberPagination):
+    """Page-number pagination with an opt-in keyset cursor mode.
+
+    Viewsets that declare ``keyset_ordering`` switch to cursor mode when the request
+    carries a ``cursor`` parameter (send it empty to fetch the first page). Cursor
+    pages skip the COUNT(*) and cost the same at any depth; ``ordering`` and search
+    ranking are ignored in that mode because the cursor fixes the sort order.
+    """
+
+    cursor_query_param = "cursor"
+    keyset_page = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, "keyset_ordering", None)
+        if not ordering or self.cursor_query_param not in request.query_params:
+            self.keyset_page = None
+            return super().paginate_queryset(queryset, request, view=view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        try:
+            self.keyset_page = paginate_keyset(
+                queryset,
+                ordering,
+                page_size,
+                request.query_params.get(self.cursor_query_param) or None,
+            )
+        except InvalidCursor:
+            raise NotFound("Invalid cursor.")
+        return list(self.keyset_page)
+
+    def get_paginated_response(self, data):
+        if self.keyset_page is None:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "next": self._cursor_link(self.keyset_page.next_cursor),
+                "previous": self._cursor_link(self.keyset_page.previous_cursor),
+                "results": data,
+            }
+        )
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        if getattr(view, "keyset_ordering", None):
+            parameters.append(
+                {
+                    "name": self.cursor_query_param,
+                    "required": False,
+                    "in": "query",
+                    "description": "Keyset cursor; pass it empty to start cursor pagination.",
+                    "schema": {"type": "string"},
+                }
+            )
+        return parameters
+
+    def _cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
@@ -6,27 +6,32 @@ from accounts.models import MemberProfile, User
 from catalog.models import Book, BookCopy, Category
 from circulation.models import Fine, Loan, Reservation
 
+from .shaping import Expandable, ShapedSerializerMixin
 
-class CategorySerializer(serializers.ModelSerializer):
+
+class CategorySerializer(ShapedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ("id", "name", "slug", "description")
 
 
-class BookCopySerializer(serializers.ModelSerializer):
+class BookCopySerializer(ShapedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = BookCopy
         fields = ("id", "barcode", "status", "location", "acquired_at")
 
 
-class BookSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
+class BookSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        "category": Expandable(CategorySerializer),
+        "copies": Expandable(BookCopySerializer, many=True, ordering=("barcode",)),
+    }
+
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(), source="category", write_only=True
     )
     available_copies = serializers.IntegerField(read_only=True)
     total_copies = serializers.IntegerField(read_only=True)
-    copies = BookCopySerializer(many=True, read_only=True)
 
     class Meta:
         model = Book
@@ -49,15 +54,18 @@ class BookSerializer(serializers.ModelSerializer):
         )
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ("id", "username", "email", "first_name", "last_name", "role")
 
 
-class MemberProfileSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    preferred_categories = CategorySerializer(many=True, read_only=True)
+class MemberProfileSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        "user": Expandable(UserSerializer),
+        "preferred_categories": Expandable(CategorySerializer, many=True),
+    }
+
     preferred_category_ids = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(),
         many=True,
@@ -81,12 +89,15 @@ class MemberProfileSerializer(serializers.ModelSerializer):
         )
 
 
-class LoanSerializer(serializers.ModelSerializer):
-    borrower = UserSerializer(read_only=True)
+class LoanSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        "copy": Expandable(BookCopySerializer),
+        "borrower": Expandable(UserSerializer),
+    }
+
     borrower_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), source="borrower", write_only=True
     )
-    copy = BookCopySerializer(read_only=True)
     copy_id = serializers.PrimaryKeyRelatedField(
         queryset=BookCopy.objects.all(), source="copy", write_only=True
     )
@@ -107,13 +118,24 @@ class LoanSerializer(serializers.ModelSerializer):
             "notes",
         )
 
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        copy, borrower = attrs.get("copy"), attrs.get("borrower")
+        if self.instance is None and copy and borrower and Loan.is_held_for_other(copy, borrower.pk):
+            raise serializers.ValidationError({"copy_id": [Loan.HELD_FOR_OTHER_MESSAGE]})
+        return attrs
+
+
+class ReservationSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        "book": Expandable(BookSerializer),
+        "member": Expandable(UserSerializer),
+        "copy": Expandable(BookCopySerializer, default=False),
+    }
 
-class ReservationSerializer(serializers.ModelSerializer):
-    member = UserSerializer(read_only=True)
     member_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), source="member", write_only=True
     )
-    book = BookSerializer(read_only=True)
     book_id = serializers.PrimaryKeyRelatedField(
         queryset=Book.objects.all(), source="book", write_only=True
     )
@@ -131,15 +153,20 @@ class ReservationSerializer(serializers.ModelSerializer):
             "expires_at",
             "fulfilled_at",
             "position",
+            "copy",
         )
+        read_only_fields = ("copy",)
+
 
+class FineSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        "loan": Expandable(LoanSerializer),
+        "member": Expandable(UserSerializer),
+    }
 
-class FineSerializer(serializers.ModelSerializer):
-    member = UserSerializer(read_only=True)
     member_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), source="member", write_only=True
     )
-    loan = LoanSerializer(read_only=True)
     loan_id = serializers.PrimaryKeyRelatedField(
         queryset=Loan.objects.all(), source="loan", write_only=True
     )
@@ -158,3 +185,27 @@ class FineSerializer(serializers.ModelSerializer):
             "paid_at",
             "notes",
         )
+
+
+class BatchReturnSerializer(serializers.Serializer):
+    barcodes = serializers.ListField(
+        child=serializers.CharField(max_length=64), allow_empty=False, max_length=200
+    )
+    returned_at = serializers.DateTimeField(required=False)
+
+
+class BatchCheckoutSerializer(serializers.Serializer):
+    borrower_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source="borrower")
+    barcodes = serializers.ListField(
+        child=serializers.CharField(max_length=64), allow_empty=False, max_length=200
+    )
+    due_at = serializers.DateTimeField(required=False)
+
+
+class ScanResultSerializer(serializers.Serializer):
+    barcode = serializers.CharField()
+    status = serializers.CharField()
+    ok = serializers.BooleanField()
+    message = serializers.CharField()
+    loan_id = serializers.IntegerField(allow_null=True)
+    reservation_id = serializers.IntegerField(allow_null=True)
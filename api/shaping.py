@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+from django.db.models import Prefetch, QuerySet
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+# A parsed ``?fields=`` or ``?expand=`` value: every name maps to the selection below
+# it, or to None when the client did not narrow that branch any further.
+Selection = dict
+
+
+@dataclass(frozen=True)
+class Expandable:
+    """A relation that a serializer can either embed or collapse to primary keys.
+
+    ``default`` relations are embedded when a request has no ``?expand=`` parameter,
+    which keeps the historical response shape for clients that never send one.
+    """
+
+    serializer: type
+    many: bool = False
+    default: bool = True
+    source: Optional[str] = None
+    ordering: tuple[str, ...] = ()
+
+
+def parse_selection(value: Optional[str]) -> Optional[Selection]:
+    """Turn ``"id,book.title,book.category"`` into ``{"id": None, "book": {...}}``."""
+
+    if value is None:
+        return None
+    selection: Selection = {}
+    for path in value.split(","):
+        names = [name.strip() for name in path.split(".")]
+        if not all(names):
+            continue
+        node = selection
+        for name in names[:-1]:
+            child = node.get(name)
+            if child is None:
+                child = node[name] = {}
+            node = child
+        node.setdefault(names[-1], None)
+    return selection
+
+
+def _child(selection: Optional[Selection], name: str) -> Optional[Selection]:
+    return selection.get(name) if selection else None
+
+
+def is_expanded(name: str, spec: Expandable, fields: Optional[Selection], expand: Optional[Selection]) -> bool:
+    # Asking for fields inside a relation (``fields=book.title``) implies expanding it.
+    if isinstance(_child(fields, name), dict):
+        return True
+    if expand is None:
+        return spec.default
+    return name in expand
+
+
+def _expand_below(name: str, expand: Optional[Selection]) -> Optional[Selection]:
+    # Without ?expand= every level keeps its defaults; with it, only the named paths
+    # are embedded, so ``expand=book`` leaves the book's own relations collapsed.
+    if expand is None:
+        return None
+    return expand.get(name) or {}
+
+
+class ShapedSerializerMixin:
+    """Serializer mixin that honours a ``fields`` selection and ``expand`` paths.
+
+    Relations listed in ``expandable_fields`` render as nested objects when expanded
+    and as primary keys otherwise. Both selections only narrow the output; write-only
+    fields are left alone so the serializer still validates input the same way.
+    """
+
+    expandable_fields: dict[str, Expandable] = {}
+
+    def __init__(self, *args, fields: Optional[Selection] = None, expand: Optional[Selection] = None, **kwargs):
+        self.selected_fields = fields
+        self.expand = expand
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name, spec in self.expandable_fields.items():
+            fields[name] = self._relation_field(name, spec)
+        if self.selected_fields is not None:
+            for name in list(fields):
+                if name not in self.selected_fields and not fields[name].write_only:
+                    del fields[name]
+        return fields
+
+    def _relation_field(self, name: str, spec: Expandable):
+        kwargs = {"many": spec.many, "read_only": True}
+        if spec.source and spec.source != name:
+            kwargs["source"] = spec.source
+        if is_expanded(name, spec, self.selected_fields, self.expand):
+            return spec.serializer(
+                fields=_child(self.selected_fields, name),
+                expand=_expand_below(name, self.expand),
+                **kwargs,
+            )
+        return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+def shape_queryset(
+    queryset: QuerySet,
+    serializer_class: type,
+    fields: Optional[Selection] = None,
+    expand: Optional[Selection] = None,
+) -> QuerySet:
+    """Join and prefetch exactly the relations ``serializer_class`` will render.
+
+    Embedded foreign keys are joined with select_related, embedded to-many relations
+    get one ordered prefetch each, collapsed to-many relations prefetch primary keys
+    only, and collapsed foreign keys cost nothing because the id is on the row.
+    """
+
+    select: list[str] = []
+    prefetch: list[Prefetch] = []
+    _plan(queryset.model, serializer_class, fields, expand, "", select, prefetch)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def _plan(model, serializer_class, fields, expand, prefix, select, prefetch) -> None:
+    for name, spec in getattr(serializer_class, "expandable_fields", {}).items():
+        if fields is not None and name not in fields:
+            continue
+        source = spec.source or name
+        relation = model._meta.get_field(source)
+        related_model = relation.related_model
+        expanded = is_expanded(name, spec, fields, expand)
+        if not spec.many:
+            if expanded:
+                select.append(prefix + source)
+                _plan(
+                    related_model,
+                    spec.serializer,
+                    _child(fields, name),
+                    _expand_below(name, expand),
+                    f"{prefix}{source}__",
+                    select,
+                    prefetch,
+                )
+            continue
+
+        related = related_model._default_manager.all()
+        if spec.ordering:
+            related = related.order_by(*spec.ordering)
+        if expanded:
+            related = shape_queryset(related, spec.serializer, _child(fields, name), _expand_below(name, expand))
+        elif relation.one_to_many:
+            # The prefetch matches rows to parents through the foreign key column.
+            related = related.only("pk", relation.field.name)
+        else:
+            related = related.only("pk")
+        prefetch.append(Prefetch(prefix + source, queryset=related))
+
+
+def validate_selection(serializer_class: type, fields: Optional[Selection], expand: Optional[Selection]) -> None:
+    errors = {}
+    if fields is not None:
+        errors["fields"] = _unknown_fields(serializer_class, fields, "")
+    if expand is not None:
+        errors["expand"] = _unknown_expansions(serializer_class, expand, "")
+    errors = {param: messages for param, messages in errors.items() if messages}
+    if errors:
+        raise ValidationError(errors)
+
+
+def _unknown_fields(serializer_class: type, fields: Selection, prefix: str) -> list[str]:
+    expandable = getattr(serializer_class, "expandable_fields", {})
+    readable = {name for name, field in serializer_class().fields.items() if not field.write_only}
+    messages = []
+    for name, below in fields.items():
+        if name not in readable:
+            messages.append(f"Unknown field '{prefix}{name}'.")
+        elif below is not None:
+            if name not in expandable:
+                messages.append(f"Field '{prefix}{name}' has no nested fields.")
+            else:
+                messages += _unknown_fields(expandable[name].serializer, below, f"{prefix}{name}.")
+    return messages
+
+
+def _unknown_expansions(serializer_class: type, expand: Selection, prefix: str) -> list[str]:
+    expandable = getattr(serializer_class, "expandable_fields", {})
+    messages = []
+    for name, below in expand.items():
+        if name not in expandable:
+            messages.append(f"'{prefix}{name}' cannot be expanded.")
+        elif below is not None:
+            messages += _unknown_expansions(expandable[name].serializer, below, f"{prefix}{name}.")
+    return messages
+
+
+class ShapedResponseMixin:
+    """ViewSet mixin that reads ``?fields=`` and ``?expand=`` on safe requests.
+
+    The parsed selection is handed both to the serializer, which trims the payload,
+    and to ``shape_queryset``, so the queries follow the shape the client asked for.
+    """
+
+    fields_query_param = "fields"
+    expand_query_param = "expand"
+
+    def get_selection(self) -> tuple[Optional[Selection], Optional[Selection]]:
+        if not hasattr(self, "_selection"):
+            request = getattr(self, "request", None)
+            if request is None or request.method not in SAFE_METHODS:
+                self._selection = (None, None)
+            else:
+                fields = parse_selection(request.query_params.get(self.fields_query_param))
+                expand = parse_selection(request.query_params.get(self.expand_query_param))
+                validate_selection(self.get_serializer_class(), fields, expand)
+                self._selection = (fields, expand)
+        return self._selection
+
+    def get_queryset(self):
+        fields, expand = self.get_selection()
+        return shape_queryset(super().get_queryset(), self.get_serializer_class(), fields, expand)
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_selection()
+        kwargs.setdefault("fields", fields)
+        kwargs.setdefault("expand", expand)
+        return super().get_serializer(*args, **kwargs)
@@ -1,3 +1,366 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from catalog.models import Book, BookCopy, Category
+from circulation.models import Fine, Loan, Reservation
+
+from .pagination import PageOrCursorPagination
+
+
+# The profiler reloads its rules every few seconds, which would land in a budget at random.
+@override_settings(PROFILING_ENABLED=False)
+class QueryBudgetTestCase(TestCase):
+    """Pin the number of queries each API read takes.
+
+    The fixtures put several rows on every page, so a serializer field that goes back
+    to the database per row pushes the count past its budget.
+    """
+
+    BOOKS = 6
+    COPIES_PER_BOOK = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user("librarian", password="pw", role=User.Role.LIBRARIAN)
+        cls.member = User.objects.create_user("member", password="pw", role=User.Role.MEMBER)
+        cls.other = User.objects.create_user("other", password="pw", role=User.Role.MEMBER)
+        categories = [Category.objects.create(name=name) for name in ("Fiction", "Science", "History")]
+        cls.books = []
+        for index in range(cls.BOOKS):
+            book = Book.objects.create(
+                title=f"Book {index}",
+                author=f"Author {index % 2}",
+                isbn=f"978000000{index:04d}",
+                category=categories[index % len(categories)],
+            )
+            for number in range(cls.COPIES_PER_BOOK):
+                BookCopy.objects.create(book=book, barcode=f"B{index:03d}-{number}")
+            cls.books.append(book)
+
+        now = timezone.now()
+        for index, book in enumerate(cls.books):
+            borrower = cls.member if index % 2 else cls.other
+            loan = Loan.objects.create(
+                copy=book.copies.order_by("barcode").first(),
+                borrower=borrower,
+                issued_by=cls.librarian,
+                issued_at=now - timedelta(days=20),
+                due_at=now - timedelta(days=6),
+            )
+            Fine.objects.create(member=borrower, loan=loan, amount=Decimal("1.50"))
+            Reservation.objects.create(book=book, member=cls.member if index % 2 else cls.other)
+
+    def setUp(self):
+        # The throttles count requests in the cache; keep them from leaking between tests.
+        cache.clear()
+        self.client = APIClient()
+
+    def assertReadBudget(self, user, url, budget, params=None):
+        self.client.force_authenticate(user)
+        with self.assertNumQueries(budget):
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+
+class BookQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        # The ETag fingerprint, COUNT, the page of books with their category, and one
+        # prefetch of copies.
+        data = self.assertReadBudget(self.member, reverse("api:book-list"), 4)
+        self.assertEqual(data["count"], self.BOOKS)
+        first = data["results"][0]
+        self.assertEqual(first["category"]["name"], "Fiction")
+        self.assertEqual(len(first["copies"]), self.COPIES_PER_BOOK)
+        self.assertEqual(first["total_copies"], self.COPIES_PER_BOOK)
+        self.assertEqual(first["available_copies"], self.COPIES_PER_BOOK - 1)
+
+    def test_list_cursor(self):
+        data = self.assertReadBudget(self.member, reverse("api:book-list"), 3, {"cursor": ""})
+        self.assertEqual(len(data["results"]), self.BOOKS)
+
+    def test_list_filtered(self):
+        data = self.assertReadBudget(self.member, reverse("api:book-list"), 4, {"author": "Author 1"})
+        self.assertEqual(data["count"], self.BOOKS // 2)
+
+    def test_detail(self):
+        data = self.assertReadBudget(self.member, reverse("api:book-detail", args=[self.books[0].pk]), 3)
+        self.assertEqual([copy["barcode"] for copy in data["copies"]], ["B000-0", "B000-1", "B000-2"])
+
+
+class CursorPaginationTests(QueryBudgetTestCase):
+    @mock.patch.object(PageOrCursorPagination, "page_size", 4)
+    def test_walking_every_cursor_page(self):
+        self.client.force_authenticate(self.member)
+        expected = list(Book.objects.order_by("title", "id").values_list("pk", flat=True))
+        pages, url, params = [], reverse("api:book-list"), {"cursor": ""}
+
+        while url:
+            data = self.client.get(url, params).json()
+            pages.append([row["id"] for row in data["results"]])
+            url, params = data["next"], None
+
+        self.assertEqual([len(page) for page in pages], [4, 2])
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+    def test_malformed_cursor_is_a_404(self):
+        self.client.force_authenticate(self.librarian)
+
+        response = self.client.get(reverse("api:loan-list"), {"cursor": "bm90IGpzb24"})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": "Invalid cursor."})
+
+
+class LoanQueryBudgetTests(QueryBudgetTestCase):
+    def test_list_as_librarian(self):
+        data = self.assertReadBudget(self.librarian, reverse("api:loan-list"), 2)
+        self.assertEqual(data["count"], self.BOOKS)
+        self.assertEqual(data["results"][0]["borrower"]["username"], "other")
+
+    def test_list_as_member(self):
+        data = self.assertReadBudget(self.member, reverse("api:loan-list"), 2)
+        self.assertEqual({loan["borrower"]["username"] for loan in data["results"]}, {"member"})
+
+    def test_list_cursor(self):
+        self.assertReadBudget(self.librarian, reverse("api:loan-list"), 1, {"cursor": ""})
+
+    def test_detail(self):
+        loan = Loan.objects.filter(borrower=self.member).first()
+        data = self.assertReadBudget(self.member, reverse("api:loan-detail", args=[loan.pk]), 1)
+        self.assertEqual(data["copy"]["barcode"], loan.copy.barcode)
+
+
+class ReservationQueryBudgetTests(QueryBudgetTestCase):
+    def test_list_as_librarian(self):
+        # COUNT, reservations joined to book, category and member, and the books' copies.
+        data = self.assertReadBudget(self.librarian, reverse("api:reservation-list"), 3)
+        self.assertEqual(data["count"], self.BOOKS)
+        self.assertTrue(all(len(row["book"]["copies"]) == self.COPIES_PER_BOOK for row in data["results"]))
+
+    def test_list_as_member(self):
+        data = self.assertReadBudget(self.member, reverse("api:reservation-list"), 3)
+        self.assertEqual({row["member"]["username"] for row in data["results"]}, {"member"})
+
+    def test_detail(self):
+        reservation = Reservation.objects.filter(member=self.member).first()
+        data = self.assertReadBudget(self.member, reverse("api:reservation-detail", args=[reservation.pk]), 2)
+        self.assertEqual(data["book"]["category"]["id"], reservation.book.category_id)
+
+
+class FineQueryBudgetTests(QueryBudgetTestCase):
+    def test_list_as_librarian(self):
+        data = self.assertReadBudget(self.librarian, reverse("api:fine-list"), 2)
+        self.assertEqual(data["count"], self.BOOKS)
+        self.assertTrue(all(row["loan"]["borrower"]["id"] == row["member"]["id"] for row in data["results"]))
+
+    def test_list_as_member(self):
+        data = self.assertReadBudget(self.member, reverse("api:fine-list"), 2)
+        self.assertEqual({row["member"]["username"] for row in data["results"]}, {"member"})
+
+    def test_list_cursor(self):
+        self.assertReadBudget(self.librarian, reverse("api:fine-list"), 1, {"cursor": ""})
+
+    def test_detail(self):
+        fine = Fine.objects.filter(member=self.member).first()
+        self.assertReadBudget(self.member, reverse("api:fine-detail", args=[fine.pk]), 1)
+
+
+class ResponseShapeTests(QueryBudgetTestCase):
+    def test_fields_trim_the_payload_and_the_queries(self):
+        data = self.assertReadBudget(self.member, reverse("api:book-list"), 3, {"fields": "id,title"})
+        self.assertEqual(set(data["results"][0]), {"id", "title"})
+
+    def test_empty_expand_collapses_relations_to_ids(self):
+        data = self.assertReadBudget(self.member, reverse("api:book-list"), 4, {"expand": ""})
+        first = data["results"][0]
+        self.assertEqual(first["category"], self.books[0].category_id)
+        self.assertEqual(len(first["copies"]), self.COPIES_PER_BOOK)
+        self.assertIsInstance(first["copies"][0], int)
+
+    def test_reservation_book_without_copies(self):
+        # The book is joined in; its copies are neither rendered nor fetched.
+        params = {"expand": "book", "fields": "id,book.title,book.category,member"}
+        data = self.assertReadBudget(self.librarian, reverse("api:reservation-list"), 2, params)
+        row = data["results"][0]
+        self.assertEqual(set(row), {"id", "book", "member"})
+        self.assertEqual(set(row["book"]), {"title", "category"})
+        self.assertIsInstance(row["book"]["category"], int)
+        self.assertIsInstance(row["member"], int)
+
+    def test_nested_expand_path(self):
+        params = {"expand": "loan.borrower", "fields": "id,loan.borrower.username"}
+        data = self.assertReadBudget(self.member, reverse("api:fine-list"), 2, params)
+        row = data["results"][0]
+        self.assertEqual(row["loan"], {"borrower": {"username": "member"}})
+
+    def test_opt_in_relation(self):
+        reservation = Reservation.objects.filter(member=self.member).first()
+        url = reverse("api:reservation-detail", args=[reservation.pk])
+        data = self.assertReadBudget(self.member, url, 1, {"fields": "copy"})
+        self.assertEqual(data, {"copy": None})
+
+    def test_unknown_names_are_rejected(self):
+        self.client.force_authenticate(self.member)
+        response = self.client.get(reverse("api:book-list"), {"fields": "id,nope,category.x", "expand": "title"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {
+                "fields": ["Unknown field 'nope'.", "Unknown field 'category.x'."],
+                "expand": ["'title' cannot be expanded."],
+            },
+        )
+
+    def test_writes_keep_the_full_shape(self):
+        self.client.force_authenticate(self.member)
+        response = self.client.post(
+            reverse("api:reservation-list") + "?fields=id",
+            {"book_id": self.books[2].pk, "member_id": self.member.pk},
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["book"]["id"], self.books[2].pk)
+
+
+class BookSearchTests(QueryBudgetTestCase):
+    def search(self, **params):
+        self.client.force_authenticate(self.member)
+        response = self.client.get(reverse("api:book-list"), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row["title"] for row in response.json()["results"]]
+
+    def test_search_uses_the_index_ranked_by_relevance(self):
+        Book.objects.create(
+            title="Author 1 Interviews", author="Press", isbn="9780000009998", category=self.books[0].category
+        )
+
+        titles = self.search(search="author 1")
+
+        self.assertEqual(titles, ["Author 1 Interviews", "Book 1", "Book 3", "Book 5"])
+
+    def test_search_is_limited_to_search_fields(self):
+        # Category names are indexed but BookViewSet.search_fields leaves them out.
+        self.assertEqual(self.search(search="fiction"), [])
+        self.assertEqual(self.search(search="Book 4"), ["Book 4"])
+
+    def test_explicit_ordering_overrides_rank(self):
+        titles = self.search(search="author", ordering="-title")
+
+        self.assertEqual(titles, [f"Book {index}" for index in reversed(range(self.BOOKS))])
+
+    def test_partial_isbn_still_matches(self):
+        self.assertEqual(self.search(search="0002"), ["Book 2"])
+
+    def test_search_with_filters_and_budget(self):
+        data = self.assertReadBudget(self.member, reverse("api:book-list"), 4, {"search": "book", "author": "Author 0"})
+        self.assertEqual([row["title"] for row in data["results"]], ["Book 0", "Book 2", "Book 4"])
+
+
+class ConditionalGetTests(QueryBudgetTestCase):
+    def get(self, url, etag=None, **params):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(url, params, **headers)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.member)
+
+    def test_unchanged_list_is_a_304_after_one_query(self):
+        url = reverse("api:book-list")
+        etag = self.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.get(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertNotEqual(self.get(url, etag, author="Author 1").status_code, 304)
+        self.assertNotEqual(self.get(url, etag, fields="id").status_code, 304)
+
+    def test_copy_status_change_invalidates_list_and_detail(self):
+        book = self.books[1]
+        list_url = reverse("api:book-list")
+        detail_url = reverse("api:book-detail", args=[book.pk])
+        list_etag = self.get(list_url)["ETag"]
+        detail = self.get(detail_url)
+        self.assertIn("Last-Modified", detail)
+        self.assertEqual(self.get(detail_url, detail["ETag"]).status_code, 304)
+
+        copy = book.copies.get(status=BookCopy.Status.AVAILABLE, barcode__endswith="-2")
+        copy.status = BookCopy.Status.MAINTENANCE
+        copy.save()
+        self.assertEqual(self.get(list_url, list_etag).status_code, 200)
+        response = self.get(detail_url, detail["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["available_copies"], self.COPIES_PER_BOOK - 2)
+
+        # A status change that leaves the counters alone still changes the payload.
+        etag = response["ETag"]
+        copy.status = BookCopy.Status.LOST
+        copy.save(update_fields=["status"])
+        self.assertEqual(self.get(detail_url, etag).status_code, 200)
+
+    def test_category_rename_invalidates_its_books(self):
+        url = reverse("api:book-detail", args=[self.books[0].pk])
+        etag = self.get(url)["ETag"]
+        category = self.books[0].category
+        category.name = "Novels"
+        category.save()
+        self.assertEqual(self.get(url, etag).json()["category"]["name"], "Novels")
+
+    def test_deleting_a_book_invalidates_the_list(self):
+        book = Book.objects.create(title="Withdrawn", author="A", isbn="9780000009999", category=self.books[0].category)
+        url = reverse("api:book-list")
+        etag = self.get(url)["ETag"]
+        book.delete()
+        self.assertEqual(self.get(url, etag).json()["count"], self.BOOKS)
+
+
+class LoanWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user("librarian", password="pw", role=User.Role.LIBRARIAN)
+        cls.holder = User.objects.create_user("holder", password="pw", role=User.Role.MEMBER)
+        cls.other = User.objects.create_user("other", password="pw", role=User.Role.MEMBER)
+        category = Category.objects.create(name="Fiction")
+        book = Book.objects.create(title="Dune", author="Frank Herbert", isbn="9780441013593", category=category)
+        cls.copy = BookCopy.objects.create(book=book, barcode="C1")
+        loan = Loan.objects.create(copy=cls.copy, borrower=cls.other)
+        cls.reservation = Reservation.objects.create(book=book, member=cls.holder)
+        loan.mark_returned()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.librarian)
+
+    def lend(self, member):
+        payload = {"copy_id": self.copy.pk, "borrower_id": member.pk, "due_at": timezone.now() + timedelta(days=14)}
+        return self.client.post(reverse("api:loan-list"), payload)
+
+    def test_held_copy_cannot_be_lent_to_another_member(self):
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.status, BookCopy.Status.RESERVED)
+
+        response = self.lend(self.other)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"copy_id": [Loan.HELD_FOR_OTHER_MESSAGE]})
+        self.copy.refresh_from_db()
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.copy.status, BookCopy.Status.RESERVED)
+        self.assertEqual(self.reservation.status, Reservation.Status.NOTIFIED)
+        self.assertEqual(Loan.objects.filter(returned_at__isnull=True).count(), 0)
+
+    def test_held_copy_is_lent_to_its_holder(self):
+        response = self.lend(self.holder)
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, Reservation.Status.FULFILLED)
@@ -1,39 +1,80 @@
 from __future__ import annotations
 
+from functools import partial
+
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework.response import Response
 
 from catalog.models import Book
 from circulation.models import Fine, Loan, Reservation
+from circulation.services import checkout_batch, return_batch
+from library_management.conditional import conditional_response, make_etag
 
+from .filters import BookSearchFilter
 from .permissions import IsAdminLibrarianOrReadOnly, IsAdminOrLibrarian
 from .serializers import (
+	BatchCheckoutSerializer,
+	BatchReturnSerializer,
 	BookSerializer,
 	FineSerializer,
 	LoanSerializer,
 	ReservationSerializer,
+	ScanResultSerializer,
 )
+from .shaping import ShapedResponseMixin
 
 
-class BookViewSet(viewsets.ModelViewSet):
-	queryset = Book.objects.prefetch_related("copies", "category")
+class BookViewSet(ShapedResponseMixin, viewsets.ModelViewSet):
+	# Joins and prefetches come from ShapedResponseMixin, which follows ?fields= and
+	# ?expand=; available_copies/total_copies are counter columns on Book itself.
+	queryset = Book.objects.all()
 	serializer_class = BookSerializer
 	permission_classes = (IsAdminLibrarianOrReadOnly,)
+	filter_backends = (DjangoFilterBackend, BookSearchFilter, OrderingFilter)
 	filterset_fields = ("category", "author", "language")
 	search_fields = ("title", "author", "isbn")
 	ordering_fields = ("title", "author", "publication_date")
-
-
-class LoanViewSet(viewsets.ModelViewSet):
-	queryset = Loan.objects.select_related("copy__book", "borrower", "issued_by")
+	keyset_ordering = ("title", "id")
+
+	def list(self, request, *args, **kwargs):
+		# One aggregate over the filtered books decides whether the page can be a 304.
+		count, last_modified = self.filter_queryset(self.get_queryset()).fingerprint()
+		etag = make_etag("api:book-list", count, last_modified and last_modified.isoformat())
+		return self._conditional(request, etag, None, partial(super().list, request, *args, **kwargs))
+
+	def retrieve(self, request, *args, **kwargs):
+		render = partial(super().retrieve, request, *args, **kwargs)
+		try:
+			last_modified = Book.objects.filter(pk=kwargs[self.lookup_field]).values_list("updated_at", flat=True).first()
+		except (TypeError, ValueError):
+			last_modified = None
+		if last_modified is None:
+			return render()
+		etag = make_etag("api:book-detail", kwargs[self.lookup_field], last_modified.isoformat())
+		return self._conditional(request, etag, last_modified, render)
+
+	def _conditional(self, request, etag, last_modified, render):
+		# The browsable API embeds the user and a CSRF token, so only JSON is validated.
+		if request.accepted_renderer.format == "api":
+			return render()
+		# The URL carries the filters, ordering, page/cursor and ?fields=/?expand=.
+		etag = make_etag(etag, request.build_absolute_uri(), request.accepted_renderer.format)
+		return conditional_response(request, etag, render, last_modified)
+
+
+class LoanViewSet(ShapedResponseMixin, viewsets.ModelViewSet):
+	queryset = Loan.objects.all()
 	serializer_class = LoanSerializer
+	keyset_ordering = ("-issued_at", "id")
 	filterset_fields = ("status", "borrower__id")
 	search_fields = ("copy__book__title", "copy__barcode", "borrower__username")
 
 	def get_queryset(self):
-		queryset = self.queryset
+		queryset = super().get_queryset()
 		if not self.request.user.is_admin and not self.request.user.is_librarian:
 			queryset = queryset.filter(borrower=self.request.user)
 		return queryset
@@ -49,14 +90,50 @@ class LoanViewSet(viewsets.ModelViewSet):
 		loan.mark_returned()
 		return Response(LoanSerializer(loan, context=self.get_serializer_context()).data)
 
-
-class ReservationViewSet(viewsets.ModelViewSet):
-	queryset = Reservation.objects.select_related("book", "member")
+	@action(detail=False, methods=["post"], permission_classes=[IsAdminOrLibrarian])
+	def checkout(self, request):
+		"""Lend a basket of scanned barcodes to one member in a single request."""
+
+		serializer = BatchCheckoutSerializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		results = checkout_batch(
+			serializer.validated_data["borrower"],
+			serializer.validated_data["barcodes"],
+			issued_by=request.user,
+			due_at=serializer.validated_data.get("due_at"),
+		)
+		return self._batch_response(results)
+
+	@action(detail=False, methods=["post"], url_path="return", permission_classes=[IsAdminOrLibrarian])
+	def batch_return(self, request):
+		"""Return a basket of scanned barcodes in a single request."""
+
+		serializer = BatchReturnSerializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		results = return_batch(
+			serializer.validated_data["barcodes"],
+			returned_at=serializer.validated_data.get("returned_at"),
+		)
+		return self._batch_response(results)
+
+	@staticmethod
+	def _batch_response(results):
+		return Response(
+			{
+				"succeeded": sum(result.ok for result in results),
+				"failed": sum(not result.ok for result in results),
+				"results": ScanResultSerializer(results, many=True).data,
+			}
+		)
+
+
+class ReservationViewSet(ShapedResponseMixin, viewsets.ModelViewSet):
+	queryset = Reservation.objects.all()
 	serializer_class = ReservationSerializer
 	filterset_fields = ("status",)
 
 	def get_queryset(self):
-		queryset = self.queryset
+		queryset = super().get_queryset()
 		if not self.request.user.is_admin and not self.request.user.is_librarian:
 			queryset = queryset.filter(member=self.request.user)
 		return queryset
@@ -73,13 +150,14 @@ class ReservationViewSet(viewsets.ModelViewSet):
 			serializer.save(member=self.request.user)
 
 
-class FineViewSet(viewsets.ModelViewSet):
-	queryset = Fine.objects.select_related("loan__copy__book", "member")
+class FineViewSet(ShapedResponseMixin, viewsets.ModelViewSet):
+	queryset = Fine.objects.all()
 	serializer_class = FineSerializer
+	keyset_ordering = ("-issued_at", "id")
 	filterset_fields = ("is_paid",)
 
 	def get_queryset(self):
-		queryset = self.queryset
+		queryset = super().get_queryset()
 		if not self.request.user.is_admin and not self.request.user.is_librarian:
 			queryset = queryset.filter(member=self.request.user)
 		return queryset
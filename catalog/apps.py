@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CatalogConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "catalog"
+
+    def ready(self):
+        # Import signal handlers when the app is ready.
+        from .signals import ensure_search_schema
+
+        post_migrate.connect(ensure_search_schema, sender=self)
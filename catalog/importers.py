@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import IO, Iterable, Iterator, Optional
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils.dateparse import parse_date
+from django.utils.text import slugify
+
+from .models import Book, BookCopy, Category
+
+
+FORMATS = ("csv", "jsonl", "marc")
+BOOK_UPDATE_FIELDS = [
+	"title",
+	"author",
+	"category",
+	"publication_date",
+	"publisher",
+	"description",
+	"language",
+	"tags",
+	"updated_at",
+]
+
+_ISBN_RE = re.compile(r"[0-9Xx]{10,13}")
+_YEAR_RE = re.compile(r"(\d{4})")
+
+
+class RejectedRecord(ValueError):
+	"""Raised for an input record that cannot be turned into a Book."""
+
+
+@dataclass
+class CatalogRecord:
+	isbn: str
+	title: str
+	author: str
+	category: str
+	publisher: str = ""
+	publication_date: Optional[date] = None
+	language: str = ""
+	description: str = ""
+	tags: list[str] = field(default_factory=list)
+	copies: int = 0
+	location: str = ""
+	barcodes: list[str] = field(default_factory=list)
+
+
+@dataclass
+class BatchResult:
+	books_created: int = 0
+	books_updated: int = 0
+	copies_created: int = 0
+	categories_created: int = 0
+
+
+def detect_format(path: str) -> str:
+	lowered = path.lower()
+	if lowered.endswith((".jsonl", ".ndjson", ".json")):
+		return "jsonl"
+	if lowered.endswith((".mrc", ".marc")):
+		return "marc"
+	return "csv"
+
+
+# --- Readers -------------------------------------------------------------------
+#
+# Each reader is a generator yielding (line_number, raw_dict) so the whole file is
+# never held in memory; raw dicts share the CSV column names below.
+
+
+def iter_csv(stream: IO[bytes]) -> Iterator[tuple[int, dict]]:
+	text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+	for index, row in enumerate(csv.DictReader(text), start=2):
+		yield index, row
+
+
+def iter_jsonl(stream: IO[bytes]) -> Iterator[tuple[int, dict]]:
+	for index, line in enumerate(stream, start=1):
+		line = line.strip()
+		if not line:
+			continue
+		try:
+			yield index, json.loads(line)
+		except ValueError as exc:
+			yield index, {"_error": f"invalid JSON: {exc}"}
+
+
+def iter_marc(stream: IO[bytes]) -> Iterator[tuple[int, dict]]:
+	"""Read binary MARC 21 (ISO 2709) records without loading the file."""
+
+	buffer = b""
+	index = 0
+	while True:
+		chunk = stream.read(64 * 1024)
+		buffer += chunk
+		*records, buffer = buffer.split(b"\x1d")
+		if not chunk and buffer.strip():
+			records.append(buffer)
+		for raw in records:
+			if not raw.strip():
+				continue
+			index += 1
+			try:
+				yield index, _marc_to_row(raw)
+			except (ValueError, IndexError) as exc:
+				yield index, {"_error": f"malformed MARC record: {exc}"}
+		if not chunk:
+			break
+
+
+def _marc_fields(raw: bytes) -> dict[str, list[bytes]]:
+	base_address = int(raw[12:17])
+	directory = raw[24 : base_address - 1]
+	fields: dict[str, list[bytes]] = {}
+	for offset in range(0, len(directory) - 11, 12):
+		entry = directory[offset : offset + 12]
+		tag = entry[:3].decode("ascii")
+		length = int(entry[3:7])
+		start = int(entry[7:12])
+		data = raw[base_address + start : base_address + start + length].rstrip(b"\x1e")
+		fields.setdefault(tag, []).append(data)
+	return fields
+
+
+def _subfield(data: bytes, code: str) -> str:
+	for part in data.split(b"\x1f")[1:]:
+		if part[:1].decode("ascii", "ignore") == code:
+			return part[1:].decode("utf-8", "replace").strip(" /:;,.")
+	return ""
+
+
+def _first_subfield(fields: dict[str, list[bytes]], tags: Iterable[str], code: str) -> str:
+	for tag in tags:
+		for data in fields.get(tag, []):
+			value = _subfield(data, code)
+			if value:
+				return value
+	return ""
+
+
+def _marc_to_row(raw: bytes) -> dict:
+	fields = _marc_fields(raw)
+	title = _first_subfield(fields, ["245"], "a")
+	subtitle = _first_subfield(fields, ["245"], "b")
+	language = _first_subfield(fields, ["041"], "a")
+	if not language and fields.get("008"):
+		language = fields["008"][0][35:38].decode("ascii", "ignore").strip()
+	subjects = [_subfield(data, "a") for data in fields.get("650", [])]
+	return {
+		"isbn": _first_subfield(fields, ["020"], "a"),
+		"title": f"{title}: {subtitle}" if subtitle else title,
+		"author": _first_subfield(fields, ["100", "110", "700"], "a"),
+		"category": subjects[0] if subjects else "",
+		"publisher": _first_subfield(fields, ["264", "260"], "b"),
+		"publication_date": _first_subfield(fields, ["264", "260"], "c"),
+		"language": language,
+		"description": _first_subfield(fields, ["520"], "a"),
+		"tags": [subject for subject in subjects[1:] if subject],
+	}
+
+
+READERS = {"csv": iter_csv, "jsonl": iter_jsonl, "marc": iter_marc}
+
+
+# --- Normalisation ---------------------------------------------------------------
+
+
+def _text(row: dict, key: str, limit: Optional[int] = None) -> str:
+	value = row.get(key)
+	value = "" if value is None else str(value).strip()
+	return value[:limit] if limit else value
+
+
+def _split(value) -> list[str]:
+	if isinstance(value, list):
+		return [str(item).strip() for item in value if str(item).strip()]
+	return [item.strip() for item in re.split(r"[;|]", str(value or "")) if item.strip()]
+
+
+def _publication_date(value) -> Optional[date]:
+	if not value:
+		return None
+	value = str(value).strip()
+	try:
+		parsed = parse_date(value)
+	except ValueError:
+		parsed = None
+	if parsed:
+		return parsed
+	year = _YEAR_RE.search(value)
+	return date(int(year.group(1)), 1, 1) if year else None
+
+
+def normalize_record(row: dict, default_category: str, default_copies: int) -> CatalogRecord:
+	if "_error" in row:
+		raise RejectedRecord(row["_error"])
+	raw_isbn = _text(row, "isbn").replace("-", "").replace(" ", "")
+	match = _ISBN_RE.search(raw_isbn)
+	if not match or len(match.group(0)) not in (10, 13):
+		raise RejectedRecord(f"invalid ISBN {raw_isbn!r}")
+	title = _text(row, "title", 255)
+	author = _text(row, "author", 255)
+	if not title:
+		raise RejectedRecord("missing title")
+	if not author:
+		raise RejectedRecord("missing author")
+	try:
+		copies = int(row.get("copies") or default_copies)
+	except (TypeError, ValueError):
+		raise RejectedRecord(f"invalid copies value {row.get('copies')!r}")
+	return CatalogRecord(
+		isbn=match.group(0).upper(),
+		title=title,
+		author=author,
+		category=_text(row, "category", 150) or default_category,
+		publisher=_text(row, "publisher", 255),
+		publication_date=_publication_date(row.get("publication_date")),
+		language=_text(row, "language", 60),
+		description=_text(row, "description"),
+		tags=_split(row.get("tags")),
+		copies=max(copies, 0),
+		location=_text(row, "location", 120),
+		barcodes=[barcode[:24] for barcode in _split(row.get("barcodes"))],
+	)
+
+
+# --- Writer ----------------------------------------------------------------------
+
+
+class CatalogImporter:
+	"""Upsert batches of CatalogRecord rows with a fixed number of queries per batch."""
+
+	def __init__(self):
+		self._categories: dict[str, int] = dict(Category.objects.values_list("name", "id"))
+
+	def import_batch(self, records: list[CatalogRecord]) -> BatchResult:
+		result = BatchResult()
+		# The last occurrence of an ISBN within a batch wins, like a row-by-row upsert.
+		by_isbn = {record.isbn: record for record in records}
+		with transaction.atomic():
+			result.categories_created = self._ensure_categories({r.category for r in by_isbn.values()})
+			existing = set(Book.objects.filter(isbn__in=by_isbn).values_list("isbn", flat=True))
+			books = Book.objects.bulk_create(
+				[self._book(record) for record in by_isbn.values()],
+				update_conflicts=True,
+				unique_fields=["isbn"],
+				update_fields=BOOK_UPDATE_FIELDS,
+			)
+			result.books_updated = len(existing)
+			result.books_created = len(books) - len(existing)
+
+			book_ids = dict(Book.objects.filter(isbn__in=by_isbn).values_list("isbn", "id"))
+			batch_books = Book.objects.filter(pk__in=book_ids.values())
+			copies_before = batch_books.aggregate(total=Sum("total_copies"))["total"] or 0
+			copies = [
+				BookCopy(book_id=book_ids[record.isbn], barcode=barcode, location=record.location)
+				for record in by_isbn.values()
+				for barcode in self._barcodes(record)
+			]
+			if copies:
+				# Deterministic barcodes plus ignore_conflicts make re-imports idempotent.
+				BookCopy.objects.bulk_create(copies, ignore_conflicts=True)
+			# bulk_create bypasses BookCopy.save(), so refresh the counters set-wise.
+			batch_books.recount_copies()
+			copies_after = batch_books.aggregate(total=Sum("total_copies"))["total"] or 0
+			result.copies_created = max(copies_after - copies_before, 0)
+		return result
+
+	def _book(self, record: CatalogRecord) -> Book:
+		return Book(
+			isbn=record.isbn,
+			title=record.title,
+			author=record.author,
+			category_id=self._categories[record.category],
+			publication_date=record.publication_date,
+			publisher=record.publisher,
+			description=record.description,
+			language=record.language,
+			tags=record.tags,
+		)
+
+	@staticmethod
+	def _barcodes(record: CatalogRecord) -> list[str]:
+		if record.barcodes:
+			return record.barcodes
+		return [f"{record.isbn}-{index:03d}" for index in range(1, record.copies + 1)]
+
+	def _ensure_categories(self, names: set[str]) -> int:
+		missing = sorted(name for name in names if name not in self._categories)
+		if not missing:
+			return 0
+		Category.objects.bulk_create(
+			[Category(name=name, slug=slugify(name)[:160] or "category") for name in missing],
+			ignore_conflicts=True,
+		)
+		self._categories.update(Category.objects.filter(name__in=missing).values_list("name", "id"))
+		created = 0
+		for name in missing:
+			if name in self._categories:
+				created += 1
+				continue
+			# The slug collided with a differently named category; let save() pick one.
+			category = Category(name=name, slug=f"{slugify(name)[:140]}-{len(self._categories)}")
+			category.save()
+			self._categories[name] = category.pk
+			created += 1
+		return created
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importers import (
+    FORMATS,
+    READERS,
+    BatchResult,
+    CatalogImporter,
+    RejectedRecord,
+    detect_format,
+    normalize_record,
+)
+
+
+class Command(BaseCommand):
+    help = "Stream books and copies from a CSV, JSONL or MARC file into the catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or '-' to read from stdin.")
+        parser.add_argument("--format", choices=FORMATS, help="Input format (default: from the file extension).")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Records per transaction; bounds memory use regardless of file size.",
+        )
+        parser.add_argument(
+            "--copies",
+            type=int,
+            default=1,
+            help="Copies to create for records without a copies or barcodes column.",
+        )
+        parser.add_argument(
+            "--default-category",
+            default="Uncategorized",
+            help="Category for records that do not name one.",
+        )
+        parser.add_argument("--rejects", help="Write rejected records as JSON lines to this file.")
+        parser.add_argument("--progress-every", type=int, default=10000, help="Report progress every N records.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        input_format = options["format"] or ("csv" if path == "-" else detect_format(path))
+        reader = READERS[input_format]
+
+        try:
+            source = nullcontext(sys.stdin.buffer) if path == "-" else open(path, "rb")
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}") from exc
+        rejects_file = open(options["rejects"], "w", encoding="utf-8") if options["rejects"] else None
+
+        importer = CatalogImporter()
+        totals = BatchResult()
+        seen = rejected = 0
+        next_report = options["progress_every"]
+        started = time.monotonic()
+        batch = []
+
+        def flush():
+            result = importer.import_batch(batch)
+            totals.books_created += result.books_created
+            totals.books_updated += result.books_updated
+            totals.copies_created += result.copies_created
+            totals.categories_created += result.categories_created
+            batch.clear()
+
+        try:
+            with source as stream:
+                for line, row in reader(stream):
+                    seen += 1
+                    try:
+                        batch.append(normalize_record(row, options["default_category"], options["copies"]))
+                    except RejectedRecord as exc:
+                        rejected += 1
+                        if rejects_file:
+                            rejects_file.write(json.dumps({"line": line, "reason": str(exc), "record": row}, default=str))
+                            rejects_file.write("\n")
+                    if len(batch) >= batch_size:
+                        flush()
+                    if next_report and seen >= next_report:
+                        self._report(seen, rejected, started)
+                        next_report += options["progress_every"]
+                if batch:
+                    flush()
+        finally:
+            if rejects_file:
+                rejects_file.close()
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(
+            f"Books created: {totals.books_created} | Books updated: {totals.books_updated} | "
+            f"Copies created: {totals.copies_created} | Categories created: {totals.categories_created}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {seen - rejected} of {seen} records ({rejected} rejected) "
+                f"in {elapsed:.1f}s, {seen / elapsed:,.0f} rows/sec."
+            )
+        )
+
+    def _report(self, seen: int, rejected: int, started: float) -> None:
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(f"  {seen:,} records read, {rejected:,} rejected, {seen / elapsed:,.0f} rows/sec")
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    help = "Recreate the catalog full-text search index from the current books."
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(
+                self.style.WARNING(f"Full-text search is not available on {connection.vendor}; nothing to do.")
+            )
+            return
+        with transaction.atomic():
+            search.install_schema()
+            indexed = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} books."))
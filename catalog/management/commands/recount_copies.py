@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog.models import Book
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized total/available copy counters on every book."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = Book.objects.all().recount_copies()
+        self.stdout.write(self.style.SUCCESS(f"Copy counters recomputed for {updated} books."))
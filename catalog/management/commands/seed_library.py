@@ -1,20 +1,148 @@
 from __future__ import annotations
 
+import multiprocessing
 import random
-from datetime import timedelta, timezone as dt_timezone
+import time
+from array import array
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from typing import Callable, Iterable, Iterator, Optional
 
-from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 from faker import Faker
 
 from accounts.models import MemberProfile, User
 from catalog.models import Book, BookCopy, Category
 from circulation.models import Fine, Loan, Reservation
+from circulation.signals import circulation_changed
 
 
 DEFAULT_PASSWORD = "password123"
+CATEGORY_NAMES = [
+    "Science Fiction",
+    "Mystery",
+    "Romance",
+    "Biography",
+    "History",
+    "Technology",
+    "Education",
+    "Children",
+    "Health",
+    "Travel",
+    "Self-Help",
+    "Poetry",
+    "Philosophy",
+    "Business",
+    "Art",
+    "Cooking",
+    "Sports",
+    "Law",
+    "Mathematics",
+    "Fantasy",
+]
+LANGUAGES = ["English", "Spanish", "French", "German", "Hindi", "Mandarin"]
+SHELVES = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+# --- Shard generators -----------------------------------------------------------
+#
+# Generation is split into fixed-size shards, each seeded from (--seed, kind, shard
+# index) only. The output is therefore identical whether shards run inline or in a
+# pool of worker processes. Generators are module-level so they can be pickled, and
+# they return plain tuples; only the parent process talks to the database.
+
+_faker: Optional[Faker] = None
+
+
+def _shard_random(seed: int, kind: str, shard: int) -> tuple[random.Random, Faker]:
+    global _faker
+    if _faker is None:
+        _faker = Faker()
+    rng = random.Random(f"{seed}:{kind}:{shard}")
+    _faker.seed_instance(rng.getrandbits(64))
+    return rng, _faker
+
+
+def generate_books(task: tuple) -> list[tuple]:
+    seed, shard, start, stop, isbn_base, category_count, today = task
+    rng, faker = _shard_random(seed, "books", shard)
+    rows = []
+    for index in range(start, stop):
+        copies = [
+            f"Shelf {rng.choice(SHELVES)}{rng.randint(1, 20)}" for _ in range(rng.randint(2, 4))
+        ]
+        rows.append(
+            (
+                f"{isbn_base + index:013d}",
+                faker.sentence(nb_words=4).rstrip("."),
+                faker.name(),
+                rng.randrange(category_count),
+                date.fromordinal(today - rng.randint(0, 365 * 30)),
+                faker.company(),
+                faker.paragraph(nb_sentences=3),
+                rng.choice(LANGUAGES),
+                faker.words(nb=3),
+                copies,
+            )
+        )
+    return rows
+
+
+def generate_members(task: tuple) -> list[tuple]:
+    seed, shard, start, stop, category_count = task
+    rng, faker = _shard_random(seed, "members", shard)
+    rows = []
+    for index in range(start, stop):
+        preferred = rng.sample(range(category_count), k=rng.randint(1, min(5, category_count)))
+        rows.append((index, faker.first_name(), faker.last_name(), preferred))
+    return rows
+
+
+def generate_loans(task: tuple) -> list[tuple]:
+    seed, shard, start, stop, active_copies, copy_count, member_count, staff_count, now = task
+    rng, faker = _shard_random(seed, "loans", shard)
+    rows = []
+    for offset, index in enumerate(range(start, stop)):
+        # The first len(active_copies) loans of the shard stay open, each on its own
+        # copy; the rest are historical loans that have been returned.
+        is_active = offset < len(active_copies)
+        copy_index = active_copies[offset] if is_active else rng.randrange(copy_count)
+        issued_at = now - rng.randint(86400, 365 * 86400)
+        due_at = issued_at + rng.randint(7, 28) * 86400
+        returned_at = None
+        fine = None
+        if not is_active:
+            returned_at = issued_at + rng.randint(1, 40) * 86400
+            if returned_at > now:
+                returned_at = now - rng.randint(1, 5) * 86400
+        elif (now - due_at) // 86400 > 3:
+            fine = (rng.randint(5, 40), rng.random() < 0.5)
+        reservation_member = rng.randrange(member_count) if rng.random() < 0.3 else None
+        rows.append(
+            (
+                copy_index,
+                rng.randrange(member_count),
+                rng.randrange(staff_count) if staff_count else None,
+                issued_at,
+                due_at,
+                returned_at,
+                faker.sentence(nb_words=6),
+                fine,
+                reservation_member,
+            )
+        )
+    return rows
+
+
+def _init_worker() -> None:
+    # Needed under the "spawn" start method (Windows, macOS); a no-op after fork.
+    import django
+
+    django.setup()
 
 
 class Command(BaseCommand):
@@ -26,123 +154,183 @@ class Command(BaseCommand):
         parser.add_argument("--members", type=int, default=600, help="Target number of member accounts.")
         parser.add_argument("--librarians", type=int, default=25, help="Target number of librarian accounts.")
         parser.add_argument("--seed", type=int, default=2025, help="Random seed for reproducibility.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk INSERT statement.")
+        parser.add_argument(
+            "--shard-size",
+            type=int,
+            default=20000,
+            help="Records generated per shard; each shard is written in its own transaction.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes used to generate shards. Output is identical for any value.",
+        )
 
     def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["shard_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--batch-size, --shard-size and --workers must be positive.")
+        self.seed = options["seed"]
+        self.batch_size = options["batch_size"]
+        self.shard_size = options["shard_size"]
+        self.workers = options["workers"]
+        self.now = timezone.now().replace(microsecond=0)
+        # Hash the shared password once; every generated account reuses the hash.
+        self.password_hash = make_password(DEFAULT_PASSWORD)
         faker = Faker()
-        faker.seed_instance(options["seed"])
+        faker.seed_instance(self.seed)
 
-        with transaction.atomic():
+        self.pool = None
+        if self.workers > 1:
+            # Forked children must not inherit the parent's database connections.
+            connections.close_all()
+            self.pool = multiprocessing.get_context().Pool(self.workers, initializer=_init_worker)
+        try:
             categories = self._ensure_categories(faker)
             self.stdout.write(f"Categories available: {len(categories)}")
 
-            books_created = self._ensure_books(faker, categories, options["books"])
+            books_created = self._ensure_books(categories, options["books"])
             self.stdout.write(f"Books created: {books_created}")
 
-            members_created = self._ensure_members(faker, categories, options["members"])
+            members_created = self._ensure_members(categories, options["members"])
             self.stdout.write(f"Member accounts ensured: {members_created} new")
 
             staff_users, staff_created = self._ensure_staff(faker, options["librarians"])
             self.stdout.write(f"Staff accounts ensured: {len(staff_users)} total ({staff_created} new)")
 
-            loans_made, reservations_made, fines_created = self._ensure_loans(
-                faker,
-                options["loans"],
-            )
+            loans_made, reservations_made, fines_created = self._ensure_loans(staff_users, options["loans"])
             self.stdout.write(
                 f"Loans created: {loans_made} | Reservations created: {reservations_made} | Fines created: {fines_created}"
             )
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
 
         self.stdout.write(self.style.SUCCESS("Library data seeding complete."))
 
+    # --- Orchestration -------------------------------------------------------------
+
+    def _shards(self, total: int) -> Iterator[tuple[int, int, int]]:
+        for shard, start in enumerate(range(0, total, self.shard_size)):
+            yield shard, start, min(start + self.shard_size, total)
+
+    def _generate(self, generator: Callable, tasks: Iterable[tuple]) -> Iterator[list[tuple]]:
+        if self.pool is None:
+            return map(generator, tasks)
+        # imap keeps shard order, so rows are inserted (and numbered) deterministically.
+        return self.pool.imap(generator, tasks)
+
+    def _progress(self, label: str, done: int, total: int, started: float) -> None:
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(f"  {label}: {done:,}/{total:,} ({done / elapsed:,.0f} rows/sec)")
+
+    # --- Catalog ------------------------------------------------------------------
+
     def _ensure_categories(self, faker: Faker) -> list[Category]:
-        names = [
-            "Science Fiction",
-            "Mystery",
-            "Romance",
-            "Biography",
-            "History",
-            "Technology",
-            "Education",
-            "Children",
-            "Health",
-            "Travel",
-            "Self-Help",
-            "Poetry",
-            "Philosophy",
-            "Business",
-            "Art",
-            "Cooking",
-            "Sports",
-            "Law",
-            "Mathematics",
-            "Fantasy",
-        ]
         categories: list[Category] = []
-        for name in names:
+        for name in CATEGORY_NAMES:
             category, _ = Category.objects.get_or_create(name=name, defaults={"description": faker.text(max_nb_chars=160)})
             categories.append(category)
         return categories
 
-    def _ensure_books(self, faker: Faker, categories: list[Category], target: int) -> int:
+    def _ensure_books(self, categories: list[Category], target: int) -> int:
         existing = Book.objects.count()
         needed = max(target - existing, 0)
-        created = 0
         if needed == 0:
-            return created
-
-        base_number = 9780000000000 + existing
-        languages = ["English", "Spanish", "French", "German", "Hindi", "Mandarin"]
-        for index in range(needed):
-            isbn = f"{base_number + index:013d}"
-            category = random.choice(categories)
-            book = Book.objects.create(
-                title=faker.sentence(nb_words=4).rstrip("."),
-                author=faker.name(),
-                isbn=isbn,
-                category=category,
-                publication_date=faker.date_between(start_date="-30y", end_date="today"),
-                publisher=faker.company(),
-                description=faker.paragraph(nb_sentences=3),
-                language=random.choice(languages),
-                tags=faker.words(nb=3),
-            )
-            copy_count = random.randint(2, 4)
-            for copy_index in range(copy_count):
-                barcode = self._generate_barcode(book.pk, copy_index)
-                BookCopy.objects.create(
-                    book=book,
-                    barcode=barcode,
-                    location=f"Shelf {random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}" + str(random.randint(1, 20)),
+            return 0
+
+        isbn_base = 9780000000000 + existing
+        today = date.today().toordinal()
+        tasks = (
+            (self.seed, shard, start, stop, isbn_base, len(categories), today)
+            for shard, start, stop in self._shards(needed)
+        )
+        created = 0
+        started = time.monotonic()
+        for rows in self._generate(generate_books, tasks):
+            with transaction.atomic():
+                books = Book.objects.bulk_create(
+                    [
+                        Book(
+                            isbn=isbn,
+                            title=title,
+                            author=author,
+                            category=categories[category_index],
+                            publication_date=publication_date,
+                            publisher=publisher,
+                            description=description,
+                            language=language,
+                            tags=tags,
+                        )
+                        for isbn, title, author, category_index, publication_date, publisher, description, language, tags, _ in rows
+                    ],
+                    batch_size=self.batch_size,
                 )
-            created += 1
+                # Barcodes derive from the unique book pk, so no uniqueness probe is
+                # needed. The 13-character form cannot collide with older 12-character ones.
+                copies = [
+                    BookCopy(book=book, barcode=f"BC{book.pk:09d}{copy_index:02d}", location=location)
+                    for book, row in zip(books, rows)
+                    for copy_index, location in enumerate(row[-1])
+                ]
+                BookCopy.objects.bulk_create(copies, batch_size=self.batch_size)
+                Book.objects.filter(pk__in=[book.pk for book in books]).recount_copies()
+            created += len(books)
+            self._progress("books", created, needed, started)
         return created
 
-    def _generate_barcode(self, book_pk: int, copy_index: int) -> str:
-        while True:
-            barcode = f"BC{book_pk:05d}{copy_index:02d}{random.randint(0, 999):03d}"
-            if not BookCopy.objects.filter(barcode=barcode).exists():
-                return barcode
+    # --- Accounts -----------------------------------------------------------------
 
-    def _ensure_members(self, faker: Faker, categories: list[Category], target: int) -> int:
-        members = list(User.objects.filter(role=User.Role.MEMBER))
-        current_count = len(members)
+    def _ensure_members(self, categories: list[Category], target: int) -> int:
+        current_count = User.objects.filter(role=User.Role.MEMBER).count()
         needed = max(target - current_count, 0)
-        created_count = 0
-        for offset in range(needed):
-            username = f"member{current_count + offset + 1:04d}"
-            user = User.objects.create_user(
-                username=username,
-                email=f"{username}@example.com",
-                password=DEFAULT_PASSWORD,
-                role=User.Role.MEMBER,
-                first_name=faker.first_name(),
-                last_name=faker.last_name(),
-            )
-            created_count += 1
-            profile = getattr(user, "profile", None) or MemberProfile.objects.create(user=user)
-            preferred = random.sample(categories, k=random.randint(1, min(5, len(categories))))
-            profile.preferred_categories.set(preferred)
-        return created_count
+        if needed == 0:
+            return 0
+
+        Preference = MemberProfile.preferred_categories.through
+        tasks = (
+            (self.seed, shard, current_count + start, current_count + stop, len(categories))
+            for shard, start, stop in self._shards(needed)
+        )
+        created = 0
+        started = time.monotonic()
+        for rows in self._generate(generate_members, tasks):
+            with transaction.atomic():
+                # bulk_create skips the post_save signal, so profiles are created here.
+                users = User.objects.bulk_create(
+                    [
+                        User(
+                            username=f"member{index + 1:04d}",
+                            email=f"member{index + 1:04d}@example.com",
+                            password=self.password_hash,
+                            role=User.Role.MEMBER,
+                            first_name=first_name,
+                            last_name=last_name,
+                        )
+                        for index, first_name, last_name, _ in rows
+                    ],
+                    batch_size=self.batch_size,
+                )
+                profiles = MemberProfile.objects.bulk_create(
+                    [
+                        MemberProfile(user=user, membership_id=f"S{self.seed % 1000:03d}{index + 1:08X}"[:12])
+                        for user, (index, *_) in zip(users, rows)
+                    ],
+                    batch_size=self.batch_size,
+                )
+                Preference.objects.bulk_create(
+                    [
+                        Preference(memberprofile_id=profile.pk, category_id=categories[category_index].pk)
+                        for profile, row in zip(profiles, rows)
+                        for category_index in row[-1]
+                    ],
+                    batch_size=self.batch_size,
+                )
+            created += len(users)
+            self._progress("members", created, needed, started)
+        return created
 
     def _ensure_staff(self, faker: Faker, target_librarians: int) -> tuple[list[User], int]:
         staff_users = list(User.objects.filter(role__in=[User.Role.ADMIN, User.Role.LIBRARIAN]))
@@ -151,9 +339,11 @@ class Command(BaseCommand):
             admin = User.objects.create_superuser(
                 username="admin",
                 email="admin@example.com",
-                password=DEFAULT_PASSWORD,
+                password=None,
                 role=User.Role.ADMIN,
             )
+            admin.password = self.password_hash
+            admin.save(update_fields=["password"])
             staff_users.append(admin)
             created_count += 1
         librarians = [user for user in staff_users if user.role == User.Role.LIBRARIAN]
@@ -164,6 +354,7 @@ class Command(BaseCommand):
                 username=username,
                 defaults={
                     "email": f"{username}@example.com",
+                    "password": self.password_hash,
                     "role": User.Role.LIBRARIAN,
                     "is_staff": True,
                     "first_name": faker.first_name(),
@@ -171,73 +362,134 @@ class Command(BaseCommand):
                 },
             )
             if created:
-                user.set_password(DEFAULT_PASSWORD)
-                user.save()
-                librarians.append(user)
                 created_count += 1
             staff_users.append(user)
         unique_staff = list({user.pk: user for user in staff_users}.values())
         return unique_staff, created_count
 
-    def _ensure_loans(self, faker: Faker, target_loans: int) -> tuple[int, int, int]:
+    # --- Circulation --------------------------------------------------------------
+
+    def _ensure_loans(self, staff: list[User], target_loans: int) -> tuple[int, int, int]:
         loans_existing = Loan.objects.count()
         needed = max(target_loans - loans_existing, 0)
         if needed == 0:
             return 0, 0, 0
 
-        members = list(User.objects.filter(role=User.Role.MEMBER))
-        staff = list(User.objects.filter(role__in=[User.Role.ADMIN, User.Role.LIBRARIAN]))
-        available_copies = list(BookCopy.objects.filter(status=BookCopy.Status.AVAILABLE))
-        loans_created = 0
-        reservations_created = 0
-        fines_created = 0
-
-        for _ in range(needed):
-            if not available_copies or not members:
-                break
-            copy = random.choice(available_copies)
-            borrower = random.choice(members)
-            issued_by = random.choice(staff) if staff else None
-            issued_at = faker.date_time_between(start_date="-365d", end_date="-1d", tzinfo=dt_timezone.utc)
-            due_window = random.randint(7, 28)
-            due_at = issued_at + timedelta(days=due_window)
-            loan = Loan(
-                copy=copy,
-                borrower=borrower,
-                issued_by=issued_by,
-                issued_at=issued_at,
-                due_at=due_at,
-                notes=faker.sentence(nb_words=6),
+        member_ids = array("q", User.objects.filter(role=User.Role.MEMBER).order_by("pk").values_list("pk", flat=True))
+        copy_ids = array("q")
+        copy_book_ids = array("q")
+        available = array("q")
+        copies = BookCopy.objects.order_by("pk").values_list("pk", "book_id", "status")
+        for position, (copy_id, book_id, status) in enumerate(copies.iterator(chunk_size=self.batch_size)):
+            copy_ids.append(copy_id)
+            copy_book_ids.append(book_id)
+            if status == BookCopy.Status.AVAILABLE:
+                available.append(position)
+        if not copy_ids or not member_ids:
+            return 0, 0, 0
+        staff_ids = [user.pk for user in staff]
+
+        # Roughly 40% of new loans stay open, limited to one per available copy. The
+        # open copies are drawn once without replacement and spread evenly over shards.
+        rng = random.Random(f"{self.seed}:active-copies")
+        active_count = min(int(needed * 0.4), len(available))
+        active = rng.sample(available, active_count) if active_count else []
+
+        def active_slice(start: int, stop: int) -> list[int]:
+            return active[start * active_count // needed : stop * active_count // needed]
+
+        now = int(self.now.timestamp())
+        tasks = (
+            (
+                self.seed,
+                shard,
+                start,
+                stop,
+                active_slice(start, stop),
+                len(copy_ids),
+                len(member_ids),
+                len(staff_ids),
+                now,
             )
-            loan.save()
-            loans_created += 1
-
-            if random.random() < 0.6:
-                return_gap = random.randint(1, 40)
-                return_at = issued_at + timedelta(days=return_gap)
-                if return_at > timezone.now():
-                    return_at = timezone.now() - timedelta(days=random.randint(1, 5))
-                loan.mark_returned(return_time=return_at)
-            else:
-                available_copies.remove(copy)
-                overdue_days = (timezone.now() - loan.due_at).days
-                if overdue_days > 3:
-                    amount = Decimal(random.randint(5, 40))
-                    fine = Fine.objects.create(member=borrower, loan=loan, amount=amount)
-                    if random.random() < 0.5:
-                        fine.mark_paid()
-                    fines_created += 1
-
-            if random.random() < 0.3:
-                book = copy.book
-                member = random.choice(members)
-                if not Reservation.objects.filter(book=book, member=member, status=Reservation.Status.PENDING).exists():
-                    Reservation.objects.create(
-                        book=book,
-                        member=member,
-                        status=Reservation.Status.PENDING,
-                        notes=faker.sentence(nb_words=8),
-                    )
-                    reservations_created += 1
+            for shard, start, stop in self._shards(needed)
+        )
+
+        def moment(timestamp: Optional[int]) -> Optional[datetime]:
+            return None if timestamp is None else datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
 
+        loans_created = fines_created = 0
+        first_moment, last_moment = now, now
+        reservations_before = Reservation.objects.count()
+        started = time.monotonic()
+        for rows in self._generate(generate_loans, tasks):
+            with transaction.atomic():
+                loans = Loan.objects.bulk_create(
+                    [
+                        Loan(
+                            copy_id=copy_ids[copy_index],
+                            borrower_id=member_ids[borrower_index],
+                            issued_by_id=staff_ids[staff_index] if staff_index is not None else None,
+                            issued_at=moment(issued_at),
+                            due_at=moment(due_at),
+                            returned_at=moment(returned_at),
+                            status=(
+                                Loan.Status.RETURNED
+                                if returned_at is not None
+                                else Loan.Status.OVERDUE if due_at < now else Loan.Status.ACTIVE
+                            ),
+                            notes=notes,
+                        )
+                        for copy_index, borrower_index, staff_index, issued_at, due_at, returned_at, notes, _, _ in rows
+                    ],
+                    batch_size=self.batch_size,
+                )
+                fines = Fine.objects.bulk_create(
+                    [
+                        Fine(
+                            member_id=loan.borrower_id,
+                            loan=loan,
+                            amount=Decimal(row[7][0]),
+                            is_paid=row[7][1],
+                            paid_at=self.now if row[7][1] else None,
+                        )
+                        for loan, row in zip(loans, rows)
+                        if row[7] is not None
+                    ],
+                    batch_size=self.batch_size,
+                )
+                # The open-hold constraint on (book, member) drops repeated holds.
+                Reservation.objects.bulk_create(
+                    [
+                        Reservation(
+                            book_id=copy_book_ids[row[0]],
+                            member_id=member_ids[row[8]],
+                            status=Reservation.Status.PENDING,
+                        )
+                        for row in rows
+                        if row[8] is not None
+                    ],
+                    batch_size=self.batch_size,
+                    ignore_conflicts=True,
+                )
+            first_moment = min([first_moment] + [row[3] for row in rows])
+            last_moment = max([last_moment] + [max(row[4], row[5] or 0) for row in rows])
+            loans_created += len(loans)
+            fines_created += len(fines)
+            self._progress("loans", loans_created, needed, started)
+
+        # Loan.save() normally flips copy status; do it set-wise for the open loans.
+        with transaction.atomic():
+            open_loans = Loan.objects.filter(copy=OuterRef("pk"), returned_at__isnull=True)
+            BookCopy.objects.filter(Exists(open_loans)).exclude(status=BookCopy.Status.ON_LOAN).update(
+                status=BookCopy.Status.ON_LOAN
+            )
+            on_loan = BookCopy.objects.filter(book=OuterRef("pk"), status=BookCopy.Status.ON_LOAN)
+            Book.objects.filter(Exists(on_loan)).recount_copies()
+            # bulk_create skips Reservation.save(), so number the waitlists in one statement.
+            Reservation.objects.renumber()
+            # Nor do the loan signals fire, so hand the rollups every day the history covers.
+            first_day, last_day = timezone.localdate(moment(first_moment)), timezone.localdate(moment(last_moment))
+            days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+            circulation_changed.send(sender=Loan, days=days)
+        reservations_created = Reservation.objects.count() - reservations_before
         return loans_created, reservations_created, fines_created
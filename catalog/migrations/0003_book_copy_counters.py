@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:57
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def drop_search_triggers(apps, schema_editor):
+    from catalog import search
+
+    search.drop_triggers(schema_editor.connection)
+
+
+def install_search_triggers(apps, schema_editor):
+    from catalog import search
+
+    search.install_schema(schema_editor.connection)
+
+
+def populate_copy_counters(apps, schema_editor):
+    Book = apps.get_model("catalog", "Book")
+    BookCopy = apps.get_model("catalog", "BookCopy")
+    counts = (
+        BookCopy.objects.filter(book=OuterRef("pk"))
+        .order_by()
+        .values("book")
+        .annotate(
+            total=Count("pk"),
+            available=Count("pk", filter=Q(status="AVAILABLE")),
+        )
+    )
+    Book.objects.update(
+        total_copies=Coalesce(Subquery(counts.values("total")), 0, output_field=IntegerField()),
+        available_copies=Coalesce(Subquery(counts.values("available")), 0, output_field=IntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0002_book_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, install_search_triggers),
+        migrations.AddField(
+            model_name="book",
+            name="available_copies",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="total_copies",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_copy_counters, migrations.RunPython.noop),
+        migrations.RunPython(install_search_triggers, drop_search_triggers),
+    ]
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+from datetime import datetime
+from typing import Optional
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.text import slugify
@@ -23,12 +28,65 @@ class Category(models.Model):
 	def save(self, *args, **kwargs):
 		if not self.slug:
 			self.slug = slugify(self.name)
+		adding = self._state.adding
 		super().save(*args, **kwargs)
+		if not adding:
+			# Books embed their category, so a rename has to invalidate their ETags.
+			Book.objects.filter(category=self).touch()
 
 	def get_absolute_url(self):
 		return reverse("catalog:category-detail", args=[self.slug])
 
 
+class BookQuerySet(models.QuerySet):
+	def adjust_copy_counters(self, total: int = 0, available: int = 0) -> int:
+		"""Apply a relative change to the copy counters in a single UPDATE."""
+
+		changes = {}
+		# Clamp at zero so a drifted counter degrades to a wrong number (fixed by
+		# recount_copies) instead of failing the circulation write that moved it.
+		if total:
+			changes["total_copies"] = Greatest(F("total_copies") + total, 0)
+		if available:
+			changes["available_copies"] = Greatest(F("available_copies") + available, 0)
+		if not changes:
+			return 0
+		return self.update(updated_at=timezone.now(), **changes)
+
+	def recount_copies(self) -> int:
+		"""Recompute the copy counters from BookCopy rows in one set-based UPDATE."""
+
+		counts = (
+			BookCopy.objects.filter(book=OuterRef("pk"))
+			.order_by()
+			.values("book")
+			.annotate(
+				total=Count("pk"),
+				available=Count("pk", filter=Q(status=BookCopy.Status.AVAILABLE)),
+			)
+		)
+		return self.update(
+			total_copies=Coalesce(Subquery(counts.values("total")), 0, output_field=IntegerField()),
+			available_copies=Coalesce(Subquery(counts.values("available")), 0, output_field=IntegerField()),
+			updated_at=timezone.now(),
+		)
+
+	def touch(self) -> int:
+		"""Bump updated_at, e.g. after a copy change that leaves the counters alone."""
+
+		return self.update(updated_at=timezone.now())
+
+	def fingerprint(self) -> tuple[int, Optional[datetime]]:
+		"""Return ``(count, latest updated_at)`` for building a list ETag in one query.
+
+		Copy writes and category renames bump ``updated_at`` on their books, and the
+		count catches deletions, so the pair changes whenever a listing would.
+		"""
+
+		result = self.order_by().aggregate(count=Count("pk"), last_modified=Max("updated_at"))
+		return result["count"], result["last_modified"]
+
+
 class Book(models.Model):
 	title = models.CharField(max_length=255)
 	author = models.CharField(max_length=255)
@@ -40,8 +98,16 @@ class Book(models.Model):
 	cover_image = models.ImageField(upload_to="book_covers/", blank=True, null=True)
 	language = models.CharField(max_length=60, blank=True)
 	created_at = models.DateTimeField(auto_now_add=True)
+	# Also bumped by copy status changes (see BookQuerySet), so it versions everything
+	# a book page or API payload shows; the HTTP ETags are derived from it.
 	updated_at = models.DateTimeField(auto_now=True)
 	tags = models.JSONField(default=list, blank=True)
+	# Denormalized from BookCopy and maintained by BookCopy.save() and the
+	# post_delete handler in catalog.signals; `manage.py recount_copies` repairs drift.
+	total_copies = models.PositiveIntegerField(default=0, editable=False)
+	available_copies = models.PositiveIntegerField(default=0, editable=False)
+
+	objects = BookQuerySet.as_manager()
 
 	class Meta:
 		ordering = ["title"]
@@ -49,6 +115,9 @@ class Book(models.Model):
 			models.Index(fields=["title"]),
 			models.Index(fields=["author"]),
 			models.Index(fields=["isbn"]),
+			models.Index(fields=["title", "id"], name="catalog_book_title_id_idx"),
+			# Catalogue filtered by category, still paged in title order.
+			models.Index(fields=["category", "title", "id"], name="catalog_book_category_idx"),
 		]
 
 	def __str__(self) -> str:
@@ -57,18 +126,6 @@ class Book(models.Model):
 	def get_absolute_url(self):
 		return reverse("catalog:book-detail", args=[self.pk])
 
-	@property
-	def total_copies(self) -> int:
-		return getattr(self, "_total_copies", self.copies.count())
-
-	@total_copies.setter
-	def total_copies(self, value: int) -> None:
-		self._total_copies = value
-
-	@property
-	def available_copies(self) -> int:
-		return self.copies.filter(status=BookCopy.Status.AVAILABLE).count()
-
 
 class BookCopy(models.Model):
 	class Status(models.TextChoices):
@@ -92,6 +149,41 @@ class BookCopy(models.Model):
 	def __str__(self) -> str:
 		return f"{self.book.title} - {self.barcode}"
 
+	def save(self, *args, **kwargs):
+		update_fields = kwargs.get("update_fields")
+		if update_fields is not None and not {"status", "book", "book_id"} & set(update_fields):
+			super().save(*args, **kwargs)
+			Book.objects.filter(pk=self.book_id).touch()
+			return
+
+		with transaction.atomic():
+			previous = None
+			if not self._state.adding:
+				# Lock the row and read what is actually stored, so concurrent status
+				# changes on the same copy cannot apply the same delta twice.
+				previous = (
+					BookCopy.objects.select_for_update()
+					.filter(pk=self.pk)
+					.order_by()
+					.values_list("book_id", "status")
+					.first()
+				)
+			super().save(*args, **kwargs)
+
+			available = self.status == self.Status.AVAILABLE
+			if previous is None:
+				Book.objects.filter(pk=self.book_id).adjust_copy_counters(total=1, available=int(available))
+				return
+			previous_book_id, previous_status = previous
+			was_available = previous_status == self.Status.AVAILABLE
+			if previous_book_id != self.book_id:
+				Book.objects.filter(pk=previous_book_id).adjust_copy_counters(total=-1, available=-int(was_available))
+				Book.objects.filter(pk=self.book_id).adjust_copy_counters(total=1, available=int(available))
+			elif available != was_available:
+				Book.objects.filter(pk=self.book_id).adjust_copy_counters(available=1 if available else -1)
+			else:
+				Book.objects.filter(pk=self.book_id).touch()
+
 	def mark_available(self):
 		self.status = self.Status.AVAILABLE
 		self.save(update_fields=["status"])
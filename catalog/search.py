@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import re
+
+from typing import Iterable, Optional
+
+from django.db import connection, connections
+from django.db.models import F, FloatField, Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+
+# The index is a side table kept in sync with catalog_book and catalog_category by
+# database triggers. Because the triggers run inside the database, rows written
+# through save(), delete(), bulk_create(), queryset.update() or raw SQL are all
+# indexed without any Python-side hooks.
+SQLITE_TABLE = "catalog_book_fts"
+POSTGRES_TABLE = "catalog_book_search"
+
+SQLITE_SCHEMA = [
+	f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE}
+	USING fts5(title, author, isbn, category, tokenize='unicode61', prefix='2 3')""",
+	f"""CREATE TRIGGER IF NOT EXISTS catalog_book_fts_insert AFTER INSERT ON catalog_book BEGIN
+		INSERT INTO {SQLITE_TABLE} (rowid, title, author, isbn, category)
+		VALUES (new.id, new.title, new.author, new.isbn,
+			(SELECT name FROM catalog_category WHERE id = new.category_id));
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS catalog_book_fts_update
+	AFTER UPDATE OF title, author, isbn, category_id ON catalog_book BEGIN
+		DELETE FROM {SQLITE_TABLE} WHERE rowid = old.id;
+		INSERT INTO {SQLITE_TABLE} (rowid, title, author, isbn, category)
+		VALUES (new.id, new.title, new.author, new.isbn,
+			(SELECT name FROM catalog_category WHERE id = new.category_id));
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS catalog_book_fts_delete AFTER DELETE ON catalog_book BEGIN
+		DELETE FROM {SQLITE_TABLE} WHERE rowid = old.id;
+	END""",
+	f"""CREATE TRIGGER IF NOT EXISTS catalog_category_fts_update
+	AFTER UPDATE OF name ON catalog_category BEGIN
+		UPDATE {SQLITE_TABLE} SET category = new.name
+		WHERE rowid IN (SELECT id FROM catalog_book WHERE category_id = new.id);
+	END""",
+]
+
+SQLITE_TRIGGER_TEARDOWN = [
+	"DROP TRIGGER IF EXISTS catalog_book_fts_insert",
+	"DROP TRIGGER IF EXISTS catalog_book_fts_update",
+	"DROP TRIGGER IF EXISTS catalog_book_fts_delete",
+	"DROP TRIGGER IF EXISTS catalog_category_fts_update",
+]
+
+SQLITE_TEARDOWN = [*SQLITE_TRIGGER_TEARDOWN, f"DROP TABLE IF EXISTS {SQLITE_TABLE}"]
+
+POSTGRES_SCHEMA = [
+	"""CREATE OR REPLACE FUNCTION catalog_book_document(title text, author text, isbn text, category text)
+	RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+		SELECT setweight(to_tsvector('simple', coalesce(title, '')), 'A')
+			|| setweight(to_tsvector('simple', coalesce(isbn, '')), 'A')
+			|| setweight(to_tsvector('simple', coalesce(author, '')), 'B')
+			|| setweight(to_tsvector('simple', coalesce(category, '')), 'C')
+	$$""",
+	f"""CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} (
+		book_id bigint PRIMARY KEY REFERENCES catalog_book (id) ON DELETE CASCADE,
+		document tsvector NOT NULL
+	)""",
+	f"CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_document_gin ON {POSTGRES_TABLE} USING GIN (document)",
+	f"""CREATE OR REPLACE FUNCTION catalog_book_search_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+	BEGIN
+		INSERT INTO {POSTGRES_TABLE} (book_id, document)
+		SELECT NEW.id, catalog_book_document(NEW.title, NEW.author, NEW.isbn, c.name)
+		FROM catalog_category c WHERE c.id = NEW.category_id
+		ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document;
+		RETURN NULL;
+	END $$""",
+	f"""CREATE OR REPLACE FUNCTION catalog_category_search_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+	BEGIN
+		UPDATE {POSTGRES_TABLE} s
+		SET document = catalog_book_document(b.title, b.author, b.isbn, NEW.name)
+		FROM catalog_book b
+		WHERE b.id = s.book_id AND b.category_id = NEW.id;
+		RETURN NULL;
+	END $$""",
+	"DROP TRIGGER IF EXISTS catalog_book_search_refresh ON catalog_book",
+	"""CREATE TRIGGER catalog_book_search_refresh
+	AFTER INSERT OR UPDATE OF title, author, isbn, category_id ON catalog_book
+	FOR EACH ROW EXECUTE FUNCTION catalog_book_search_refresh()""",
+	"DROP TRIGGER IF EXISTS catalog_category_search_refresh ON catalog_category",
+	"""CREATE TRIGGER catalog_category_search_refresh
+	AFTER UPDATE OF name ON catalog_category
+	FOR EACH ROW EXECUTE FUNCTION catalog_category_search_refresh()""",
+]
+
+POSTGRES_TEARDOWN = [
+	"DROP TRIGGER IF EXISTS catalog_book_search_refresh ON catalog_book",
+	"DROP TRIGGER IF EXISTS catalog_category_search_refresh ON catalog_category",
+	f"DROP TABLE IF EXISTS {POSTGRES_TABLE}",
+	"DROP FUNCTION IF EXISTS catalog_book_search_refresh()",
+	"DROP FUNCTION IF EXISTS catalog_category_search_refresh()",
+	"DROP FUNCTION IF EXISTS catalog_book_document(text, text, text, text)",
+]
+
+# Indexed columns and the tsvector weight each is stored under on PostgreSQL. Title
+# and ISBN share a weight, so restricting to one of them there also searches the other.
+INDEXED_FIELDS = {"title": "A", "isbn": "A", "author": "B", "category": "C"}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query: str) -> list[str]:
+	"""Split free text into the word tokens understood by both backends."""
+
+	return _TOKEN_RE.findall(query or "")
+
+
+def is_supported(using=None) -> bool:
+	return (using or connection).vendor in {"sqlite", "postgresql"}
+
+
+def install_schema(using=None) -> None:
+	"""Create the index table and its triggers if they are missing.
+
+	SQLite drops a table's triggers whenever a migration rebuilds catalog_book, so this
+	also runs after every ``migrate`` (see ``CatalogConfig.ready``) and is idempotent.
+	"""
+
+	using = using or connection
+	statements = {"sqlite": SQLITE_SCHEMA, "postgresql": POSTGRES_SCHEMA}.get(using.vendor, [])
+	with using.cursor() as cursor:
+		for statement in statements:
+			cursor.execute(statement)
+
+
+def drop_schema(using=None) -> None:
+	using = using or connection
+	statements = {"sqlite": SQLITE_TEARDOWN, "postgresql": POSTGRES_TEARDOWN}.get(using.vendor, [])
+	with using.cursor() as cursor:
+		for statement in statements:
+			cursor.execute(statement)
+
+
+def drop_triggers(using=None) -> None:
+	"""Drop the SQLite sync triggers ahead of a migration that rebuilds catalog_book.
+
+	SQLite refuses to rename the rebuilt table while another trigger still references
+	it, so such migrations call this first and ``install_schema`` afterwards.
+	"""
+
+	using = using or connection
+	if using.vendor != "sqlite":
+		return
+	with using.cursor() as cursor:
+		for statement in SQLITE_TRIGGER_TEARDOWN:
+			cursor.execute(statement)
+
+
+def _sqlite_match(tokens: list[str], fields: list[str]) -> str:
+	# Quote every token so user input can never inject FTS5 operators, and use
+	# prefix matching to keep the search-as-you-type behaviour of icontains.
+	match = " ".join(f'"{token}"*' for token in tokens)
+	if len(fields) < len(INDEXED_FIELDS):
+		match = f"{{{' '.join(fields)}}} : ({match})"
+	return match
+
+
+def _postgres_match(tokens: list[str], fields: list[str]) -> str:
+	weights = ""
+	if len(fields) < len(INDEXED_FIELDS):
+		weights = "".join(sorted({INDEXED_FIELDS[field] for field in fields}))
+	return " & ".join(f"{token}:*{weights}" for token in tokens)
+
+
+def _icontains_filter(queryset: QuerySet, query: str, fields: list[str]) -> QuerySet:
+	lookups = {field: "category__name" if field == "category" else field for field in fields}
+	condition = Q()
+	for field in fields:
+		condition |= Q(**{f"{lookups[field]}__icontains": query})
+	return queryset.filter(condition)
+
+
+def search_books(
+	queryset: QuerySet,
+	query: str,
+	order_by_rank: bool = True,
+	fields: Optional[Iterable[str]] = None,
+) -> QuerySet:
+	"""Restrict a Book queryset to full-text matches for ``query``.
+
+	Matches are annotated with ``search_rank`` (higher is more relevant) and, unless
+	``order_by_rank`` is False, ordered by it with title as the tie-breaker. ``fields``
+	limits the match to some of the ``INDEXED_FIELDS``; by default all are searched.
+
+	The index matches word prefixes, not arbitrary substrings. So that a partial ISBN
+	still finds its book, a query made only of digits also matches ISBNs containing
+	them; those rows are not in the index match and rank last.
+	"""
+
+	fields = list(INDEXED_FIELDS if fields is None else fields)
+	unknown = set(fields) - set(INDEXED_FIELDS)
+	if unknown:
+		raise ValueError(f"Not in the search index: {', '.join(sorted(unknown))}")
+	tokens = tokenize(query)
+	if not tokens or not fields:
+		return queryset
+	using = connections[queryset.db]
+	if not is_supported(using):
+		return _icontains_filter(queryset, query, fields)
+
+	table = queryset.model._meta.db_table
+	if using.vendor == "sqlite":
+		match = _sqlite_match(tokens, fields)
+		matches = RawSQL(f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s", [match])
+		# bm25() is negative with lower meaning better; flip it so every backend
+		# exposes "higher is more relevant". Column weights: title, author, isbn, category.
+		rank = RawSQL(
+			f"SELECT -bm25({SQLITE_TABLE}, 10.0, 5.0, 10.0, 1.0) FROM {SQLITE_TABLE} "
+			f"WHERE {SQLITE_TABLE} MATCH %s AND rowid = {table}.id",
+			[match],
+			output_field=FloatField(),
+		)
+	else:
+		match = _postgres_match(tokens, fields)
+		matches = RawSQL(
+			f"SELECT book_id FROM {POSTGRES_TABLE} WHERE document @@ to_tsquery('simple', %s)",
+			[match],
+		)
+		rank = RawSQL(
+			f"SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {POSTGRES_TABLE} "
+			f"WHERE book_id = {table}.id",
+			[match],
+			output_field=FloatField(),
+		)
+
+	condition = Q(pk__in=matches)
+	if "isbn" in fields and all(token.isdigit() for token in tokens):
+		condition |= Q(isbn__contains="".join(tokens))
+	queryset = queryset.filter(condition).annotate(search_rank=rank)
+	if order_by_rank:
+		queryset = queryset.order_by(F("search_rank").desc(nulls_last=True), "title", "pk")
+	return queryset
+
+
+def rebuild_index(using=None) -> int:
+	"""Repopulate the search index from scratch and return the number of rows indexed."""
+
+	using = using or connection
+	with using.cursor() as cursor:
+		if using.vendor == "sqlite":
+			cursor.execute(f"DELETE FROM {SQLITE_TABLE}")
+			cursor.execute(
+				f"INSERT INTO {SQLITE_TABLE} (rowid, title, author, isbn, category) "
+				"SELECT b.id, b.title, b.author, b.isbn, c.name "
+				"FROM catalog_book b JOIN catalog_category c ON c.id = b.category_id"
+			)
+		elif using.vendor == "postgresql":
+			cursor.execute(f"DELETE FROM {POSTGRES_TABLE}")
+			cursor.execute(
+				f"INSERT INTO {POSTGRES_TABLE} (book_id, document) "
+				"SELECT b.id, catalog_book_document(b.title, b.author, b.isbn, c.name) "
+				"FROM catalog_book b JOIN catalog_category c ON c.id = b.category_id"
+			)
+		else:
+			return 0
+		return cursor.rowcount
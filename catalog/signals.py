@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.db import connections
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from . import search
+from .models import Book, BookCopy
+
+
+def ensure_search_schema(sender: Any, using: str = "default", **_: Any) -> None:
+	"""Reinstall the full-text index triggers after migrations have run."""
+
+	connection = connections[using]
+	if not search.is_supported(connection):
+		return
+	if "catalog_book" not in connection.introspection.table_names():
+		return
+	search.install_schema(connection)
+
+
+@receiver(post_delete, sender=BookCopy)
+def release_copy_counters(sender: type[BookCopy], instance: BookCopy, **_: Any) -> None:
+	"""Keep the denormalized copy counters on Book in step with deleted copies."""
+
+	Book.objects.filter(pk=instance.book_id).adjust_copy_counters(
+		total=-1,
+		available=-int(instance.status == BookCopy.Status.AVAILABLE),
+	)
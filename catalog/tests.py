@@ -1,3 +1,380 @@
-from django.test import TestCase
+import hashlib
+import json
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+
+from accounts.models import User
+from circulation.models import Fine, Loan, Reservation
+from library_management.pagination import encode_cursor
+
+from . import search
+from .models import Book, BookCopy, Category
+from .views import BookListView
+
+
+class CatalogTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Fiction")
+        cls.book = Book.objects.create(
+            title="Dune", author="Frank Herbert", isbn="9780441013593", category=cls.category
+        )
+        cls.other = Book.objects.create(
+            title="Emma", author="Jane Austen", isbn="9780141439587", category=cls.category
+        )
+
+    def assertCounters(self, book, total, available):
+        book.refresh_from_db()
+        self.assertEqual((book.total_copies, book.available_copies), (total, available))
+
+
+class CopyCounterTests(CatalogTestCase):
+    def test_adding_copies_counts_them(self):
+        BookCopy.objects.create(book=self.book, barcode="C1")
+        BookCopy.objects.create(book=self.book, barcode="C2", status=BookCopy.Status.MAINTENANCE)
+
+        self.assertCounters(self.book, 2, 1)
+
+    def test_status_changes_move_available_count(self):
+        copy = BookCopy.objects.create(book=self.book, barcode="C1")
+
+        copy.status = BookCopy.Status.ON_LOAN
+        copy.save(update_fields=["status"])
+        self.assertCounters(self.book, 1, 0)
+
+        copy.status = BookCopy.Status.LOST
+        copy.save()
+        self.assertCounters(self.book, 1, 0)
+
+        copy.mark_available()
+        self.assertCounters(self.book, 1, 1)
+
+    def test_saving_a_stale_instance_does_not_apply_the_change_twice(self):
+        copy = BookCopy.objects.create(book=self.book, barcode="C1")
+        stale = BookCopy.objects.get(pk=copy.pk)
+
+        copy.status = BookCopy.Status.ON_LOAN
+        copy.save()
+        stale.status = BookCopy.Status.ON_LOAN
+        stale.save()
+
+        self.assertCounters(self.book, 1, 0)
+
+    def test_moving_a_copy_to_another_book(self):
+        copy = BookCopy.objects.create(book=self.book, barcode="C1")
+
+        copy.book = self.other
+        copy.save()
+
+        self.assertCounters(self.book, 0, 0)
+        self.assertCounters(self.other, 1, 1)
+
+    def test_deleting_copies_releases_them(self):
+        kept = BookCopy.objects.create(book=self.book, barcode="C1")
+        BookCopy.objects.create(book=self.book, barcode="C2", status=BookCopy.Status.ON_LOAN)
+        BookCopy.objects.create(book=self.book, barcode="C3")
+
+        BookCopy.objects.exclude(pk=kept.pk).delete()
+
+        self.assertCounters(self.book, 1, 1)
+
+    def test_counters_never_go_negative(self):
+        Book.objects.filter(pk=self.book.pk).adjust_copy_counters(total=-3, available=-3)
+
+        self.assertCounters(self.book, 0, 0)
+
+    def test_recount_repairs_drift(self):
+        BookCopy.objects.create(book=self.book, barcode="C1")
+        BookCopy.objects.create(book=self.book, barcode="C2", status=BookCopy.Status.ON_LOAN)
+        # Queryset updates bypass BookCopy.save(), so the counters drift.
+        BookCopy.objects.filter(book=self.book).update(status=BookCopy.Status.AVAILABLE)
+        Book.objects.filter(pk=self.other.pk).update(total_copies=7, available_copies=7)
+        self.assertCounters(self.book, 2, 1)
+
+        call_command("recount_copies", stdout=StringIO())
+
+        self.assertCounters(self.book, 2, 2)
+        self.assertCounters(self.other, 0, 0)
+
+
+class ImportCatalogTests(CatalogTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, text):
+        path = self.directory / name
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command("import_catalog", path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_import_creates_books_copies_and_categories(self):
+        path = self.write(
+            "books.csv",
+            "isbn,title,author,category,copies,tags,publication_date\n"
+            "978-0-553-29335-7,Foundation,Isaac Asimov,Science Fiction,2,classic;space,1951\n"
+            "0-394-58216-4,Beloved,Toni Morrison,,,,\n",
+        )
+
+        output = self.run_import(path, "--copies", "3")
+
+        self.assertIn("Imported 2 of 2 records (0 rejected)", output)
+        foundation = Book.objects.get(isbn="9780553293357")
+        self.assertEqual(foundation.category.name, "Science Fiction")
+        self.assertEqual(foundation.tags, ["classic", "space"])
+        self.assertEqual(foundation.publication_date.year, 1951)
+        self.assertEqual((foundation.total_copies, foundation.available_copies), (2, 2))
+        beloved = Book.objects.get(isbn="0394582164")
+        self.assertEqual(beloved.category.name, "Uncategorized")
+        self.assertEqual(beloved.copies.count(), 3)
+
+    def test_reimport_updates_books_without_duplicating_copies(self):
+        path = self.write("first.csv", "isbn,title,author,copies\n9780441013593,Dune,Frank Herbert,2\n")
+        self.run_import(path)
+        path = self.write(
+            "second.jsonl",
+            json.dumps({"isbn": "9780441013593", "title": "Dune (Deluxe)", "author": "Frank Herbert", "copies": 2})
+            + "\n",
+        )
+
+        output = self.run_import(path)
+
+        self.assertIn("Books created: 0 | Books updated: 1 | Copies created: 0", output)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "Dune (Deluxe)")
+        self.assertEqual(self.book.copies.count(), 2)
+        self.assertEqual(self.book.total_copies, 2)
+
+    def test_last_occurrence_in_a_batch_wins(self):
+        path = self.write(
+            "books.csv",
+            "isbn,title,author\n9780553293357,First,Isaac Asimov\n9780553293357,Second,Isaac Asimov\n",
+        )
+
+        self.run_import(path)
+
+        self.assertEqual(Book.objects.get(isbn="9780553293357").title, "Second")
+
+    def test_bad_records_are_rejected_and_reported(self):
+        path = self.write(
+            "books.jsonl",
+            '{"isbn": "123", "title": "Short", "author": "A"}\n'
+            '{"isbn": "9780553293357", "title": "", "author": "Isaac Asimov"}\n'
+            '{"isbn": "9780553293357", "title": "Foundation", "author": "Isaac Asimov", "copies": "many"}\n'
+            "not json\n"
+            '{"isbn": "9780394582160", "title": "Beloved", "author": "Toni Morrison"}\n',
+        )
+        rejects = self.directory / "rejects.jsonl"
+
+        output = self.run_import(path, "--rejects", str(rejects))
+
+        self.assertIn("Imported 1 of 5 records (4 rejected)", output)
+        reasons = [json.loads(line)["reason"] for line in rejects.read_text().splitlines()]
+        self.assertEqual(reasons[0], "invalid ISBN '123'")
+        self.assertEqual(reasons[1], "missing title")
+        self.assertEqual(reasons[2], "invalid copies value 'many'")
+        self.assertTrue(reasons[3].startswith("invalid JSON"))
+        self.assertTrue(Book.objects.filter(isbn="9780394582160").exists())
+
+    def test_missing_file_and_bad_options_fail(self):
+        with self.assertRaisesMessage(CommandError, "Cannot open"):
+            self.run_import(str(self.directory / "missing.csv"))
+        with self.assertRaisesMessage(CommandError, "--batch-size"):
+            self.run_import(self.write("books.csv", "isbn,title,author\n"), "--batch-size", "0")
+
+
+class BookListPaginationTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user("member", password="pw", role=User.Role.MEMBER)
+        # Long runs of equal titles put page edges in the middle of a tie.
+        Book.objects.bulk_create(
+            Book(title=f"Title {index % 3}", author="A", isbn=f"97800000{index:05d}", category=cls.category)
+            for index in range(31)
+        )
+
+    def page(self, cursor=None):
+        request = RequestFactory().get("/catalog/", {"cursor": cursor} if cursor else {})
+        request.user = self.user
+        return BookListView.as_view()(request).context_data["page_obj"]
+
+    def test_walking_every_page_visits_each_book_once(self):
+        expected = list(Book.objects.order_by("title", "id").values_list("pk", flat=True))
+        pages, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = self.page(cursor)
+            pages.append([book.pk for book in page])
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual([len(rows) for rows in pages], [12, 12, 9])
+        self.assertEqual([pk for rows in pages for pk in rows], expected)
+
+        # Walking back from the last page returns the same pages in reverse.
+        back = []
+        while page.has_previous():
+            page = self.page(page.previous_cursor)
+            back.append([book.pk for book in page])
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in ("not-a-cursor", encode_cursor(["Title 1"]), encode_cursor(["Title 1", "seven"]), "e30"):
+            with self.subTest(cursor=cursor), self.assertRaises(Http404):
+                self.page(cursor)
+
+
+SEED_OPTIONS = ("--books", "24", "--members", "12", "--librarians", "2", "--loans", "30", "--shard-size", "7")
+
+
+# Generated rows depend on --seed and the seeding time only, so the clock is pinned.
+@mock.patch("django.utils.timezone.now", return_value=datetime(2025, 6, 1, 12, tzinfo=dt_timezone.utc))
+class SeedLibraryTests(TestCase):
+    def seed(self, *args):
+        call_command("seed_library", *SEED_OPTIONS, *args, stdout=StringIO())
+
+    def digest(self):
+        """Hash every seeded table by natural keys; passwords are salted per run."""
+
+        tables = [
+            Category.objects.values_list("name", "description"),
+            Book.objects.values_list(
+                "isbn", "title", "author", "category__name", "publication_date", "language", "tags", "total_copies"
+            ),
+            BookCopy.objects.values_list("barcode", "book__isbn", "location", "status"),
+            User.objects.values_list("username", "email", "role", "first_name", "last_name"),
+            Loan.objects.values_list(
+                "copy__barcode", "borrower__username", "issued_by__username", "issued_at", "due_at", "returned_at"
+            ),
+            Fine.objects.values_list("loan__copy__barcode", "member__username", "amount", "is_paid"),
+            Reservation.objects.values_list("book__isbn", "member__username", "status", "position"),
+        ]
+        digest = hashlib.sha256()
+        for rows in tables:
+            digest.update(repr(sorted(map(repr, rows))).encode())
+        return digest.hexdigest()
+
+    def seed_and_discard(self, *args):
+        with transaction.atomic():
+            self.seed(*args)
+            digest = self.digest()
+            transaction.set_rollback(True)
+        return digest
+
+    def test_worker_count_does_not_change_the_data(self, _now):
+        single = self.seed_and_discard("--workers", "1")
+        pooled = self.seed_and_discard("--workers", "2")
+
+        self.assertEqual(single, pooled)
+        self.assertNotEqual(single, self.seed_and_discard("--workers", "1", "--seed", "7"))
+
+    def test_rerunning_tops_up_to_the_targets(self, _now):
+        self.seed()
+        counts = [model.objects.count() for model in (Book, BookCopy, User, Loan)]
+        self.assertEqual((counts[0], counts[3]), (24, 30))
+
+        self.seed()
+        self.assertEqual([model.objects.count() for model in (Book, BookCopy, User, Loan)], counts)
+
+        call_command("seed_library", "--books", "30", "--members", "12", "--loans", "35", stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 30)
+        self.assertEqual(Loan.objects.count(), 35)
+        self.assertEqual(Book.objects.values("isbn").distinct().count(), 30)
+        self.assertEqual(User.objects.filter(role=User.Role.MEMBER).count(), 12)
+
+    def test_invalid_options_fail(self, _now):
+        with self.assertRaisesMessage(CommandError, "must be positive"):
+            self.seed("--workers", "0")
+
+
+class SearchTests(CatalogTestCase):
+    def titles(self, query, **kwargs):
+        return list(search.search_books(Book.objects.all(), query, **kwargs).values_list("title", flat=True))
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(self.titles("dune"), ["Dune"])
+
+        self.book.title = "Children of Dune"
+        self.book.save()
+        self.assertEqual(self.titles("children"), ["Children of Dune"])
+        Book.objects.filter(pk=self.other.pk).update(author="J. Austen")
+        self.assertEqual(self.titles("jane"), [])
+        self.assertEqual(self.titles("austen"), ["Emma"])
+
+        self.book.delete()
+        self.assertEqual(self.titles("children"), [])
+
+    def test_bulk_created_books_are_indexed(self):
+        Book.objects.bulk_create(
+            [
+                Book(title="Foundation", author="Isaac Asimov", isbn="9780553293357", category=self.category),
+                Book(title="I, Robot", author="Isaac Asimov", isbn="9780553382563", category=self.category),
+            ]
+        )
+
+        self.assertEqual(self.titles("asimov"), ["Foundation", "I, Robot"])
+
+    def test_category_rename_reindexes_its_books(self):
+        self.category.name = "Speculative"
+        self.category.save()
+
+        self.assertEqual(self.titles("speculative"), ["Dune", "Emma"])
+        self.assertEqual(self.titles("fiction"), [])
+
+    def test_prefixes_and_every_token_must_match(self):
+        self.assertEqual(self.titles("herb"), ["Dune"])
+        self.assertEqual(self.titles("frank herb"), ["Dune"])
+        self.assertEqual(self.titles("frank austen"), [])
+        # FTS operators in the input are searched for as words, not interpreted.
+        self.assertEqual(self.titles('dune" OR "emma'), [])
+
+    def test_matches_in_the_title_outrank_other_columns(self):
+        Book.objects.create(title="The Herbert Reader", author="Editors", isbn="9780000000011", category=self.category)
+
+        results = search.search_books(Book.objects.all(), "herbert")
+
+        self.assertEqual([book.title for book in results], ["The Herbert Reader", "Dune"])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+    def test_fields_limit_the_columns_searched(self):
+        self.assertEqual(self.titles("fiction", fields=["title", "author", "isbn"]), [])
+        self.assertEqual(self.titles("fiction", fields=["category"]), ["Dune", "Emma"])
+        with self.assertRaises(ValueError):
+            self.titles("dune", fields=["description"])
+
+    def test_digit_queries_match_inside_isbns(self):
+        self.assertEqual(self.titles("13593"), ["Dune"])
+        self.assertEqual(self.titles("978-0441"), ["Dune"])
+        self.assertEqual(self.titles("9780"), ["Dune", "Emma"])
+        self.assertEqual(self.titles("13593", fields=["title"]), [])
+
+    def test_unsupported_backends_fall_back_to_icontains(self):
+        with mock.patch.object(search, "is_supported", return_value=False):
+            self.assertEqual(self.titles("erber"), ["Dune"])
+            self.assertEqual(self.titles("fict", fields=["title"]), [])
+            self.assertEqual(sorted(self.titles("fict")), ["Dune", "Emma"])
+
+    @skipUnless(connection.vendor == "sqlite", "clears the SQLite FTS table directly")
+    def test_rebuild_restores_a_drifted_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.SQLITE_TABLE}")
+        self.assertEqual(self.titles("dune"), [])
+
+        call_command("rebuild_search_index", stdout=StringIO())
+
+        self.assertEqual(self.titles("dune"), ["Dune"])
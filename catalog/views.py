@@ -1,10 +1,10 @@
 from __future__ import annotations
 
+from functools import partial
 from typing import Any
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Q
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
@@ -13,34 +13,35 @@ from django.views.generic import CreateView, DeleteView, DetailView, ListView, U
 
 from accounts.models import User
 from accounts.permissions import RoleRequiredMixin
+from library_management.conditional import conditional_response, make_etag
+from library_management.pagination import KeysetPaginationMixin
 
 from .filters import BookFilter
 from .forms import BookCopyForm, BookForm
 from .models import Book, BookCopy, Category
+from .search import search_books
 
 
 @method_decorator(login_required, name="dispatch")
-class BookListView(ListView):
+class BookListView(KeysetPaginationMixin, ListView):
 	model = Book
 	template_name = "catalog/book_list.html"
 	paginate_by = 12
+	keyset_ordering = ("title", "id")
+
+	def get_keyset_ordering(self):
+		# Relevance-ranked search results keep page numbers; browsing uses keysets.
+		if self.request.GET.get("q"):
+			return None
+		return super().get_keyset_ordering()
 
 	def get_queryset(self):
-		queryset = (
-			Book.objects.select_related("category")
-			.annotate(total_copies=Count("copies"))
-			.order_by("title")
-		)
+		queryset = Book.objects.select_related("category").order_by("title")
 		self.filterset = BookFilter(self.request.GET or None, queryset=queryset)
 		search = self.request.GET.get("q")
 		filtered_qs = self.filterset.qs
 		if search:
-			filtered_qs = filtered_qs.filter(
-				Q(title__icontains=search)
-				| Q(author__icontains=search)
-				| Q(isbn__icontains=search)
-				| Q(category__name__icontains=search)
-			)
+			filtered_qs = search_books(filtered_qs, search)
 		return filtered_qs
 
 	def get_context_data(self, **kwargs: Any):
@@ -58,6 +59,23 @@ class BookDetailView(DetailView):
 	def get_queryset(self):
 		return Book.objects.select_related("category").prefetch_related("copies")
 
+	def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+		render = partial(super().get, request, *args, **kwargs)
+		last_modified = Book.objects.filter(pk=kwargs["pk"]).values_list("updated_at", flat=True).first()
+		# Pending flash messages are part of the page, so those responses are never 304s.
+		if last_modified is None or len(messages.get_messages(request)):
+			return render()
+		# The page shows role-specific actions and is translated, hence user and language.
+		etag = make_etag(
+			"catalog:book-detail",
+			kwargs["pk"],
+			last_modified.isoformat(),
+			request.user.pk,
+			request.user.role,
+			request.LANGUAGE_CODE,
+		)
+		return conditional_response(request, etag, render, last_modified)
+
 
 class BookCreateView(RoleRequiredMixin, CreateView):
 	model = Book
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CirculationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "circulation"
+
+    def ready(self):
+        # Import signal handlers when the app is ready.
+        from . import signals  # noqa: F401
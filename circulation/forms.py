@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from django import forms
 
+from accounts.models import User
 from catalog.models import Book, BookCopy
 
 from .models import Fine, Loan, Reservation
@@ -28,8 +29,12 @@ class LoanForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        available_copies = BookCopy.objects.filter(status=BookCopy.Status.AVAILABLE)
-        self.fields["copy"].queryset = available_copies.select_related("book")
+        # Reserved copies are listed so they can be lent to the member they are held for;
+        # Loan.clean() rejects them for anyone else.
+        lendable_copies = BookCopy.objects.filter(
+            status__in=[BookCopy.Status.AVAILABLE, BookCopy.Status.RESERVED]
+        )
+        self.fields["copy"].queryset = lendable_copies.select_related("book")
         for field in self.fields.values():
             css_class = _bootstrap_class(field.widget)
             existing = field.widget.attrs.get("class", "")
@@ -79,3 +84,55 @@ class FineForm(forms.ModelForm):
             css_class = _bootstrap_class(field.widget)
             existing = field.widget.attrs.get("class", "")
             field.widget.attrs["class"] = f"{existing} {css_class}".strip()
+
+
+class CirculationDeskForm(forms.Form):
+    MODE_CHECKOUT = "checkout"
+    MODE_RETURN = "return"
+
+    mode = forms.ChoiceField(
+        choices=((MODE_CHECKOUT, "Check out"), (MODE_RETURN, "Return")),
+        initial=MODE_CHECKOUT,
+        widget=forms.RadioSelect,
+    )
+    member = forms.CharField(
+        required=False,
+        help_text="Scan the membership card or type a username. Not needed for returns.",
+    )
+    barcodes = forms.CharField(
+        widget=forms.Textarea(attrs={"rows": 8, "autofocus": True}),
+        help_text="One barcode per line, in scan order.",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            css_class = _bootstrap_class(field.widget)
+            existing = field.widget.attrs.get("class", "")
+            field.widget.attrs["class"] = f"{existing} {css_class}".strip()
+
+    def clean_barcodes(self):
+        barcodes = [line.strip() for line in self.cleaned_data["barcodes"].splitlines() if line.strip()]
+        if not barcodes:
+            raise forms.ValidationError("Scan at least one barcode.")
+        if len(barcodes) > 200:
+            raise forms.ValidationError("Scan at most 200 barcodes at a time.")
+        return barcodes
+
+    def clean(self):
+        cleaned_data = super().clean()
+        identifier = (cleaned_data.get("member") or "").strip()
+        cleaned_data["borrower"] = None
+        if cleaned_data.get("mode") != self.MODE_CHECKOUT:
+            return cleaned_data
+        if not identifier:
+            self.add_error("member", "A member is required for checkout.")
+            return cleaned_data
+        borrower = (
+            User.objects.filter(profile__membership_id__iexact=identifier).first()
+            or User.objects.filter(username__iexact=identifier).first()
+        )
+        if borrower is None:
+            self.add_error("member", "No member matches this card or username.")
+        cleaned_data["borrower"] = borrower
+        return cleaned_data
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from circulation.services import accrue_fines
+
+
+class Command(BaseCommand):
+    help = "Recompute accrued fines for overdue loans in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Loans read and written per batch.")
+        parser.add_argument(
+            "--returned-within-days",
+            type=int,
+            default=30,
+            help="Also settle loans returned late within this many days.",
+        )
+        parser.add_argument(
+            "--sync-fines",
+            action="store_true",
+            help=(
+                "Create or adjust unpaid Fine rows so they add up to each loan's accrued amount. "
+                "Paid fines are never credited."
+            ),
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes without writing them.")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        result = accrue_fines(
+            chunk_size=options["chunk_size"],
+            returned_within=timedelta(days=options["returned_within_days"]),
+            sync_fines=options["sync_fines"],
+            dry_run=options["dry_run"],
+        )
+        prefix = "Dry run: would update" if options["dry_run"] else "Updated"
+        message = f"{prefix} {result.loans_updated} of {result.loans_scanned} loans"
+        if options["sync_fines"]:
+            message += (
+                f", {result.fines_created} fines created, {result.fines_adjusted} adjusted, "
+                f"{result.fines_removed} removed"
+            )
+        if result.over_billed:
+            self.stderr.write(
+                self.style.WARNING(
+                    f"{result.over_billed} loans are billed more in paid fines than they accrue; "
+                    "paid fines are never credited, so refund them by hand (see the log for loan ids)."
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"{message} (total accrued {result.total_accrued}) in {result.elapsed:.2f}s.")
+        )
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from circulation.services import sweep_overdue_loans
+
+
+class Command(BaseCommand):
+    help = "Mark open loans that are past their due date as overdue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Loans updated per statement.")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        result = sweep_overdue_loans(chunk_size=options["chunk_size"])
+        for index, (updated, duration) in enumerate(result.chunks, start=1):
+            self.stdout.write(f"  chunk {index}: {updated} loans in {duration * 1000:.1f} ms")
+        self.stdout.write(
+            self.style.SUCCESS(f"Marked {result.updated} loans overdue in {result.elapsed:.2f}s.")
+        )
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0004_book_keyset_index"),
+        ("circulation", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="fine",
+            index=models.Index(fields=["-issued_at", "id"], name="circulation_fine_keyset_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="loan",
+            index=models.Index(fields=["-issued_at", "id"], name="circulation_loan_keyset_idx"),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("circulation", "0002_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="loan",
+            index=models.Index(
+                condition=models.Q(("returned_at__isnull", True)),
+                fields=["status", "due_at"],
+                name="circulation_loan_open_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:09
+
+from django.db import migrations, models
+
+
+def compact_queues(apps, schema_editor):
+    # Positions were never renumbered before, so give every waitlist 1..n once.
+    Reservation = apps.get_model("circulation", "Reservation")
+    waiting = (
+        Reservation.objects.using(schema_editor.connection.alias)
+        .filter(status="PENDING")
+        .order_by("book_id", "position", "created_at", "pk")
+        .only("pk", "book_id", "position")
+    )
+    changed, current_book, position = [], None, 0
+    for reservation in waiting.iterator(chunk_size=2000):
+        position = position + 1 if reservation.book_id == current_book else 1
+        current_book = reservation.book_id
+        if reservation.position != position:
+            reservation.position = position
+            changed.append(reservation)
+    Reservation.objects.using(schema_editor.connection.alias).bulk_update(changed, ["position"], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("circulation", "0003_loan_open_due_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(fields=["book", "status", "position"], name="circulation_resv_queue_idx"),
+        ),
+        migrations.RunPython(compact_queues, migrations.RunPython.noop),
+    ]
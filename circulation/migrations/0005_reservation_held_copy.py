@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0004_book_keyset_index"),
+        ("circulation", "0004_reservation_queue_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reservation",
+            name="copy",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Copy set aside for the member once the reservation is notified.",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="holds",
+                to="catalog.bookcopy",
+            ),
+        ),
+    ]
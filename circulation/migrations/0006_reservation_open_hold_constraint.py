@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:14
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def cancel_duplicate_holds(apps, schema_editor):
+    # The old (book, member, status) constraint allowed a PENDING and a NOTIFIED hold
+    # side by side; keep the notified one.
+    Reservation = apps.get_model("circulation", "Reservation")
+    reservations = Reservation.objects.using(schema_editor.connection.alias)
+    notified = reservations.filter(book=OuterRef("book"), member=OuterRef("member"), status="NOTIFIED")
+    reservations.filter(Exists(notified), status="PENDING").update(status="CANCELLED")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("circulation", "0005_reservation_held_copy"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="reservation",
+            unique_together=set(),
+        ),
+        migrations.RunPython(cancel_duplicate_holds, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="reservation",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["PENDING", "NOTIFIED"])),
+                fields=("book", "member"),
+                name="unique_open_reservation_per_member",
+            ),
+        ),
+    ]
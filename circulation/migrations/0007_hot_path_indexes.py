@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0005_hot_path_indexes"),
+        ("circulation", "0006_reservation_open_hold_constraint"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="fine",
+            index=models.Index(
+                fields=["member", "is_paid", "-issued_at"],
+                name="circulation_fine_member_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="loan",
+            index=models.Index(
+                fields=["borrower", "returned_at"], name="circulation_loan_borrower_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="loan",
+            index=models.Index(
+                fields=["status", "-issued_at"], name="circulation_loan_status_idx"
+            ),
+        ),
+    ]
@@ -1,16 +1,21 @@
 from __future__ import annotations
 
+from collections import Counter
 from decimal import Decimal
-from typing import Optional
+from typing import Iterable, Optional
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.db import connections, models, transaction
+from django.db.models import Exists, F, Max, OuterRef, Q, Subquery, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
 from django.urls import reverse
 from django.utils import timezone
 
 from accounts.models import User
 from catalog.models import Book, BookCopy
+from monitoring import metrics
+from notifications.models import Notification
 
 
 class Loan(models.Model):
@@ -37,6 +42,18 @@ class Loan(models.Model):
 
 	class Meta:
 		ordering = ["-issued_at"]
+		indexes = [
+			models.Index(fields=["-issued_at", "id"], name="circulation_loan_keyset_idx"),
+			# Serves the overdue sweeper: only open loans are indexed.
+			models.Index(
+				fields=["status", "due_at"],
+				condition=Q(returned_at__isnull=True),
+				name="circulation_loan_open_due_idx",
+			),
+			# A member's open loans (the checkout limit) and the status filters and counts.
+			models.Index(fields=["borrower", "returned_at"], name="circulation_loan_borrower_idx"),
+			models.Index(fields=["status", "-issued_at"], name="circulation_loan_status_idx"),
+		]
 		constraints = [
 			models.UniqueConstraint(
 				fields=["copy"],
@@ -45,22 +62,80 @@ class Loan(models.Model):
 			)
 		]
 
+	HELD_FOR_OTHER_MESSAGE = "This copy is being held for another member's reservation."
+
 	def __str__(self) -> str:
 		return f"Loan of {self.copy} to {self.borrower}"
 
+	@staticmethod
+	def is_held_for_other(copy: BookCopy, borrower_id: int, holders: Optional[dict[int, int]] = None) -> bool:
+		"""Whether lending ``copy`` to ``borrower_id`` would take it from another member's hold.
+
+		A RESERVED copy may only be lent to the member whose NOTIFIED reservation points
+		at it. Batch callers pass ``holders`` from ``Reservation.objects.holders()`` so
+		the holds are read once; otherwise the copy's hold is looked up here.
+		"""
+
+		if copy.status != BookCopy.Status.RESERVED:
+			return False
+		if holders is None:
+			holders = Reservation.objects.holders([copy])
+		return holders.get(copy.pk) != borrower_id
+
+	def clean(self):
+		super().clean()
+		if self._state.adding and self.copy_id and self.borrower_id:
+			if Loan.is_held_for_other(self.copy, self.borrower_id):
+				raise ValidationError({"copy": self.HELD_FOR_OTHER_MESSAGE})
+
 	def save(self, *args, **kwargs):
 		is_new = self._state.adding
 		if not self.due_at:
 			self.due_at = self.issued_at + timezone.timedelta(days=settings.LOAN_PERIOD_DAYS)
 
 		self.status = self._determine_status()
-		super().save(*args, **kwargs)
-		if is_new:
-			self.copy.status = BookCopy.Status.ON_LOAN
-			self.copy.save(update_fields=["status"])
-		elif self.status == self.Status.RETURNED:
-			self.copy.status = BookCopy.Status.AVAILABLE
-			self.copy.save(update_fields=["status"])
+		# The copy status write also moves the book's availability counters, so keep
+		# the loan, the copy and the counters in one transaction.
+		with transaction.atomic():
+			was_returned = False
+			if is_new:
+				# Re-read the copy under lock: callers that skip clean(), or raced another
+				# desk since, must not take a copy held for someone else either.
+				self.copy.status = (
+					BookCopy.objects.select_for_update()
+					.filter(pk=self.copy_id)
+					.order_by()
+					.values_list("status", flat=True)
+					.get()
+				)
+				if Loan.is_held_for_other(self.copy, self.borrower_id):
+					raise ValidationError({"copy": self.HELD_FOR_OTHER_MESSAGE})
+			else:
+				# Only the save that first returns the loan hands the copy on: re-saving
+				# an old returned loan must not touch a copy that has since moved on.
+				was_returned = (
+					Loan.objects.select_for_update()
+					.filter(pk=self.pk)
+					.order_by()
+					.values_list("returned_at", flat=True)
+					.first()
+				) is not None
+			super().save(*args, **kwargs)
+			if is_new:
+				was_held = self.copy.status == BookCopy.Status.RESERVED
+				self.copy.status = BookCopy.Status.ON_LOAN
+				self.copy.save(update_fields=["status"])
+				if was_held:
+					Reservation.objects.filter(
+						copy_id=self.copy_id,
+						member_id=self.borrower_id,
+						status=Reservation.Status.NOTIFIED,
+					).update(status=Reservation.Status.FULFILLED, fulfilled_at=timezone.now())
+				metrics.CHECKOUTS.inc_on_commit(channel="single")
+			elif self.status == self.Status.RETURNED and not was_returned:
+				# Hands the copy to the next waiting member, or back to the shelf.
+				Reservation.objects.allocate([self.copy])
+				metrics.RETURNS.inc_on_commit(channel="single")
 
 	def _determine_status(self) -> str:
 		if self.returned_at:
@@ -88,6 +163,184 @@ class Loan(models.Model):
 		return reverse("circulation:loan-detail", args=[self.pk])
 
 
+class ReservationQuerySet(models.QuerySet):
+	def waiting(self, book=None) -> "ReservationQuerySet":
+		queryset = self.filter(status=Reservation.Status.PENDING)
+		if book is not None:
+			queryset = queryset.filter(book=book)
+		return queryset.order_by("position", "pk")
+
+	def holders(self, copies: Iterable[BookCopy]) -> dict[int, int]:
+		"""Map each RESERVED copy among ``copies`` to the member its NOTIFIED hold is for."""
+
+		reserved_ids = [copy.pk for copy in copies if copy.status == BookCopy.Status.RESERVED]
+		if not reserved_ids:
+			return {}
+		holds = self.filter(copy_id__in=reserved_ids, status=Reservation.Status.NOTIFIED)
+		return dict(holds.values_list("copy_id", "member_id"))
+
+	def next_in_line(self, book) -> Optional["Reservation"]:
+		"""Return the head of ``book``'s waitlist: one seek on (book, status, position)."""
+
+		return self.waiting(book).first()
+
+	def tail_position(self, book_id: int, exclude_pk: Optional[int] = None):
+		"""Expression for the position after the current last waiting entry of a book.
+
+		Evaluated inside the INSERT/UPDATE statement itself, so the read of the
+		current maximum and the write can never interleave with another writer's.
+		"""
+
+		waiting = Reservation.objects.filter(book_id=book_id, status=Reservation.Status.PENDING)
+		if exclude_pk is not None:
+			waiting = waiting.exclude(pk=exclude_pk)
+		last = (
+			waiting.order_by()
+			.values("book_id")
+			.annotate(last=Max("position"))
+			.values("last")
+		)
+		return Coalesce(Subquery(last), Value(0)) + 1
+
+	def allocate(self, copies: Iterable[BookCopy], from_status: str = BookCopy.Status.ON_LOAN) -> dict[int, "Reservation"]:
+		"""Route copies that have come back to the heads of their books' queues.
+
+		Runs in one transaction with the copy and book rows locked and a fixed number of
+		queries however many copies and waiting members there are: each copy that meets a
+		waiting reservation becomes RESERVED, the reservation NOTIFIED with a pickup
+		deadline, and a Notification is queued for the member; the others go back to
+		AVAILABLE. Copies no longer in ``from_status`` (e.g. a return submitted twice)
+		or still held by an open loan are left alone. Returns the notified reservations
+		keyed by copy id.
+		"""
+
+		copies = {copy.pk: copy for copy in copies}
+		with transaction.atomic():
+			locked = dict(
+				BookCopy.objects.select_for_update()
+				.filter(pk__in=copies, status=from_status)
+				.exclude(Exists(Loan.objects.filter(copy_id=OuterRef("pk"), returned_at__isnull=True)))
+				.order_by()
+				.values_list("pk", "book_id")
+			)
+			if not locked:
+				return {}
+			book_ids = sorted(set(locked.values()))
+			list(Book.objects.select_for_update().filter(pk__in=book_ids).order_by("pk").values_list("pk", flat=True))
+
+			wanted = Counter(locked.values())
+			heads: dict[int, list[Reservation]] = {}
+			ranked = (
+				self.filter(book_id__in=book_ids, status=Reservation.Status.PENDING)
+				.annotate(
+					queue_rank=Window(RowNumber(), partition_by=[F("book_id")], order_by=[F("position"), F("pk")])
+				)
+				.filter(queue_rank__lte=max(wanted.values()))
+				.select_related("book")
+				.order_by("book_id", "queue_rank")
+			)
+			for reservation in ranked:
+				heads.setdefault(reservation.book_id, []).append(reservation)
+
+			now = timezone.now()
+			expires_at = now + timezone.timedelta(days=settings.RESERVATION_HOLD_DAYS)
+			allocated: dict[int, Reservation] = {}
+			for copy_id, book_id in locked.items():
+				waiting = heads.get(book_id)
+				if waiting:
+					reservation = waiting.pop(0)
+					reservation.status = Reservation.Status.NOTIFIED
+					reservation.expires_at = expires_at
+					reservation.copy_id = copy_id
+					allocated[copy_id] = reservation
+
+			reserved_ids = list(allocated)
+			shelved_ids = [copy_id for copy_id in locked if copy_id not in allocated]
+			if reserved_ids:
+				BookCopy.objects.filter(pk__in=reserved_ids).update(status=BookCopy.Status.RESERVED)
+			if shelved_ids:
+				BookCopy.objects.filter(pk__in=shelved_ids).update(status=BookCopy.Status.AVAILABLE)
+			Book.objects.filter(pk__in=book_ids).recount_copies()
+			for copy_id in locked:
+				copies[copy_id].status = (
+					BookCopy.Status.RESERVED if copy_id in allocated else BookCopy.Status.AVAILABLE
+				)
+			if not allocated:
+				return {}
+
+			self.bulk_update(allocated.values(), ["status", "expires_at", "copy"])
+			self.renumber({reservation.book_id for reservation in allocated.values()})
+			Notification.objects.bulk_create(
+				[
+					Notification(
+						recipient_id=reservation.member_id,
+						category=Notification.Category.RESERVATION,
+						subject=f"{reservation.book.title} is ready for pickup",
+						message=(
+							f"A copy of {reservation.book.title} (barcode {copies[copy_id].barcode}) is being "
+							f"held for you until {timezone.localtime(expires_at):%Y-%m-%d %H:%M}."
+						),
+					)
+					for copy_id, reservation in allocated.items()
+				]
+			)
+			metrics.NOTIFICATIONS_SENT.inc_on_commit(
+				len(allocated), category=Notification.Category.RESERVATION, channel="in_app"
+			)
+			return allocated
+
+	def renumber(self, book_ids=None) -> int:
+		"""Compact waiting positions to 1..n per book, preserving queue order.
+
+		One ``UPDATE ... FROM (SELECT ROW_NUMBER() OVER (PARTITION BY book_id ...))``
+		statement; only rows whose position actually changes are written. Pass
+		``book_ids`` to limit the work to those books' queues.
+		"""
+
+		connection = connections[self.db]
+		if connection.vendor not in {"sqlite", "postgresql"}:
+			return self._renumber_in_python(book_ids)
+		quote = connection.ops.quote_name
+		table, position = quote(Reservation._meta.db_table), quote("position")
+		params: list = [Reservation.Status.PENDING]
+		book_filter = ""
+		if book_ids is not None:
+			book_ids = list(book_ids)
+			if not book_ids:
+				return 0
+			book_filter = f" AND book_id IN ({', '.join(['%s'] * len(book_ids))})"
+			params.extend(book_ids)
+		with connection.cursor() as cursor:
+			cursor.execute(
+				f"""UPDATE {table} SET {position} = ranked.queue_position
+				FROM (
+					SELECT id, ROW_NUMBER() OVER (
+						PARTITION BY book_id ORDER BY {position}, created_at, id
+					) AS queue_position
+					FROM {table}
+					WHERE status = %s{book_filter}
+				) AS ranked
+				WHERE {table}.id = ranked.id AND {table}.{position} <> ranked.queue_position""",
+				params,
+			)
+			return cursor.rowcount
+
+	def _renumber_in_python(self, book_ids) -> int:
+		waiting = Reservation.objects.using(self.db).filter(status=Reservation.Status.PENDING)
+		if book_ids is not None:
+			waiting = waiting.filter(book_id__in=book_ids)
+		changed, current_book, position = [], None, 0
+		waiting = waiting.order_by("book_id", "position", "created_at", "pk").only("pk", "book_id", "position")
+		for reservation in waiting:
+			position = position + 1 if reservation.book_id == current_book else 1
+			current_book = reservation.book_id
+			if reservation.position != position:
+				reservation.position = position
+				changed.append(reservation)
+		Reservation.objects.using(self.db).bulk_update(changed, ["position"])
+		return len(changed)
+
+
 class Reservation(models.Model):
 	class Status(models.TextChoices):
 		PENDING = "PENDING", "Pending"
@@ -102,29 +355,69 @@ class Reservation(models.Model):
 	fulfilled_at = models.DateTimeField(null=True, blank=True)
 	status = models.CharField(max_length=12, choices=Status.choices, default=Status.PENDING)
 	position = models.PositiveIntegerField(default=1)
+	copy = models.ForeignKey(
+		BookCopy,
+		on_delete=models.SET_NULL,
+		null=True,
+		blank=True,
+		related_name="holds",
+		help_text="Copy set aside for the member once the reservation is notified.",
+	)
 	notes = models.TextField(blank=True)
 
+	objects = ReservationQuerySet.as_manager()
+
 	class Meta:
 		ordering = ["created_at"]
-		unique_together = ("book", "member", "status")
+		indexes = [
+			models.Index(fields=["book", "status", "position"], name="circulation_resv_queue_idx"),
+		]
+		constraints = [
+			# Only one open hold per member and book; closed ones may repeat.
+			models.UniqueConstraint(
+				fields=["book", "member"],
+				condition=Q(status__in=["PENDING", "NOTIFIED"]),
+				name="unique_open_reservation_per_member",
+			)
+		]
 
 	def __str__(self) -> str:
 		return f"Reservation for {self.book} by {self.member}"
 
 	def save(self, *args, **kwargs):
-		if self._state.adding and not self.position:
-			next_position = (
-				Reservation.objects.filter(book=self.book, status=self.Status.PENDING)
-				.exclude(pk=self.pk)
-				.count()
-				+ 1
-			)
-			self.position = next_position
-		super().save(*args, **kwargs)
+		# Only PENDING entries hold a place in the book's queue. Enqueues and departures
+		# lock the book row so concurrent writers to one queue are serialised.
+		with transaction.atomic():
+			if self._state.adding:
+				if self.status == self.Status.PENDING:
+					self._lock_book(self.book_id)
+					self.position = Reservation.objects.tail_position(self.book_id)
+				super().save(*args, **kwargs)
+				if self.status == self.Status.PENDING:
+					self.refresh_from_db(fields=["position"])
+				return
+
+			previous = Reservation.objects.filter(pk=self.pk).values_list("book_id", "status").first()
+			was_waiting = previous is not None and previous[1] == self.Status.PENDING
+			is_waiting = self.status == self.Status.PENDING
+			moved = previous is not None and previous[0] != self.book_id
+			super().save(*args, **kwargs)
+			if was_waiting and (moved or not is_waiting):
+				self._lock_book(previous[0])
+				Reservation.objects.renumber([previous[0]])
+			if is_waiting and (moved or not was_waiting):
+				self._lock_book(self.book_id)
+				tail = Reservation.objects.tail_position(self.book_id, exclude_pk=self.pk)
+				Reservation.objects.filter(pk=self.pk).update(position=tail)
+				self.refresh_from_db(fields=["position"])
+
+	@staticmethod
+	def _lock_book(book_id: int) -> None:
+		list(Book.objects.select_for_update().filter(pk=book_id).order_by().values_list("pk", flat=True))
 
 	def mark_notified(self):
 		self.status = self.Status.NOTIFIED
-		self.expires_at = timezone.now() + timezone.timedelta(days=2)
+		self.expires_at = timezone.now() + timezone.timedelta(days=settings.RESERVATION_HOLD_DAYS)
 		self.save(update_fields=["status", "expires_at"])
 
 	def mark_fulfilled(self):
@@ -133,8 +426,13 @@ class Reservation(models.Model):
 		self.save(update_fields=["status", "fulfilled_at"])
 
 	def cancel(self):
-		self.status = self.Status.CANCELLED
-		self.save(update_fields=["status"])
+		with transaction.atomic():
+			held_copy = self.copy if self.status == self.Status.NOTIFIED else None
+			self.status = self.Status.CANCELLED
+			self.save(update_fields=["status"])
+			if held_copy is not None:
+				# Pass the copy that was set aside on to the next member in line.
+				Reservation.objects.allocate([held_copy], from_status=BookCopy.Status.RESERVED)
 
 
 class Fine(models.Model):
@@ -148,6 +446,11 @@ class Fine(models.Model):
 
 	class Meta:
 		ordering = ["-issued_at"]
+		indexes = [
+			models.Index(fields=["-issued_at", "id"], name="circulation_fine_keyset_idx"),
+			# "My fines": a member's fines, unpaid first, and their outstanding total.
+			models.Index(fields=["member", "is_paid", "-issued_at"], name="circulation_fine_member_idx"),
+		]
 
 	def __str__(self) -> str:
 		return f"Fine {self.amount} for {self.member}"
@@ -0,0 +1,437 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from typing import Iterable, Optional, Sequence
+
+from django.conf import settings
+from django.db import NotSupportedError, connections, transaction
+from django.db.models import BigIntegerField, F, Func, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import User
+from catalog.models import Book, BookCopy
+from monitoring import metrics
+
+from .models import Fine, Loan, Reservation
+from .signals import circulation_changed
+
+try:
+	import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+	np = None
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SweepResult:
+	updated: int = 0
+	chunks: list[tuple[int, float]] = field(default_factory=list)
+	elapsed: float = 0.0
+
+
+def sweep_overdue_loans(now: Optional[timezone.datetime] = None, chunk_size: int = 5000) -> SweepResult:
+	"""Flip every open ACTIVE loan past its due date to OVERDUE.
+
+	Each chunk is a single ``UPDATE ... WHERE id IN (SELECT id ... LIMIT n)`` in its own
+	short transaction, so row locks are held briefly even with millions of open loans.
+	"""
+
+	now = now or timezone.now()
+	result = SweepResult()
+	started = time.monotonic()
+	while True:
+		chunk_started = time.monotonic()
+		due = Loan.objects.filter(
+			status=Loan.Status.ACTIVE,
+			returned_at__isnull=True,
+			due_at__lt=now,
+		).order_by()
+		with transaction.atomic():
+			updated = Loan.objects.filter(pk__in=due.values("pk")[:chunk_size]).update(status=Loan.Status.OVERDUE)
+		if updated:
+			duration = time.monotonic() - chunk_started
+			result.chunks.append((updated, duration))
+			result.updated += updated
+			logger.info("Overdue sweep chunk: %s loans in %.3fs", updated, duration)
+		if updated < chunk_size:
+			break
+	result.elapsed = time.monotonic() - started
+	metrics.OVERDUE_SWEEPS.inc()
+	metrics.LOANS_MARKED_OVERDUE.inc(result.updated)
+	if result.updated:
+		circulation_changed.send(sender=Loan)
+	return result
+
+
+@dataclass
+class AccrualResult:
+	loans_scanned: int = 0
+	loans_updated: int = 0
+	fines_created: int = 0
+	fines_adjusted: int = 0
+	fines_removed: int = 0
+	over_billed: int = 0
+	total_accrued: Decimal = Decimal("0.00")
+	elapsed: float = 0.0
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECONDS_PER_DAY = 86_400_000_000
+
+
+def _microseconds(value: datetime) -> int:
+	return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+class EpochMicroseconds(Func):
+	"""Microseconds since the Unix epoch of a datetime expression, computed by the database."""
+
+	output_field = BigIntegerField()
+
+	def as_sql(self, compiler, connection, **extra_context):
+		raise NotSupportedError(f"EpochMicroseconds is not implemented for {connection.vendor}.")
+
+	def as_sqlite(self, compiler, connection, **extra_context):
+		sql, params = compiler.compile(self.source_expressions[0])
+		# Stored as UTC text "YYYY-MM-DD HH:MM:SS[.ffffff]". strftime('%s') would round the
+		# fraction, so whole seconds and microseconds are read separately.
+		return (
+			f"(CAST(strftime('%%s', substr({sql}, 1, 19)) AS INTEGER) * 1000000"
+			f" + CAST(substr({sql}, 21, 6) AS INTEGER))",
+			(*params, *params),
+		)
+
+	def as_postgresql(self, compiler, connection, **extra_context):
+		sql, params = compiler.compile(self.source_expressions[0])
+		return f"CAST(EXTRACT(EPOCH FROM {sql}) * 1000000 AS bigint)", params
+
+
+EPOCH_VENDORS = {"sqlite", "postgresql"}
+
+
+def _accrual_rows(queryset, now: datetime) -> list[tuple]:
+	"""``(pk, borrower_id, due_us, ended_us, fine_accrued)`` rows, times as epoch microseconds.
+
+	The database does the conversion where ``EpochMicroseconds`` supports it, so no
+	datetime objects are built per row; ``ended_us`` is the return time, or ``now``.
+	"""
+
+	if connections[queryset.db].vendor in EPOCH_VENDORS:
+		return list(
+			queryset.annotate(
+				due_us=EpochMicroseconds("due_at"),
+				ended_us=Coalesce(EpochMicroseconds("returned_at"), Value(_microseconds(now))),
+			).values_list("pk", "borrower_id", "due_us", "ended_us", "fine_accrued")
+		)
+	return [
+		(pk, borrower_id, _microseconds(due_at), _microseconds(returned_at or now), fine)
+		for pk, borrower_id, due_at, returned_at, fine in queryset.values_list(
+			"pk", "borrower_id", "due_at", "returned_at", "fine_accrued"
+		)
+	]
+
+
+def overdue_days(due_us: Sequence[int], ended_us: Sequence[int]) -> list[int]:
+	"""Whole days between each due time and return (or accrual) time, floored at zero.
+
+	Times are epoch microseconds. Uses one vectorised NumPy pass when NumPy is installed
+	and plain integer arithmetic otherwise; both agree with ``(ended - due).days`` as used
+	by ``Loan.calculate_overdue_fine``.
+	"""
+
+	if np is not None:
+		due = np.asarray(due_us, dtype=np.int64)
+		ended = np.asarray(ended_us, dtype=np.int64)
+		return np.maximum((ended - due) // _MICROSECONDS_PER_DAY, 0).tolist()
+	return [max((end - start) // _MICROSECONDS_PER_DAY, 0) for start, end in zip(due_us, ended_us)]
+
+
+def accrue_fines(
+	now: Optional[datetime] = None,
+	chunk_size: int = 2000,
+	returned_within: timedelta = timedelta(days=30),
+	sync_fines: bool = False,
+	dry_run: bool = False,
+) -> AccrualResult:
+	"""Recompute ``Loan.fine_accrued`` for every overdue loan in a handful of queries per chunk.
+
+	Covers open loans past their due date, loans returned late within ``returned_within``
+	and open loans still carrying a fine after their due date moved. Only loans whose
+	amount changes are written, with ``bulk_update``. With ``sync_fines`` the loan's
+	``Fine`` rows are brought up to the accrued amount: the latest unpaid fine absorbs the
+	difference (and is deleted if that leaves nothing to pay), or a new fine is created
+	when none is unpaid. Paid fines are never credited: a loan billed more than it now
+	accrues (say after its due date moved) with no unpaid fine left to reduce is counted
+	in ``over_billed`` and logged for a librarian to refund by hand. ``dry_run`` computes
+	and reports everything without writing.
+	"""
+
+	now = now or timezone.now()
+	rate = Decimal(str(settings.FINE_RATE_PER_DAY))
+	cent = Decimal("0.01")
+	result = AccrualResult()
+	started = time.monotonic()
+	candidates = Loan.objects.filter(
+		Q(returned_at__isnull=True, due_at__lt=now)
+		| Q(returned_at__isnull=True, fine_accrued__gt=0)
+		| Q(returned_at__gte=now - returned_within, returned_at__gt=F("due_at"))
+	).order_by("pk")
+
+	last_pk = 0
+	while True:
+		chunk = candidates.filter(pk__gt=last_pk)[:chunk_size]
+		rows = _accrual_rows(chunk, now)
+		if not rows:
+			break
+		last_pk = rows[-1][0]
+		days = overdue_days([row[2] for row in rows], [row[3] for row in rows])
+		accrued = {row[0]: (rate * day).quantize(cent) for row, day in zip(rows, days)}
+		changed = [Loan(pk=row[0], fine_accrued=accrued[row[0]]) for row in rows if row[4] != accrued[row[0]]]
+		result.loans_scanned += len(rows)
+		result.loans_updated += len(changed)
+		result.total_accrued += sum(accrued.values(), Decimal("0.00"))
+
+		with transaction.atomic():
+			if changed and not dry_run:
+				Loan.objects.bulk_update(changed, ["fine_accrued"])
+			if sync_fines:
+				created, adjusted, removed, over_billed = _sync_fines(rows, accrued, dry_run)
+				result.fines_created += created
+				result.fines_adjusted += adjusted
+				result.fines_removed += removed
+				result.over_billed += over_billed
+		if len(rows) < chunk_size:
+			break
+
+	result.elapsed = time.monotonic() - started
+	logger.info(
+		"Fine accrual: %s loans scanned, %s updated, %s fines created, %s adjusted, %s removed, %s over-billed in %.2fs",
+		result.loans_scanned,
+		result.loans_updated,
+		result.fines_created,
+		result.fines_adjusted,
+		result.fines_removed,
+		result.over_billed,
+		result.elapsed,
+	)
+	return result
+
+
+def _sync_fines(rows: list[tuple], accrued: dict[int, Decimal], dry_run: bool) -> tuple[int, int, int, int]:
+	loan_ids = list(accrued)
+	fines = Fine.objects.filter(loan_id__in=loan_ids)
+	billed = dict(fines.order_by().values("loan_id").annotate(total=Sum("amount")).values_list("loan_id", "total"))
+	# Latest unpaid fine per loan; later rows overwrite earlier ones.
+	unpaid = {
+		fine.loan_id: fine
+		for fine in fines.filter(is_paid=False).order_by("issued_at", "pk").only("pk", "loan_id", "amount", "issued_at")
+	}
+	to_create, to_update, to_delete, over_billed = [], [], [], 0
+	for loan_id, borrower_id, *_ in rows:
+		delta = accrued[loan_id] - (billed.get(loan_id) or Decimal("0.00"))
+		if not delta:
+			continue
+		fine = unpaid.get(loan_id)
+		if fine is None:
+			if delta > 0:
+				to_create.append(Fine(member_id=borrower_id, loan_id=loan_id, amount=delta, notes="Overdue fine"))
+			excess = -delta
+		else:
+			fine.amount += delta
+			# An unpaid fine reduced to nothing is dropped rather than left at zero.
+			(to_update if fine.amount > 0 else to_delete).append(fine)
+			excess = -fine.amount
+		# Paid fines are never credited, so whatever the unpaid fine cannot absorb stays billed.
+		if excess > 0:
+			over_billed += 1
+			logger.warning("Loan %s is over-billed by %s in paid fines; refund it by hand.", loan_id, excess)
+	if not dry_run and (to_create or to_update or to_delete):
+		Fine.objects.bulk_create(to_create)
+		Fine.objects.bulk_update(to_update, ["amount"])
+		Fine.objects.filter(pk__in=[fine.pk for fine in to_delete]).delete()
+		days = {timezone.localdate(fine.issued_at) for fine in to_create + to_update + to_delete}
+		circulation_changed.send(sender=Fine, days=days)
+	return len(to_create), len(to_update), len(to_delete), over_billed
+
+
+# --- Batch circulation -------------------------------------------------------------
+#
+# Scanner-driven checkout and return: a whole basket of barcodes is handled in one
+# transaction with a fixed number of queries, and every barcode gets its own outcome
+# so the desk can show which items went through.
+
+CHECKED_OUT = "checked_out"
+RETURNED = "returned"
+DUPLICATE = "duplicate"
+UNKNOWN_BARCODE = "unknown_barcode"
+UNAVAILABLE = "unavailable"
+HELD_FOR_OTHER = "held_for_other_member"
+LOAN_LIMIT = "loan_limit_reached"
+NOT_ON_LOAN = "not_on_loan"
+
+
+@dataclass
+class ScanResult:
+	barcode: str
+	status: str
+	message: str
+	loan_id: Optional[int] = None
+	reservation_id: Optional[int] = None
+
+	@property
+	def ok(self) -> bool:
+		return self.status in (CHECKED_OUT, RETURNED)
+
+
+def _scanned(barcodes: Iterable[str]) -> list[tuple[str, bool]]:
+	"""Strip blanks and flag repeated scans so each copy is handled once."""
+
+	seen: set[str] = set()
+	scanned = []
+	for barcode in barcodes:
+		barcode = (barcode or "").strip()
+		if barcode:
+			scanned.append((barcode, barcode in seen))
+			seen.add(barcode)
+	return scanned
+
+
+def _lock_copies(barcodes: Iterable[str]) -> dict[str, BookCopy]:
+	copies = BookCopy.objects.select_for_update().filter(barcode__in=set(barcodes)).order_by("pk")
+	return {copy.barcode: copy for copy in copies}
+
+
+def checkout_batch(
+	borrower: User,
+	barcodes: Iterable[str],
+	issued_by: Optional[User] = None,
+	due_at: Optional[datetime] = None,
+) -> list[ScanResult]:
+	"""Lend every scanned copy that can be lent to ``borrower`` in one transaction.
+
+	``MAX_ACTIVE_LOANS_PER_MEMBER`` is checked once for the whole basket; items past
+	the limit are rejected individually. Copies held for the borrower are lent and
+	their reservations fulfilled.
+	"""
+
+	now = timezone.now()
+	due_at = due_at or now + timedelta(days=settings.LOAN_PERIOD_DAYS)
+	scanned = _scanned(barcodes)
+	results: list[ScanResult] = []
+	with transaction.atomic():
+		# Serialise baskets for the same member so two desks cannot both pass the limit.
+		list(User.objects.select_for_update().filter(pk=borrower.pk).order_by().values_list("pk", flat=True))
+		copies = _lock_copies(barcode for barcode, _ in scanned)
+		held_for = Reservation.objects.holders(copies.values())
+		open_loans = Loan.objects.filter(borrower=borrower, returned_at__isnull=True).count()
+		remaining = settings.MAX_ACTIVE_LOANS_PER_MEMBER - open_loans
+
+		lendable: list[BookCopy] = []
+		for barcode, repeated in scanned:
+			copy = copies.get(barcode)
+			if repeated:
+				results.append(ScanResult(barcode, DUPLICATE, "Scanned more than once in this batch."))
+			elif copy is None:
+				results.append(ScanResult(barcode, UNKNOWN_BARCODE, "No copy has this barcode."))
+			elif Loan.is_held_for_other(copy, borrower.pk, held_for):
+				results.append(ScanResult(barcode, HELD_FOR_OTHER, "Copy is being held for another member."))
+			elif copy.status not in (BookCopy.Status.AVAILABLE, BookCopy.Status.RESERVED):
+				results.append(ScanResult(barcode, UNAVAILABLE, f"Copy is {copy.get_status_display().lower()}."))
+			elif remaining <= 0:
+				results.append(
+					ScanResult(
+						barcode,
+						LOAN_LIMIT,
+						f"Member has reached the maximum of {settings.MAX_ACTIVE_LOANS_PER_MEMBER} active loans.",
+					)
+				)
+			else:
+				remaining -= 1
+				lendable.append(copy)
+				results.append(ScanResult(barcode, CHECKED_OUT, f"Due {timezone.localtime(due_at):%Y-%m-%d}."))
+
+		if lendable:
+			loans = Loan.objects.bulk_create(
+				[
+					Loan(
+						copy=copy,
+						borrower=borrower,
+						issued_by=issued_by,
+						issued_at=now,
+						due_at=due_at,
+						status=Loan.Status.ACTIVE,
+					)
+					for copy in lendable
+				]
+			)
+			# bulk_create skips Loan.save(), so move the copies and counters set-wise.
+			BookCopy.objects.filter(pk__in=[copy.pk for copy in lendable]).update(status=BookCopy.Status.ON_LOAN)
+			Book.objects.filter(pk__in={copy.book_id for copy in lendable}).recount_copies()
+			held_ids = [copy.pk for copy in lendable if copy.pk in held_for]
+			if held_ids:
+				Reservation.objects.filter(
+					copy_id__in=held_ids, member=borrower, status=Reservation.Status.NOTIFIED
+				).update(status=Reservation.Status.FULFILLED, fulfilled_at=now)
+			loan_ids = {loan.copy_id: loan.pk for loan in loans}
+			for result in results:
+				if result.status == CHECKED_OUT:
+					result.loan_id = loan_ids[copies[result.barcode].pk]
+			metrics.CHECKOUTS.inc_on_commit(len(loans), channel="batch")
+			circulation_changed.send(sender=Loan, days={timezone.localdate(now), timezone.localdate(due_at)})
+	return results
+
+
+def return_batch(barcodes: Iterable[str], returned_at: Optional[datetime] = None) -> list[ScanResult]:
+	"""Close the open loan of every scanned copy in one transaction.
+
+	Returned copies are routed through ``Reservation.objects.allocate`` in one pass, so
+	copies with members waiting are set aside for them straight away.
+	"""
+
+	returned_at = returned_at or timezone.now()
+	scanned = _scanned(barcodes)
+	results: list[ScanResult] = []
+	with transaction.atomic():
+		copies = _lock_copies(barcode for barcode, _ in scanned)
+		open_loans = {
+			loan.copy_id: loan
+			for loan in Loan.objects.select_for_update()
+			.filter(copy_id__in=[copy.pk for copy in copies.values()], returned_at__isnull=True)
+			.order_by()
+			.only("pk", "copy_id", "due_at")
+		}
+		returned: list[BookCopy] = []
+		for barcode, repeated in scanned:
+			copy = copies.get(barcode)
+			if repeated:
+				results.append(ScanResult(barcode, DUPLICATE, "Scanned more than once in this batch."))
+			elif copy is None:
+				results.append(ScanResult(barcode, UNKNOWN_BARCODE, "No copy has this barcode."))
+			elif copy.pk not in open_loans:
+				results.append(ScanResult(barcode, NOT_ON_LOAN, "Copy has no open loan."))
+			else:
+				returned.append(copy)
+				results.append(ScanResult(barcode, RETURNED, "Returned to the shelf.", loan_id=open_loans[copy.pk].pk))
+
+		if returned:
+			Loan.objects.filter(pk__in=[open_loans[copy.pk].pk for copy in returned]).update(
+				returned_at=returned_at, status=Loan.Status.RETURNED
+			)
+			allocated = Reservation.objects.allocate(returned)
+			for result in results:
+				reservation = allocated.get(copies[result.barcode].pk) if result.status == RETURNED else None
+				if reservation is not None:
+					result.message = "Returned and set aside for a waiting reservation."
+					result.reservation_id = reservation.pk
+			metrics.RETURNS.inc_on_commit(len(returned), channel="batch")
+			# A back-dated return can also take a loan off its due day's overdue count.
+			days = {timezone.localdate(open_loans[copy.pk].due_at) for copy in returned}
+			circulation_changed.send(sender=Loan, days=days | {timezone.localdate(returned_at)})
+	return results
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.db.models.signals import post_delete
+from django.dispatch import Signal, receiver
+
+from .models import Reservation
+
+
+# Sent by bulk circulation writes (queryset updates, bulk_create) that bypass the
+# per-instance model signals, with the model class that changed as the sender and,
+# inside the writing transaction, the local ``days`` whose circulation figures the
+# write changed (issue, due, return or fine dates).
+circulation_changed = Signal()
+
+
+@receiver(post_delete, sender=Reservation)
+def close_queue_gap(sender: type[Reservation], instance: Reservation, **_: Any) -> None:
+	"""Renumber the book's waitlist when a waiting reservation is deleted."""
+
+	if instance.status == Reservation.Status.PENDING:
+		Reservation.objects.renumber([instance.book_id])
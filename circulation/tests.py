@@ -1,3 +1,559 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from catalog.models import Book, BookCopy, Category
+from notifications.models import Notification
+
+from .forms import LoanForm
+from .models import Fine, Loan, Reservation
+from . import services
+from .services import accrue_fines, checkout_batch, return_batch
+from .signals import circulation_changed
+from .views import LoanListView
+
+
+class CirculationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user("librarian", password="pw", role=User.Role.LIBRARIAN)
+        cls.alice = User.objects.create_user("alice", password="pw", role=User.Role.MEMBER)
+        cls.bob = User.objects.create_user("bob", password="pw", role=User.Role.MEMBER)
+        cls.carol = User.objects.create_user("carol", password="pw", role=User.Role.MEMBER)
+        cls.category = Category.objects.create(name="Fiction")
+        cls.book = Book.objects.create(
+            title="Dune", author="Frank Herbert", isbn="9780441013593", category=cls.category
+        )
+
+    def add_copy(self, barcode, book=None):
+        return BookCopy.objects.create(book=book or self.book, barcode=barcode)
+
+    def refresh(self, *objects):
+        for obj in objects:
+            obj.refresh_from_db()
+
+
+class LoanReturnTests(CirculationTestCase):
+    def test_return_hands_copy_to_queue_head(self):
+        copy = self.add_copy("C1")
+        loan = Loan.objects.create(copy=copy, borrower=self.alice)
+        reservation = Reservation.objects.create(book=self.book, member=self.bob)
+
+        loan.mark_returned()
+
+        self.refresh(copy, reservation)
+        self.assertEqual(copy.status, BookCopy.Status.RESERVED)
+        self.assertEqual(reservation.status, Reservation.Status.NOTIFIED)
+        self.assertEqual(reservation.copy_id, copy.pk)
+
+    def test_resaving_old_returned_loan_leaves_relent_copy_alone(self):
+        copy = self.add_copy("C1")
+        old = Loan.objects.create(
+            copy=copy,
+            borrower=self.alice,
+            issued_at=timezone.now() - timedelta(days=30),
+            due_at=timezone.now() - timedelta(days=16),
+        )
+        old.mark_returned(timezone.now() - timedelta(days=10))
+        current = Loan.objects.create(copy=copy, borrower=self.bob)
+        waiting = Reservation.objects.create(book=self.book, member=self.carol)
+        notifications = Notification.objects.count()
+
+        old.notes = "Returned with a torn cover."
+        old.save()
+        old.calculate_overdue_fine()
+
+        self.refresh(copy, waiting, current)
+        self.assertEqual(copy.status, BookCopy.Status.ON_LOAN)
+        self.assertEqual(waiting.status, Reservation.Status.PENDING)
+        self.assertIsNone(current.returned_at)
+        self.assertEqual(Notification.objects.count(), notifications)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+
+    def test_held_copy_is_only_lent_to_its_holder(self):
+        copy = self.add_copy("C1")
+        Loan.objects.create(copy=copy, borrower=self.alice).mark_returned()
+        reservation = Reservation.objects.create(book=self.book, member=self.bob)
+        Reservation.objects.allocate([BookCopy.objects.get(pk=copy.pk)], from_status=BookCopy.Status.AVAILABLE)
+        copy.refresh_from_db()
+
+        form = LoanForm(data={"copy": copy.pk, "borrower": self.carol.pk})
+        self.assertEqual(form.errors["copy"], [Loan.HELD_FOR_OTHER_MESSAGE])
+        with self.assertRaises(ValidationError):
+            Loan.objects.create(copy=copy, borrower=self.carol)
+
+        Loan.objects.create(copy=copy, borrower=self.bob)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, Reservation.Status.FULFILLED)
+
+    def test_allocate_skips_copies_with_an_open_loan(self):
+        copy = self.add_copy("C1")
+        Loan.objects.create(copy=copy, borrower=self.alice)
+        Reservation.objects.create(book=self.book, member=self.bob)
+
+        self.assertEqual(Reservation.objects.allocate([copy]), {})
+
+        copy.refresh_from_db()
+        self.assertEqual(copy.status, BookCopy.Status.ON_LOAN)
+
+
+class AllocateTests(CirculationTestCase):
+    def returned_copy(self, barcode):
+        # A copy whose loan was just closed set-wise, as return_batch leaves it.
+        return BookCopy.objects.create(book=self.book, barcode=barcode, status=BookCopy.Status.ON_LOAN)
+
+    def test_routes_several_copies_to_the_queue_in_one_pass(self):
+        copies = [self.returned_copy(f"C{number}") for number in range(3)]
+        first = Reservation.objects.create(book=self.book, member=self.alice)
+        second = Reservation.objects.create(book=self.book, member=self.bob)
+        third = Reservation.objects.create(book=self.book, member=self.carol)
+
+        # Savepoint, lock copies and books, rank the queue heads, update the copies and
+        # counters, the reservations, the queue positions and the notifications, release.
+        with self.assertNumQueries(10):
+            allocated = Reservation.objects.allocate(copies)
+
+        self.assertEqual(
+            {copy_id: reservation.pk for copy_id, reservation in allocated.items()},
+            {copies[0].pk: first.pk, copies[1].pk: second.pk, copies[2].pk: third.pk},
+        )
+        self.refresh(first, *copies)
+        self.assertEqual(first.status, Reservation.Status.NOTIFIED)
+        self.assertIsNotNone(first.expires_at)
+        self.assertTrue(all(copy.status == BookCopy.Status.RESERVED for copy in copies))
+        self.assertEqual(
+            sorted(Notification.objects.values_list("recipient__username", flat=True)), ["alice", "bob", "carol"]
+        )
+
+    def test_copies_beyond_the_queue_go_back_on_the_shelf(self):
+        copies = [self.returned_copy(f"C{number}") for number in range(3)]
+        Reservation.objects.create(book=self.book, member=self.alice)
+        waiting = Reservation.objects.create(book=self.book, member=self.bob)
+        waiting.cancel()
+
+        allocated = Reservation.objects.allocate(copies)
+
+        self.assertEqual(list(allocated), [copies[0].pk])
+        statuses = list(BookCopy.objects.filter(book=self.book).order_by("barcode").values_list("status", flat=True))
+        self.assertEqual(statuses, [BookCopy.Status.RESERVED, BookCopy.Status.AVAILABLE, BookCopy.Status.AVAILABLE])
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (3, 2))
+        self.assertFalse(Reservation.objects.waiting(self.book).exists())
+
+    def test_copies_in_another_state_are_left_alone(self):
+        shelved = self.add_copy("C1")
+        Reservation.objects.create(book=self.book, member=self.alice)
+
+        self.assertEqual(Reservation.objects.allocate([shelved]), {})
+        self.assertEqual(Reservation.objects.allocate([shelved], from_status=BookCopy.Status.RESERVED), {})
+
+        shelved.refresh_from_db()
+        self.assertEqual(shelved.status, BookCopy.Status.AVAILABLE)
+        self.assertFalse(Notification.objects.exists())
+
+
+class LoanListPaginationTests(CirculationTestCase):
+    def test_walking_every_page_with_tied_issue_times(self):
+        issued = [timezone.now() - timedelta(days=days) for days in (1, 2, 3)]
+        copies = BookCopy.objects.bulk_create(BookCopy(book=self.book, barcode=f"C{number}") for number in range(45))
+        # bulk_create skips Loan.save(), so several loans can share each issue time.
+        Loan.objects.bulk_create(
+            Loan(copy=copy, borrower=self.alice, issued_at=issued[index % 3], due_at=issued[index % 3])
+            for index, copy in enumerate(copies)
+        )
+        expected = list(Loan.objects.order_by("-issued_at", "id").values_list("pk", flat=True))
+
+        def page(cursor=None):
+            request = RequestFactory().get("/circulation/loans/", {"cursor": cursor} if cursor else {})
+            request.user = self.librarian
+            return LoanListView.as_view()(request).context_data["page_obj"]
+
+        seen, current = [], page()
+        seen.extend(loan.pk for loan in current)
+        while current.has_next():
+            current = page(current.next_cursor)
+            seen.extend(loan.pk for loan in current)
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(current), 5)
+        with self.assertRaises(Http404):
+            page("%%%")
+
+
+class SweepOverdueTests(CirculationTestCase):
+    def loan(self, barcode, due_in_days, returned=False):
+        now = timezone.now()
+        loan = Loan.objects.create(
+            copy=self.add_copy(barcode),
+            borrower=self.alice,
+            issued_at=now - timedelta(days=20),
+            due_at=now + timedelta(days=due_in_days),
+            returned_at=now if returned else None,
+        )
+        # Loans are saved with a fresh status; make them stale as the sweeper finds them.
+        Loan.objects.filter(pk=loan.pk).update(status=Loan.Status.ACTIVE)
+        return loan
+
+    def statuses(self):
+        return dict(Loan.objects.values_list("copy__barcode", "status"))
+
+    def capture_signal(self):
+        sent = []
+
+        def receiver(sender, **kwargs):
+            sent.append(sender)
+
+        circulation_changed.connect(receiver)
+        self.addCleanup(circulation_changed.disconnect, receiver)
+        return sent
+
+    def test_only_open_past_due_loans_flip_across_chunks(self):
+        for number in range(5):
+            self.loan(f"LATE{number}", -number - 1)
+        self.loan("CURRENT", 3)
+        self.loan("RETURNED", -4, returned=True)
+        sent = self.capture_signal()
+
+        result = services.sweep_overdue_loans(chunk_size=2)
+
+        self.assertEqual(result.updated, 5)
+        self.assertEqual([updated for updated, _ in result.chunks], [2, 2, 1])
+        statuses = self.statuses()
+        self.assertEqual({statuses[f"LATE{number}"] for number in range(5)}, {Loan.Status.OVERDUE})
+        self.assertEqual(statuses["CURRENT"], Loan.Status.ACTIVE)
+        self.assertEqual(statuses["RETURNED"], Loan.Status.ACTIVE)
+        self.assertEqual(sent, [Loan])
+
+    def test_exact_multiple_of_the_chunk_size(self):
+        for number in range(4):
+            self.loan(f"LATE{number}", -1)
+
+        result = services.sweep_overdue_loans(chunk_size=2)
+
+        self.assertEqual((result.updated, [updated for updated, _ in result.chunks]), (4, [2, 2]))
+        self.assertEqual(services.sweep_overdue_loans(chunk_size=2).updated, 0)
+
+    def test_sweeping_at_a_later_time(self):
+        self.loan("SOON", 2)
+        sent = self.capture_signal()
+
+        self.assertEqual(services.sweep_overdue_loans().updated, 0)
+        self.assertEqual(sent, [])
+        self.assertEqual(services.sweep_overdue_loans(now=timezone.now() + timedelta(days=3)).updated, 1)
+        self.assertEqual(self.statuses()["SOON"], Loan.Status.OVERDUE)
+
+    def test_command_reports_each_chunk(self):
+        for number in range(3):
+            self.loan(f"LATE{number}", -1)
+        out = StringIO()
+
+        call_command("sweep_overdue_loans", "--chunk-size", "2", stdout=out)
+
+        self.assertIn("chunk 2: 1 loans", out.getvalue())
+        self.assertIn("Marked 3 loans overdue", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("sweep_overdue_loans", "--chunk-size", "0")
+
+
+@override_settings(FINE_RATE_PER_DAY=0.5)
+class AccrueFinesTests(CirculationTestCase):
+    def overdue_loan(self, barcode, days_late, borrower=None):
+        now = timezone.now()
+        return Loan.objects.create(
+            copy=self.add_copy(barcode),
+            borrower=borrower or self.alice,
+            issued_at=now - timedelta(days=days_late + 14, hours=1),
+            due_at=now - timedelta(days=days_late, hours=1),
+        )
+
+    def test_accrues_and_bills_overdue_loans(self):
+        loan = self.overdue_loan("C1", 4)
+        self.overdue_loan("C2", 0)
+
+        result = accrue_fines(sync_fines=True)
+
+        loan.refresh_from_db()
+        self.assertEqual(loan.fine_accrued, Decimal("2.00"))
+        self.assertEqual(result.loans_updated, 1)
+        self.assertEqual(result.fines_created, 1)
+        self.assertEqual(list(loan.fines.values_list("amount", flat=True)), [Decimal("2.00")])
+
+    def test_second_run_changes_nothing(self):
+        loan = self.overdue_loan("C1", 4)
+        accrue_fines(sync_fines=True)
+
+        result = accrue_fines(sync_fines=True)
+
+        self.assertEqual((result.loans_updated, result.fines_created, result.fines_adjusted), (0, 0, 0))
+        self.assertEqual(loan.fines.count(), 1)
+
+    def test_unpaid_fine_absorbs_the_difference(self):
+        loan = self.overdue_loan("C1", 4)
+        accrue_fines(sync_fines=True)
+        Loan.objects.filter(pk=loan.pk).update(due_at=loan.due_at - timedelta(days=2))
+
+        result = accrue_fines(sync_fines=True)
+
+        self.assertEqual(result.fines_adjusted, 1)
+        self.assertEqual(list(loan.fines.values_list("amount", flat=True)), [Decimal("3.00")])
+
+    def test_dry_run_writes_nothing(self):
+        loan = self.overdue_loan("C1", 4)
+
+        result = accrue_fines(sync_fines=True, dry_run=True)
+
+        loan.refresh_from_db()
+        self.assertEqual(result.fines_created, 1)
+        self.assertEqual(loan.fine_accrued, Decimal("0.00"))
+        self.assertFalse(loan.fines.exists())
+
+    def test_paid_fines_are_never_credited(self):
+        loan = self.overdue_loan("C1", 4)
+        accrue_fines(sync_fines=True)
+        loan.fines.get().mark_paid()
+        Loan.objects.filter(pk=loan.pk).update(due_at=loan.due_at + timedelta(days=2))
+
+        with self.assertLogs("circulation.services", "WARNING") as logs:
+            result = accrue_fines(sync_fines=True)
+
+        self.assertEqual(result.over_billed, 1)
+        self.assertIn(f"Loan {loan.pk} is over-billed by 1.00", logs.output[0])
+        fine = Fine.objects.get(loan=loan)
+        self.assertEqual((fine.amount, fine.is_paid), (Decimal("2.00"), True))
+
+    def test_unpaid_fine_reduced_to_nothing_is_deleted(self):
+        loan = self.overdue_loan("C1", 4)
+        Fine.objects.create(member=self.alice, loan=loan, amount=Decimal("1.00"), is_paid=True)
+        unpaid = Fine.objects.create(member=self.alice, loan=loan, amount=Decimal("1.00"))
+        Loan.objects.filter(pk=loan.pk).update(due_at=loan.due_at + timedelta(days=2))
+
+        result = accrue_fines(sync_fines=True)
+
+        self.assertEqual((result.fines_removed, result.over_billed), (1, 0))
+        self.assertFalse(Fine.objects.filter(pk=unpaid.pk).exists())
+        self.assertEqual(list(loan.fines.values_list("amount", "is_paid")), [(Decimal("1.00"), True)])
+
+    def test_over_billed_loan_keeps_no_zero_unpaid_fine(self):
+        loan = self.overdue_loan("C1", 4)
+        Fine.objects.create(member=self.alice, loan=loan, amount=Decimal("1.50"), is_paid=True)
+        Fine.objects.create(member=self.alice, loan=loan, amount=Decimal("0.50"))
+        Loan.objects.filter(pk=loan.pk).update(due_at=loan.due_at + timedelta(days=3))
+
+        with self.assertLogs("circulation.services", "WARNING") as logs:
+            result = accrue_fines(sync_fines=True)
+
+        self.assertEqual((result.fines_removed, result.over_billed), (1, 1))
+        self.assertIn("over-billed by 1.00", logs.output[0])
+        self.assertFalse(loan.fines.filter(is_paid=False).exists())
+
+    def test_database_epoch_matches_python(self):
+        moments = [
+            datetime(2024, 3, 1, 12, 0, tzinfo=dt_timezone.utc),
+            datetime(2024, 3, 1, 12, 0, 0, 1, tzinfo=dt_timezone.utc),
+            datetime(1999, 12, 31, 23, 59, 59, 999999, tzinfo=dt_timezone.utc),
+        ]
+        loans = [
+            Loan.objects.create(copy=self.add_copy(f"C{index}"), borrower=self.alice, issued_at=moment, due_at=moment)
+            for index, moment in enumerate(moments)
+        ]
+
+        epochs = Loan.objects.filter(pk__in=[loan.pk for loan in loans]).order_by("pk").annotate(
+            due_us=services.EpochMicroseconds("due_at")
+        )
+
+        self.assertEqual(
+            list(epochs.values_list("due_us", flat=True)), [services._microseconds(moment) for moment in moments]
+        )
+
+    def test_accrual_agrees_with_the_per_loan_fine_at_day_boundaries(self):
+        now = timezone.now()
+        loans = [
+            Loan.objects.create(
+                copy=self.add_copy(f"C{index}"),
+                borrower=self.alice,
+                issued_at=now - timedelta(days=30),
+                due_at=now - timedelta(days=20),
+                returned_at=now - timedelta(days=20) + offset,
+            )
+            for index, offset in enumerate(
+                (timedelta(days=3), timedelta(days=3, microseconds=-1), timedelta(days=3, microseconds=1))
+            )
+        ]
+
+        accrue_fines(now=now)
+
+        for loan in loans:
+            accrued = Loan.objects.get(pk=loan.pk).fine_accrued
+            self.assertEqual(accrued, loan.calculate_overdue_fine())
+
+
+class ReservationQueueTests(CirculationTestCase):
+    def positions(self):
+        return list(Reservation.objects.waiting(self.book).values_list("member__username", "position"))
+
+    def test_enqueue_appends_to_the_tail(self):
+        for member in (self.alice, self.bob, self.carol):
+            Reservation.objects.create(book=self.book, member=member)
+
+        self.assertEqual(self.positions(), [("alice", 1), ("bob", 2), ("carol", 3)])
+        self.assertEqual(Reservation.objects.next_in_line(self.book).member, self.alice)
+
+    def test_cancel_closes_the_gap(self):
+        first, middle, last = (
+            Reservation.objects.create(book=self.book, member=member) for member in (self.alice, self.bob, self.carol)
+        )
+
+        middle.cancel()
+        self.assertEqual(self.positions(), [("alice", 1), ("carol", 2)])
+
+        first.cancel()
+        self.assertEqual(self.positions(), [("carol", 1)])
+        last.refresh_from_db()
+        self.assertEqual(last.position, 1)
+
+    def test_deleting_a_waiting_reservation_closes_the_gap(self):
+        Reservation.objects.create(book=self.book, member=self.alice)
+        Reservation.objects.create(book=self.book, member=self.bob).delete()
+        Reservation.objects.create(book=self.book, member=self.carol)
+
+        self.assertEqual(self.positions(), [("alice", 1), ("carol", 2)])
+
+    def test_requeued_reservation_goes_to_the_back(self):
+        first = Reservation.objects.create(book=self.book, member=self.alice)
+        Reservation.objects.create(book=self.book, member=self.bob)
+        first.cancel()
+
+        first.status = Reservation.Status.PENDING
+        first.save()
+
+        self.assertEqual(self.positions(), [("bob", 1), ("alice", 2)])
+
+    def test_renumber_compacts_every_queue(self):
+        other = Book.objects.create(title="Emma", author="Jane Austen", isbn="9780141439587", category=self.category)
+        for book in (self.book, other):
+            for member in (self.alice, self.bob):
+                Reservation.objects.create(book=book, member=member)
+        waiting = Reservation.objects.filter(status=Reservation.Status.PENDING)
+
+        waiting.update(position=F("position") * 10)
+        self.assertEqual(Reservation.objects.renumber(), 4)
+        self.assertEqual(self.positions(), [("alice", 1), ("bob", 2)])
+
+        # The fallback for backends without UPDATE ... FROM gives the same result.
+        waiting.update(position=F("position") * 10)
+        self.assertEqual(Reservation.objects.all()._renumber_in_python([self.book.pk]), 2)
+        self.assertEqual(self.positions(), [("alice", 1), ("bob", 2)])
+
+    def test_cancelling_a_notified_hold_passes_the_copy_on(self):
+        copy = self.add_copy("C1")
+        loan = Loan.objects.create(copy=copy, borrower=self.carol)
+        first = Reservation.objects.create(book=self.book, member=self.alice)
+        second = Reservation.objects.create(book=self.book, member=self.bob)
+        loan.mark_returned()
+        first.refresh_from_db()
+        self.assertEqual(first.status, Reservation.Status.NOTIFIED)
+
+        first.cancel()
+
+        self.refresh(copy, second)
+        self.assertEqual(copy.status, BookCopy.Status.RESERVED)
+        self.assertEqual((second.status, second.copy_id), (Reservation.Status.NOTIFIED, copy.pk))
+
+
+class BatchCirculationTests(CirculationTestCase):
+    def outcomes(self, results):
+        return [(result.barcode, result.status) for result in results]
+
+    def test_checkout_reports_an_outcome_per_barcode(self):
+        self.add_copy("C1")
+        self.add_copy("C2")
+        BookCopy.objects.create(book=self.book, barcode="LOST", status=BookCopy.Status.LOST)
+
+        results = checkout_batch(self.alice, ["C1", " C2 ", "C1", "", "NOPE", "LOST"], issued_by=self.librarian)
+
+        self.assertEqual(
+            self.outcomes(results),
+            [
+                ("C1", services.CHECKED_OUT),
+                ("C2", services.CHECKED_OUT),
+                ("C1", services.DUPLICATE),
+                ("NOPE", services.UNKNOWN_BARCODE),
+                ("LOST", services.UNAVAILABLE),
+            ],
+        )
+        loans = Loan.objects.filter(borrower=self.alice)
+        self.assertEqual(sorted(loans.values_list("pk", flat=True)), sorted(r.loan_id for r in results[:2]))
+        self.assertEqual(BookCopy.objects.filter(status=BookCopy.Status.ON_LOAN).count(), 2)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (3, 0))
+
+    def test_holds_are_lent_only_to_their_member(self):
+        copy = self.add_copy("C1")
+        loan = Loan.objects.create(copy=copy, borrower=self.carol)
+        reservation = Reservation.objects.create(book=self.book, member=self.alice)
+        loan.mark_returned()
+
+        refused = checkout_batch(self.bob, ["C1"])
+        lent = checkout_batch(self.alice, ["C1"])
+
+        self.assertEqual(self.outcomes(refused), [("C1", services.HELD_FOR_OTHER)])
+        self.assertEqual(self.outcomes(lent), [("C1", services.CHECKED_OUT)])
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, Reservation.Status.FULFILLED)
+
+    @override_settings(MAX_ACTIVE_LOANS_PER_MEMBER=2)
+    def test_loan_limit_applies_to_the_whole_basket(self):
+        for barcode in ("C1", "C2", "C3"):
+            self.add_copy(barcode)
+        Loan.objects.create(copy=self.add_copy("C0"), borrower=self.alice)
+
+        results = checkout_batch(self.alice, ["C1", "C2", "C3"])
+
+        self.assertEqual(
+            self.outcomes(results),
+            [("C1", services.CHECKED_OUT), ("C2", services.LOAN_LIMIT), ("C3", services.LOAN_LIMIT)],
+        )
+
+    def test_return_closes_loans_and_serves_the_queue(self):
+        held, shelved = self.add_copy("C1"), self.add_copy("C2")
+        self.add_copy("C3")
+        checkout_batch(self.alice, ["C1", "C2"])
+        reservation = Reservation.objects.create(book=self.book, member=self.bob)
+        returned_at = timezone.now() - timedelta(hours=2)
+
+        results = return_batch(["C1", "C2", "C2", "C3", "NOPE"], returned_at=returned_at)
+
+        self.assertEqual(
+            self.outcomes(results),
+            [
+                ("C1", services.RETURNED),
+                ("C2", services.RETURNED),
+                ("C2", services.DUPLICATE),
+                ("C3", services.NOT_ON_LOAN),
+                ("NOPE", services.UNKNOWN_BARCODE),
+            ],
+        )
+        self.assertEqual(results[0].reservation_id, reservation.pk)
+        self.assertIsNone(results[1].reservation_id)
+        self.assertFalse(Loan.objects.filter(returned_at__isnull=True).exists())
+        self.assertEqual(set(Loan.objects.values_list("returned_at", flat=True)), {returned_at})
+        self.refresh(held, shelved)
+        self.assertEqual((held.status, shelved.status), (BookCopy.Status.RESERVED, BookCopy.Status.AVAILABLE))
+
+    def test_returning_twice_does_nothing_the_second_time(self):
+        self.add_copy("C1")
+        checkout_batch(self.alice, ["C1"])
+        return_batch(["C1"])
+
+        results = return_batch(["C1"])
+
+        self.assertEqual(self.outcomes(results), [("C1", services.NOT_ON_LOAN)])
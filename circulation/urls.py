@@ -9,6 +9,7 @@ urlpatterns = [
     path("loans/create/", views.LoanCreateView.as_view(), name="loan-create"),
     path("loans/<int:pk>/", views.LoanDetailView.as_view(), name="loan-detail"),
     path("loans/<int:pk>/return/", views.LoanReturnView.as_view(), name="loan-return"),
+    path("desk/", views.CirculationDeskView.as_view(), name="desk"),
     path("reservations/", views.ReservationListView.as_view(), name="reservation-list"),
     path("reservations/create/", views.ReservationCreateView.as_view(), name="reservation-create"),
     path("reservations/<int:pk>/edit/", views.ReservationUpdateView.as_view(), name="reservation-edit"),
@@ -12,20 +12,23 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.utils.decorators import method_decorator
-from django.views.generic import CreateView, DetailView, ListView, UpdateView, View
+from django.views.generic import CreateView, DetailView, FormView, ListView, UpdateView, View
 
 from accounts.models import User
 from accounts.permissions import RoleRequiredMixin
+from library_management.pagination import KeysetPaginationMixin
 
-from .forms import FineForm, LoanForm, LoanReturnForm, ReservationForm
+from .forms import CirculationDeskForm, FineForm, LoanForm, LoanReturnForm, ReservationForm
 from .models import Fine, Loan, Reservation
+from .services import checkout_batch, return_batch
 
 
 @method_decorator(login_required, name="dispatch")
-class LoanListView(ListView):
+class LoanListView(KeysetPaginationMixin, ListView):
 	model = Loan
 	template_name = "circulation/loan_list.html"
 	paginate_by = 20
+	keyset_ordering = ("-issued_at", "id")
 
 	def get_queryset(self):
 		queryset = (
@@ -95,13 +98,37 @@ class LoanReturnView(RoleRequiredMixin, UpdateView):
 		loan.status = Loan.Status.RETURNED
 		if not loan.returned_at:
 			loan.returned_at = timezone.now()
+		# Loan.save releases the copy (and its book's availability counter) atomically.
 		loan.save(update_fields=["returned_at", "status", "notes"])
-		loan.copy.status = loan.copy.Status.AVAILABLE
-		loan.copy.save(update_fields=["status"])
 		messages.success(self.request, "Loan marked as returned.")
 		return redirect(loan.get_absolute_url())
 
 
+class CirculationDeskView(RoleRequiredMixin, FormView):
+	"""Scanner-friendly desk: check out or return a whole basket in one post."""
+
+	form_class = CirculationDeskForm
+	template_name = "circulation/desk.html"
+	required_roles = (User.Role.ADMIN, User.Role.LIBRARIAN)
+
+	def form_valid(self, form: CirculationDeskForm) -> HttpResponse:
+		barcodes = form.cleaned_data["barcodes"]
+		if form.cleaned_data["mode"] == CirculationDeskForm.MODE_CHECKOUT:
+			results = checkout_batch(form.cleaned_data["borrower"], barcodes, issued_by=self.request.user)
+		else:
+			results = return_batch(barcodes)
+		succeeded = sum(result.ok for result in results)
+		if succeeded == len(results):
+			messages.success(self.request, f"All {succeeded} items processed.")
+		else:
+			messages.warning(self.request, f"{succeeded} of {len(results)} items processed.")
+		# Start the next basket with an empty scan list but keep the mode and member.
+		next_form = self.form_class(
+			initial={"mode": form.cleaned_data["mode"], "member": form.cleaned_data.get("member", "")}
+		)
+		return self.render_to_response(self.get_context_data(form=next_form, results=results))
+
+
 class ReservationListView(RoleRequiredMixin, ListView):
 	model = Reservation
 	template_name = "circulation/reservation_list.html"
@@ -166,10 +193,11 @@ class ReservationStatusView(RoleRequiredMixin, View):
 		return redirect("circulation:reservation-list")
 
 
-class FineListView(RoleRequiredMixin, ListView):
+class FineListView(RoleRequiredMixin, KeysetPaginationMixin, ListView):
 	model = Fine
 	template_name = "circulation/fine_list.html"
 	paginate_by = 25
+	keyset_ordering = ("-issued_at", "id")
 	required_roles = (User.Role.ADMIN, User.Role.LIBRARIAN)
 
 	def get_queryset(self):
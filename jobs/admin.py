@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+	list_display = ("id", "kind", "status", "progress", "created_by", "created_at", "finished_at")
+	list_filter = ("status", "kind")
+	search_fields = ("kind", "created_by__username")
+	readonly_fields = ("created_at", "updated_at", "started_at", "finished_at", "worker", "attempts")
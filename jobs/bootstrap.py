@@ -0,0 +1,13 @@
+"""Process-pool initializer.
+
+Kept free of model imports: spawned workers import this module to unpickle the
+initializer before Django is set up.
+"""
+
+
+def setup_process() -> None:
+	# Process workers are spawned, not forked, so each one sets Django up from scratch
+	# instead of inheriting the parent's open database connections.
+	import django
+
+	django.setup()
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.worker import POOLS, Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (exports, reports) until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.JOBS_CONCURRENCY,
+            help="Jobs to run at the same time.",
+        )
+        parser.add_argument(
+            "--pool",
+            choices=POOLS,
+            default=settings.JOBS_POOL,
+            help="Run jobs on threads (I/O-bound exports) or processes (CPU-bound reports).",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+            help="Seconds to wait between checks for new jobs.",
+        )
+        parser.add_argument(
+            "--stale-after-minutes",
+            type=int,
+            default=10,
+            help="Requeue running jobs that have not reported progress for this long.",
+        )
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+        worker = Worker(
+            concurrency=options["concurrency"],
+            pool=options["pool"],
+            poll_interval=options["poll_interval"],
+            stale_after=timedelta(minutes=options["stale_after_minutes"]),
+            burst=options["burst"],
+        )
+        worker.install_signal_handlers()
+        self.stdout.write(
+            f"Worker {worker.name} running up to {worker.concurrency} jobs on a {worker.pool} pool. "
+            "Press Ctrl+C to stop."
+        )
+        processed = worker.run()
+        self.stdout.write(self.style.SUCCESS(f"Worker stopped after {processed} jobs."))
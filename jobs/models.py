@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import posixpath
+import uuid
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import models
+from django.urls import reverse
+from django.utils import timezone
+
+
+def result_upload_to(job: "Job", filename: str) -> str:
+	# A random directory keeps result URLs unguessable if MEDIA_ROOT is ever served directly.
+	return f"jobs/{uuid.uuid4().hex}/{filename}"
+
+
+class JobQuerySet(models.QuerySet):
+	def claim(self, worker: str, limit: int) -> list[int]:
+		"""Mark up to ``limit`` queued jobs as running for ``worker`` and return their ids.
+
+		Each job is taken with a conditional ``UPDATE ... WHERE status = 'QUEUED'`` so
+		that several workers polling the same table never run a job twice, on any
+		database backend.
+		"""
+
+		claimed = []
+		candidates = self.filter(status=Job.Status.QUEUED).order_by("created_at", "id").values_list("id", flat=True)
+		for job_id in candidates[: limit * 2]:
+			now = timezone.now()
+			updated = self.filter(pk=job_id, status=Job.Status.QUEUED).update(
+				status=Job.Status.RUNNING,
+				worker=worker,
+				started_at=now,
+				updated_at=now,
+				attempts=models.F("attempts") + 1,
+			)
+			if updated:
+				claimed.append(job_id)
+				if len(claimed) >= limit:
+					break
+		return claimed
+
+	def requeue_stale(self, older_than: timedelta) -> int:
+		"""Put back running jobs whose worker stopped reporting, e.g. after a crash."""
+
+		return self.filter(status=Job.Status.RUNNING, updated_at__lt=timezone.now() - older_than).update(
+			status=Job.Status.QUEUED,
+			worker="",
+			progress=0,
+			message="Requeued after the worker stopped responding.",
+			updated_at=timezone.now(),
+		)
+
+
+class Job(models.Model):
+	class Status(models.TextChoices):
+		QUEUED = "QUEUED", "Queued"
+		RUNNING = "RUNNING", "Running"
+		SUCCEEDED = "SUCCEEDED", "Succeeded"
+		FAILED = "FAILED", "Failed"
+		CANCELLED = "CANCELLED", "Cancelled"
+
+	FINISHED = (Status.SUCCEEDED, Status.FAILED, Status.CANCELLED)
+
+	kind = models.CharField(max_length=60)
+	params = models.JSONField(default=dict, blank=True)
+	status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+	progress = models.PositiveSmallIntegerField(default=0, help_text="Percent complete.")
+	message = models.CharField(max_length=255, blank=True)
+	result = models.FileField(upload_to=result_upload_to, blank=True)
+	error = models.TextField(blank=True)
+	created_by = models.ForeignKey(
+		settings.AUTH_USER_MODEL,
+		on_delete=models.SET_NULL,
+		null=True,
+		blank=True,
+		related_name="jobs",
+	)
+	worker = models.CharField(max_length=120, blank=True)
+	attempts = models.PositiveSmallIntegerField(default=0)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+	started_at = models.DateTimeField(null=True, blank=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	objects = JobQuerySet.as_manager()
+
+	class Meta:
+		ordering = ["-created_at", "-id"]
+		indexes = [
+			models.Index(fields=["status", "created_at"], name="jobs_job_queue_idx"),
+		]
+
+	def __str__(self) -> str:
+		return f"{self.label} #{self.pk} ({self.get_status_display()})"
+
+	@property
+	def label(self) -> str:
+		from .registry import JOB_KINDS
+
+		kind = JOB_KINDS.get(self.kind)
+		return kind.label if kind else self.kind
+
+	@property
+	def result_filename(self) -> str:
+		return posixpath.basename(self.result.name) if self.result else ""
+
+	def get_absolute_url(self) -> str:
+		return reverse("jobs:detail", args=[self.pk])
+
+	def get_download_url(self) -> str:
+		return reverse("jobs:download", args=[self.pk])
+
+	@property
+	def error_summary(self) -> str:
+		"""The last line of the traceback, i.e. the exception message."""
+
+		lines = self.error.strip().splitlines()
+		return lines[-1] if lines else ""
+
+	@property
+	def is_finished(self) -> bool:
+		return self.status in self.FINISHED
+
+	@property
+	def duration(self) -> Optional[timedelta]:
+		if not self.started_at:
+			return None
+		return (self.finished_at or timezone.now()) - self.started_at
+
+	def cancel(self) -> bool:
+		"""Cancel the job if no worker has picked it up yet."""
+
+		updated = Job.objects.filter(pk=self.pk, status=Job.Status.QUEUED).update(
+			status=Job.Status.CANCELLED,
+			finished_at=timezone.now(),
+			updated_at=timezone.now(),
+		)
+		if updated:
+			self.refresh_from_db()
+		return bool(updated)
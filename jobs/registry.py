@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from django.db import transaction
+
+from .models import Job
+
+
+class UnknownJobKind(KeyError):
+	"""Raised when enqueueing or running a job kind nobody registered."""
+
+
+@dataclass(frozen=True)
+class JobKind:
+	name: str
+	label: str
+	handler: Callable[..., Optional[str]]
+
+
+JOB_KINDS: dict[str, JobKind] = {}
+
+
+def register(name: str, label: str) -> Callable:
+	"""Declare ``handler(context, **params)`` as the job kind ``name``.
+
+	Apps register their kinds in a ``jobs.py`` module, which ``JobsConfig.ready``
+	imports. The handler may return a short summary that is stored as the job message.
+	"""
+
+	def decorator(handler: Callable[..., Optional[str]]) -> Callable[..., Optional[str]]:
+		JOB_KINDS[name] = JobKind(name, label, handler)
+		return handler
+
+	return decorator
+
+
+def get_kind(name: str) -> JobKind:
+	try:
+		return JOB_KINDS[name]
+	except KeyError:
+		raise UnknownJobKind(name) from None
+
+
+def enqueue(kind: str, params: Optional[dict[str, Any]] = None, user=None) -> Job:
+	"""Queue a job for the worker; ``params`` must be JSON serialisable."""
+
+	get_kind(kind)
+	with transaction.atomic():
+		return Job.objects.create(kind=kind, params=params or {}, created_by=user)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from typing import Iterable, Iterator, Optional, TypeVar
+
+from django.core.files import File
+from django.db import DatabaseError, close_old_connections, connections
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_kind
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Progress and the heartbeat are written this often, from a separate thread.
+PROGRESS_INTERVAL = 2.0
+
+
+def worker_name() -> str:
+	return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobContext:
+	"""Handed to job handlers to report progress and store the result file.
+
+	Progress is only recorded in memory by the handler; a reporter thread with its own
+	database connection writes it out (and bumps ``updated_at`` as a heartbeat). The
+	handler's connection usually has a long read open for the export, and on SQLite
+	that connection cannot write while it does.
+	"""
+
+	def __init__(self, job: Job):
+		self.job = job
+		self._pending: Optional[tuple[int, str]] = None
+		self._lock = threading.Lock()
+		self._stopped = threading.Event()
+		self._reporter = threading.Thread(target=self._report, name=f"job-{job.pk}-progress", daemon=True)
+
+	def __enter__(self) -> "JobContext":
+		self._reporter.start()
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self._stopped.set()
+		self._reporter.join()
+
+	@property
+	def params(self) -> dict:
+		return self.job.params
+
+	def progress(self, done: int, total: Optional[int] = None, message: str = "") -> None:
+		percent = min(int(done * 100 / total), 99) if total else self.job.progress
+		self.job.progress = percent
+		self.job.message = message[:255]
+		with self._lock:
+			self._pending = (percent, self.job.message)
+
+	def _flush(self) -> None:
+		with self._lock:
+			pending, self._pending = self._pending, None
+		fields = {"updated_at": timezone.now()}
+		if pending:
+			fields["progress"], fields["message"] = pending
+		try:
+			Job.objects.filter(pk=self.job.pk).update(**fields)
+		except DatabaseError:
+			logger.warning("Could not record progress for job %s", self.job.pk, exc_info=True)
+			with self._lock:
+				self._pending = self._pending or pending
+
+	def _report(self) -> None:
+		try:
+			while not self._stopped.wait(PROGRESS_INTERVAL):
+				self._flush()
+			self._flush()
+		finally:
+			connections.close_all()
+
+	def track(self, items: Iterable[T], total: Optional[int], noun: str = "rows") -> Iterator[T]:
+		"""Yield ``items`` unchanged while reporting how many have gone past."""
+
+		done = 0
+		for done, item in enumerate(items, start=1):
+			yield item
+			if done % 500 == 0:
+				self.progress(done, total, f"{done:,} of {total:,} {noun}" if total else f"{done:,} {noun}")
+		self.progress(done, total, f"{done:,} {noun}")
+
+	def save_result(self, filename: str, chunks: Iterable[bytes]) -> int:
+		"""Spool ``chunks`` to a temporary file, then store it as the job's result."""
+
+		size = 0
+		with tempfile.TemporaryFile() as spool:
+			for chunk in chunks:
+				spool.write(chunk)
+				size += len(chunk)
+			spool.seek(0)
+			self.job.result.save(filename, File(spool), save=False)
+		Job.objects.filter(pk=self.job.pk).update(result=self.job.result.name, updated_at=timezone.now())
+		return size
+
+
+def run_job(job_id: int) -> str:
+	"""Run one claimed job to completion and record the outcome."""
+
+	close_old_connections()
+	try:
+		job = Job.objects.get(pk=job_id)
+		started = time.monotonic()
+		try:
+			with JobContext(job) as context:
+				summary = get_kind(job.kind).handler(context, **job.params)
+		except Exception:
+			logger.exception("Job %s (%s) failed", job.pk, job.kind)
+			# Drop whatever half-read cursor the handler left behind before writing.
+			connections.close_all()
+			Job.objects.filter(pk=job.pk).update(
+				status=Job.Status.FAILED,
+				error=traceback.format_exc(),
+				finished_at=timezone.now(),
+				updated_at=timezone.now(),
+			)
+			return Job.Status.FAILED
+		Job.objects.filter(pk=job.pk).update(
+			status=Job.Status.SUCCEEDED,
+			progress=100,
+			message=(summary or "")[:255],
+			finished_at=timezone.now(),
+			updated_at=timezone.now(),
+		)
+		logger.info("Job %s (%s) finished in %.1fs", job.pk, job.kind, time.monotonic() - started)
+		return Job.Status.SUCCEEDED
+	finally:
+		# Pool threads keep running after the job, so release this thread's connections.
+		connections.close_all()
@@ -0,0 +1,125 @@
+import tempfile
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from accounts.models import User
+
+from .models import Job
+from .registry import JOB_KINDS, UnknownJobKind, enqueue, register
+from .runner import run_job
+
+
+def _succeed(context, rows: int = 3) -> str:
+    context.progress(1, rows, "Writing")
+    size = context.save_result("rows.csv", [b"id\n", *(f"{row}\n".encode() for row in range(rows))])
+    return f"{rows} rows, {size} bytes"
+
+
+def _fail(context) -> str:
+    raise ValueError("boom")
+
+
+class TestKindsMixin:
+    """Register a succeeding and a failing job kind for the duration of a test class."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        register("tests.succeed", "Test success")(_succeed)
+        register("tests.fail", "Test failure")(_fail)
+
+    @classmethod
+    def tearDownClass(cls):
+        JOB_KINDS.pop("tests.succeed", None)
+        JOB_KINDS.pop("tests.fail", None)
+        super().tearDownClass()
+
+
+class JobQueueTests(TestKindsMixin, TestCase):
+    def test_enqueue_rejects_unknown_kinds(self):
+        with self.assertRaises(UnknownJobKind):
+            enqueue("tests.missing")
+        self.assertFalse(Job.objects.exists())
+
+    def test_claim_takes_the_oldest_queued_jobs_once(self):
+        user = User.objects.create_user("librarian", password="pw", role=User.Role.LIBRARIAN)
+        jobs = [enqueue("tests.succeed", {"rows": index}, user=user) for index in range(3)]
+
+        first = Job.objects.claim("worker-a", 2)
+        second = Job.objects.claim("worker-b", 2)
+
+        self.assertEqual(first, [jobs[0].pk, jobs[1].pk])
+        self.assertEqual(second, [jobs[2].pk])
+        self.assertEqual(Job.objects.claim("worker-c", 2), [])
+        claimed = Job.objects.get(pk=jobs[0].pk)
+        self.assertEqual((claimed.status, claimed.worker, claimed.attempts), (Job.Status.RUNNING, "worker-a", 1))
+        self.assertIsNotNone(claimed.started_at)
+        self.assertEqual(claimed.label, "Test success")
+
+    def test_stale_jobs_are_requeued_and_retried(self):
+        job = enqueue("tests.succeed")
+        Job.objects.claim("crashed", 1)
+        Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(minutes=30))
+        fresh = enqueue("tests.succeed")
+        Job.objects.claim("alive", 1)
+
+        self.assertEqual(Job.objects.requeue_stale(timedelta(minutes=10)), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.Status.QUEUED, ""))
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, Job.Status.RUNNING)
+        self.assertEqual(Job.objects.claim("retry", 1), [job.pk])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+
+    def test_only_queued_jobs_can_be_cancelled(self):
+        queued, running = enqueue("tests.succeed"), enqueue("tests.succeed")
+        Job.objects.filter(pk=running.pk).update(status=Job.Status.RUNNING)
+        running.refresh_from_db()
+
+        self.assertTrue(queued.cancel())
+        self.assertFalse(running.cancel())
+        self.assertEqual(queued.status, Job.Status.CANCELLED)
+        self.assertTrue(queued.is_finished)
+        self.assertEqual(Job.objects.claim("worker", 5), [])
+
+
+class RunJobTests(TestKindsMixin, TransactionTestCase):
+    # run_job closes its connections and reports progress from another thread, so
+    # the jobs must be committed rather than wrapped in a test transaction.
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_successful_job_stores_result_and_summary(self):
+        job = enqueue("tests.succeed", {"rows": 2})
+        Job.objects.claim("worker", 1)
+
+        self.assertEqual(run_job(job.pk), Job.Status.SUCCEEDED)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (Job.Status.SUCCEEDED, 100))
+        self.assertEqual(job.message, "2 rows, 7 bytes")
+        self.assertEqual(job.result_filename, "rows.csv")
+        with job.result.open("rb") as result:
+            self.assertEqual(result.read(), b"id\n0\n1\n")
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failing_job_records_the_error(self):
+        job = enqueue("tests.fail")
+        Job.objects.claim("worker", 1)
+
+        with self.assertLogs("jobs.runner", "ERROR"):
+            self.assertEqual(run_job(job.pk), Job.Status.FAILED)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.error_summary, "ValueError: boom")
+        self.assertIn("Traceback", job.error)
+        self.assertFalse(job.result)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from django.contrib import messages
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.views.generic import DetailView, ListView, View
+
+from accounts.models import User
+from accounts.permissions import RoleRequiredMixin
+
+from .models import Job
+
+
+class JobAccessMixin(RoleRequiredMixin):
+	"""Staff see their own jobs; admins see everyone's."""
+
+	required_roles = (User.Role.ADMIN, User.Role.LIBRARIAN)
+
+	def get_queryset(self):
+		queryset = Job.objects.select_related("created_by")
+		if not (self.request.user.is_admin or self.request.user.is_superuser):
+			queryset = queryset.filter(created_by=self.request.user)
+		return queryset
+
+
+def job_status(job: Job) -> dict:
+	return {
+		"id": job.pk,
+		"kind": job.kind,
+		"label": job.label,
+		"status": job.status,
+		"status_display": job.get_status_display(),
+		"progress": job.progress,
+		"message": job.message,
+		"finished": job.is_finished,
+		"download_url": job.get_download_url() if job.result else None,
+		"error": job.error_summary,
+	}
+
+
+class JobListView(JobAccessMixin, ListView):
+	template_name = "jobs/job_list.html"
+	context_object_name = "jobs"
+	paginate_by = 25
+
+
+class JobDetailView(JobAccessMixin, DetailView):
+	template_name = "jobs/job_detail.html"
+	context_object_name = "job"
+
+
+class JobStatusView(JobAccessMixin, View):
+	"""JSON status polled by the job detail page."""
+
+	def get(self, request: HttpRequest, pk: int) -> HttpResponse:
+		job = get_object_or_404(self.get_queryset(), pk=pk)
+		return JsonResponse(job_status(job))
+
+
+class JobDownloadView(JobAccessMixin, View):
+	def get(self, request: HttpRequest, pk: int) -> HttpResponse:
+		job = get_object_or_404(self.get_queryset(), pk=pk, status=Job.Status.SUCCEEDED)
+		if not job.result:
+			raise Http404("This job has no result file.")
+		return FileResponse(job.result.open("rb"), as_attachment=True, filename=job.result_filename)
+
+
+class JobCancelView(JobAccessMixin, View):
+	def post(self, request: HttpRequest, pk: int) -> HttpResponse:
+		job = get_object_or_404(self.get_queryset(), pk=pk)
+		if job.cancel():
+			messages.success(request, f"{job.label} cancelled.")
+		else:
+			messages.error(request, "Only jobs that have not started yet can be cancelled.")
+		return redirect("jobs:detail", pk=job.pk)
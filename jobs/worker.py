@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+from typing import Optional
+
+from django.db import DatabaseError, connections
+
+from .bootstrap import setup_process
+from .models import Job
+from .runner import run_job, worker_name
+
+
+logger = logging.getLogger(__name__)
+
+POOLS = ("thread", "process")
+
+
+def make_executor(pool: str, concurrency: int) -> Executor:
+	if pool == "process":
+		return ProcessPoolExecutor(
+			max_workers=concurrency,
+			mp_context=multiprocessing.get_context("spawn"),
+			initializer=setup_process,
+		)
+	return ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job")
+
+
+class Worker:
+	"""Poll the jobs table and keep up to ``concurrency`` jobs running in a pool."""
+
+	def __init__(
+		self,
+		concurrency: int = 2,
+		pool: str = "thread",
+		poll_interval: float = 2.0,
+		stale_after: timedelta = timedelta(minutes=10),
+		burst: bool = False,
+		name: Optional[str] = None,
+	):
+		self.concurrency = concurrency
+		self.pool = pool
+		self.poll_interval = poll_interval
+		self.stale_after = stale_after
+		self.burst = burst
+		self.name = name or worker_name()
+		self.processed = 0
+		self._stopping = threading.Event()
+
+	def stop(self, *args) -> None:
+		if not self._stopping.is_set():
+			logger.info("Worker %s stopping after the running jobs finish", self.name)
+		self._stopping.set()
+
+	def install_signal_handlers(self) -> None:
+		signal.signal(signal.SIGTERM, self.stop)
+		signal.signal(signal.SIGINT, self.stop)
+
+	def run(self) -> int:
+		"""Process jobs until stopped (or, in burst mode, until the queue is empty)."""
+
+		requeued = Job.objects.requeue_stale(self.stale_after)
+		if requeued:
+			logger.warning("Requeued %s stale jobs", requeued)
+		running: set[Future] = set()
+		with make_executor(self.pool, self.concurrency) as executor:
+			while not self._stopping.is_set():
+				claimed = []
+				free = self.concurrency - len(running)
+				if free > 0:
+					try:
+						claimed = Job.objects.claim(self.name, free)
+					except DatabaseError:
+						# Typically a busy SQLite file; try again on the next round.
+						logger.exception("Could not claim jobs")
+					for job_id in claimed:
+						running.add(executor.submit(run_job, job_id))
+				# Don't hold a connection open in the polling thread between rounds.
+				connections.close_all()
+				if self.burst and not running and not claimed:
+					break
+				if running:
+					done, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+					self._collect(done)
+				else:
+					self._stopping.wait(self.poll_interval)
+			done, _ = wait(running)
+			self._collect(done)
+		return self.processed
+
+	def _collect(self, futures) -> None:
+		for future in futures:
+			self.processed += 1
+			exception = future.exception()
+			if exception is not None:
+				# run_job records handler errors itself; this only catches pool failures.
+				logger.error("Job runner crashed: %r", exception)
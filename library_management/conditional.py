@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+from typing import Any, Callable, Optional
+
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def make_etag(*parts: Any) -> str:
+    """Return a strong, quoted ETag for the given version parts."""
+
+    digest = hashlib.sha1("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def conditional_response(
+    request: HttpRequest,
+    etag: str,
+    render: Callable[[], HttpResponseBase],
+    last_modified: Optional[datetime.datetime] = None,
+) -> HttpResponseBase:
+    """Answer 304 when the client's validators still match, otherwise call ``render``.
+
+    Unlike ``django.views.decorators.http.condition`` this runs inside the view, after
+    authentication and filtering, so the ETag can depend on the user and the filtered
+    queryset. Responses are marked ``private, no-cache``: clients keep a copy but
+    revalidate it on every use, which is what makes polling cheap.
+    """
+
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+    response.headers["ETag"] = etag
+    if timestamp is not None:
+        response.headers["Last-Modified"] = http_date(timestamp)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import datetime
+import json
+from decimal import Decimal
+from typing import Any, Iterable, Optional, Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q, QuerySet
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    """Raised when a pagination cursor cannot be decoded for the requested ordering."""
+
+
+class KeysetPage:
+    """A page of results located by the ordering key of its edge rows instead of an OFFSET.
+
+    Mirrors the parts of ``django.core.paginator.Page`` used by the templates, minus
+    page numbers and totals, which would require a COUNT(*).
+    """
+
+    is_keyset = True
+
+    def __init__(self, object_list: list, next_cursor: Optional[str], previous_cursor: Optional[str]):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self) -> str:
+        return f"<KeysetPage of {len(self.object_list)} items>"
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+def _serialize(value: Any) -> Any:
+    # Keep full precision: DjangoJSONEncoder truncates microseconds, which would make
+    # rows that differ only below the millisecond fall between two pages.
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _fields(queryset: QuerySet, ordering: Sequence[str]) -> list:
+    try:
+        return [queryset.model._meta.get_field(name.lstrip("-")) for name in ordering]
+    except FieldDoesNotExist as exc:
+        raise ValueError(f"Keyset ordering must use concrete fields of {queryset.model.__name__}.") from exc
+
+
+def encode_cursor(values: Iterable[Any], backwards: bool = False) -> str:
+    payload = json.dumps({"k": [_serialize(value) for value in values], "b": int(backwards)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, fields: Sequence) -> tuple[list[Any], bool]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        raw_values = payload["k"]
+        backwards = bool(payload.get("b"))
+    except (binascii.Error, ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if not isinstance(raw_values, list) or len(raw_values) != len(fields):
+        raise InvalidCursor(cursor)
+    try:
+        values = [field.to_python(value) for field, value in zip(fields, raw_values)]
+    except ValidationError as exc:
+        raise InvalidCursor(cursor) from exc
+    return values, backwards
+
+
+def _reverse(ordering: Sequence[str]) -> list[str]:
+    return [name[1:] if name.startswith("-") else f"-{name}" for name in ordering]
+
+
+def _after(ordering: Sequence[str], values: Sequence[Any]) -> Q:
+    """Build the row-value comparison ``(a, b, ...) > (x, y, ...)`` for mixed directions."""
+
+    condition = Q()
+    for index, name in enumerate(ordering):
+        field = name.lstrip("-")
+        lookup = "lt" if name.startswith("-") else "gt"
+        step = Q(**{f"{field}__{lookup}": values[index]})
+        for previous, value in zip(ordering[:index], values[:index]):
+            step &= Q(**{previous.lstrip("-"): value})
+        condition |= step
+    return condition
+
+
+def paginate_keyset(
+    queryset: QuerySet,
+    ordering: Sequence[str],
+    page_size: int,
+    cursor: Optional[str] = None,
+) -> KeysetPage:
+    """Return the page of ``queryset`` that follows (or precedes) ``cursor``.
+
+    ``ordering`` must end in a unique column (normally ``id``) so that every row has a
+    distinct key. Each page costs one indexed range scan of ``page_size + 1`` rows no
+    matter how deep it is.
+    """
+
+    fields = _fields(queryset, ordering)
+    backwards = False
+    if cursor:
+        values, backwards = decode_cursor(cursor, fields)
+    order = _reverse(ordering) if backwards else list(ordering)
+    queryset = queryset.order_by(*order)
+    if cursor:
+        queryset = queryset.filter(_after(order, values))
+
+    rows = list(queryset[: page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def key(row) -> list[Any]:
+        return [getattr(row, field.attname) for field in fields]
+
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = encode_cursor(key(rows[-1]))
+        if (has_more and backwards) or (cursor and not backwards):
+            previous_cursor = encode_cursor(key(rows[0]), backwards=True)
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """ListView mixin that swaps OFFSET pagination for keyset navigation.
+
+    Views set ``keyset_ordering`` (or override ``get_keyset_ordering`` and return None
+    to fall back to regular page numbers, e.g. for relevance-ranked results).
+    """
+
+    keyset_ordering: Optional[tuple[str, ...]] = None
+    cursor_kwarg = "cursor"
+
+    def get_keyset_ordering(self) -> Optional[tuple[str, ...]]:
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self.get_keyset_ordering()
+        if not ordering:
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            page = paginate_keyset(queryset, ordering, page_size, self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return (None, page, page.object_list, page.has_other_pages())
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 import environ
@@ -66,12 +67,16 @@ INSTALLED_APPS = [
     "circulation",
     "notifications",
     "reports",
+    "jobs",
+    "monitoring",
     "api",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "monitoring.middleware.InstrumentationMiddleware",
+    "monitoring.middleware.ProfilingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
@@ -110,6 +115,12 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # WAL lets streaming exports and background jobs read while other
+            # connections write; the default journal blocks writers for the whole read.
+            "init_command": "PRAGMA journal_mode=WAL;",
+            "timeout": 20,
+        },
     }
 }
 
@@ -125,6 +136,16 @@ if env.bool("USE_POSTGRES", default=False):
     }
 
 
+# Cache
+# Per-process memory by default; point CACHE_URL at Redis or Memcached
+# (e.g. redis://127.0.0.1:6379/1) to share cached data between workers.
+# With the default LocMem cache, invalidate_dashboard_snapshot() only clears the
+# snapshot of the process that made the change; other workers keep serving theirs
+# until DASHBOARD_CACHE_TIMEOUT expires.
+
+CACHES = {"default": env.cache_url("CACHE_URL", default="locmemcache://")}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -200,7 +221,7 @@ REST_FRAMEWORK = {
         "rest_framework.filters.SearchFilter",
         "rest_framework.filters.OrderingFilter",
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.PageOrCursorPagination",
     "PAGE_SIZE": 25,
     "DEFAULT_THROTTLE_CLASSES": [
         "rest_framework.throttling.UserRateThrottle",
@@ -275,6 +296,43 @@ LOGGING = {
 LOAN_PERIOD_DAYS = env.int("LOAN_PERIOD_DAYS", default=14)
 FINE_RATE_PER_DAY = env.float("FINE_RATE_PER_DAY", default=1.50)
 MAX_ACTIVE_LOANS_PER_MEMBER = env.int("MAX_ACTIVE_LOANS_PER_MEMBER", default=5)
+RESERVATION_HOLD_DAYS = env.int("RESERVATION_HOLD_DAYS", default=2)
+
+# Reports configuration
+DASHBOARD_CACHE_TIMEOUT = env.int("DASHBOARD_CACHE_TIMEOUT", default=300)
+TIMESERIES_CACHE_TIMEOUT = env.int("TIMESERIES_CACHE_TIMEOUT", default=3600)
+COLLECTION_ANALYTICS_CACHE_TIMEOUT = env.int("COLLECTION_ANALYTICS_CACHE_TIMEOUT", default=300)
+
+# Background jobs (python manage.py run_jobs)
+JOBS_CONCURRENCY = env.int("JOBS_CONCURRENCY", default=2)
+JOBS_POOL = env.str("JOBS_POOL", default="thread")
+JOBS_POLL_INTERVAL = env.float("JOBS_POLL_INTERVAL", default=2.0)
+
+# Request instrumentation (monitoring.middleware.InstrumentationMiddleware)
+INSTRUMENTATION_ENABLED = env.bool("INSTRUMENTATION_ENABLED", default=True)
+# Share of requests whose SQL is counted and logged; latency is always recorded.
+INSTRUMENTATION_SAMPLE_RATE = env.float("INSTRUMENTATION_SAMPLE_RATE", default=1.0 if DEBUG else 0.1)
+INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = env.int("INSTRUMENTATION_N_PLUS_ONE_THRESHOLD", default=5)
+INSTRUMENTATION_SLOW_REQUEST_MS = env.int("INSTRUMENTATION_SLOW_REQUEST_MS", default=1000)
+INSTRUMENTATION_SERVER_TIMING = env.bool("INSTRUMENTATION_SERVER_TIMING", default=True)
+# Statements at least this slow are logged on "monitoring.slow_queries" from every
+# process (web, jobs, commands); 0 turns the slow-query log off.
+SLOW_QUERY_MS = env.int("SLOW_QUERY_MS", default=200)
+
+# Prometheus metrics (/monitoring/metrics/). Every process writes its values to a file
+# in METRICS_DIR and the endpoint sums them; clear the directory on deploy.
+METRICS_DIR = env.str("METRICS_DIR", default=str(Path(tempfile.gettempdir()) / "library-management-metrics"))
+METRICS_FLUSH_INTERVAL = env.float("METRICS_FLUSH_INTERVAL", default=5.0)
+# Scrapers send "Authorization: Bearer <token>"; administrators can also use their session.
+METRICS_TOKEN = env.str("METRICS_TOKEN", default="")
+
+# Sampling profiler (monitoring.middleware.ProfilingMiddleware). Which requests are
+# profiled is set by the ProfilingRule rows in the admin, reread every PROFILING_RULES_TTL seconds.
+PROFILING_ENABLED = env.bool("PROFILING_ENABLED", default=True)
+PROFILING_DIR = env.str("PROFILING_DIR", default=str(Path(tempfile.gettempdir()) / "library-management-profiles"))
+PROFILING_MAX_CAPTURES = env.int("PROFILING_MAX_CAPTURES", default=200)
+PROFILING_RULES_TTL = env.float("PROFILING_RULES_TTL", default=10.0)
+PROFILING_SAMPLER_INTERVAL = env.float("PROFILING_SAMPLER_INTERVAL", default=0.005)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
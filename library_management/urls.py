@@ -28,6 +28,8 @@ urlpatterns = [
     path("circulation/", include(("circulation.urls", "circulation"), namespace="circulation")),
     path("notifications/", include(("notifications.urls", "notifications"), namespace="notifications")),
     path("reports/", include(("reports.urls", "reports"), namespace="reports")),
+    path("jobs/", include(("jobs.urls", "jobs"), namespace="jobs")),
+    path("monitoring/", include(("monitoring.urls", "monitoring"), namespace="monitoring")),
     path("api/", include(("api.urls", "api"), namespace="api")),
     path("api-auth/", include("rest_framework.urls")),
     path("", home_redirect, name="home"),
@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from .models import ProfilingRule
+
+
+@admin.register(ProfilingRule)
+class ProfilingRuleAdmin(admin.ModelAdmin):
+	list_display = (
+		"name",
+		"is_active",
+		"active_until",
+		"url_names",
+		"sample_rate",
+		"min_duration_ms",
+		"profiler",
+		"trace_memory",
+	)
+	list_editable = ("is_active",)
+	list_filter = ("is_active", "profiler")
+	search_fields = ("name", "url_names")
+	autocomplete_fields = ("users",)
@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import hashlib
+import itertools
+import json
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from .benchmarks import Fixtures, Scenario
+from .instrumentation import query_signature
+
+# Predicates on a qualified column, as Django renders them: "table"."column" ...
+_COLUMN = r'"(?P<table>\w+)"\."(?P<column>\w+)"'
+_EQUALITY_RE = re.compile(_COLUMN + r"\s*(?:=\s*%s|IN\s*\()")
+_NEGATED_RE = re.compile(r"NOT\s+" + _COLUMN)
+_RANGE_RE = re.compile(_COLUMN + r"\s*(?:<=?|>=?)\s*%s")
+_NULL_RE = re.compile(_COLUMN + r"\s+IS\s+NULL")
+_ORDER_RE = re.compile(_COLUMN + r"\s+(?P<direction>ASC|DESC)")
+_ALIAS_RE = re.compile(r'"(?P<table>\w+)"\s+(?:AS\s+)?"?(?P<alias>T\d+)"?')
+
+_SQLITE_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(?P<table>\w+)(?: AS \w+)?$")
+_SQLITE_TEMP_RE = re.compile(r"USE TEMP B-TREE FOR (?P<what>.+)$")
+
+
+@dataclass
+class Statement:
+	sql: str
+	params: tuple
+	sources: set[str] = field(default_factory=set)
+	runs: int = 0
+	plan: list[str] = field(default_factory=list)
+	findings: list["Finding"] = field(default_factory=list)
+
+
+@dataclass
+class Finding:
+	kind: str
+	table: str
+	detail: str
+	proposals: list["Proposal"] = field(default_factory=list)
+	note: str = ""
+
+
+@dataclass(frozen=True)
+class Proposal:
+	model: type[models.Model]
+	fields: tuple[str, ...]
+	condition: tuple[tuple[str, bool], ...] = ()
+
+	@property
+	def label(self) -> str:
+		return self.model._meta.label
+
+	@property
+	def name(self) -> str:
+		# Django caps index names at 30 characters.
+		name = f"{self.model._meta.db_table}_{'_'.join(f.lstrip('-') for f in self.fields)}_idx"
+		if len(name) <= 30:
+			return name
+		digest = hashlib.sha1(repr((self.fields, self.condition)).encode()).hexdigest()[:6]
+		return f"{self.model._meta.db_table[:19]}_{digest}_idx"
+
+	def as_code(self) -> str:
+		parts = [f"fields={list(self.fields)!r}".replace("'", '"')]
+		if self.condition:
+			lookups = ", ".join(f"{lookup}={value}" for lookup, value in self.condition)
+			parts.append(f"condition=Q({lookups})")
+		parts.append(f'name="{self.name}"')
+		return f"models.Index({', '.join(parts)})"
+
+
+class StatementCollector:
+	"""``execute_wrapper`` keeping one example of every distinct SELECT."""
+
+	def __init__(self):
+		self.source = ""
+		self.statements: dict[str, Statement] = {}
+
+	def __call__(self, execute, sql, params, many, context):
+		if not many and sql.lstrip().upper().startswith(("SELECT", "WITH")):
+			signature = query_signature(sql)
+			statement = self.statements.get(signature)
+			if statement is None:
+				statement = self.statements[signature] = Statement(sql, tuple(params or ()))
+			statement.sources.add(self.source)
+			statement.runs += 1
+		return execute(sql, params, many, context)
+
+
+def replay(scenarios: Iterable[Scenario], calls: int, extra: dict[str, Callable[[], object]]) -> list[Statement]:
+	"""Run the scenarios' requests and the ``extra`` callables, collecting their SELECTs.
+
+	Everything runs in one transaction that is rolled back, with a dummy cache and the
+	in-memory mail backend, so replaying the write paths leaves no trace.
+	"""
+
+	collector = StatementCollector()
+	with override_settings(
+		ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+		CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}},
+		EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+		INSTRUMENTATION_SAMPLE_RATE=0.0,
+		PROFILING_ENABLED=False,
+		SLOW_QUERY_MS=0,
+	), transaction.atomic():
+		fixtures = Fixtures.load()
+		clients = {}
+		for role, user in (("librarian", fixtures.librarian), ("member", fixtures.member)):
+			clients[role] = Client(raise_request_exception=False)
+			clients[role].force_login(user)
+		for scenario in scenarios:
+			collector.source = scenario.name
+			# Building the calls may query too (e.g. to find open loans); only the requests count.
+			for method, path, data in list(itertools.islice(scenario.calls(fixtures), calls)):
+				if scenario.before:
+					scenario.before()
+				with connection.execute_wrapper(collector):
+					response = getattr(clients[scenario.user], method)(path, data)
+					if response.streaming:
+						for _ in response:
+							pass
+		for name, function in extra.items():
+			collector.source = name
+			with connection.execute_wrapper(collector):
+				function()
+		transaction.set_rollback(True)
+	return list(collector.statements.values())
+
+
+def explain(sql: str, params: tuple) -> list[str]:
+	"""The plan of one statement as text lines, in the database's own terms."""
+
+	with connection.cursor() as cursor:
+		if connection.vendor == "sqlite":
+			cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+			depth, lines = {0: -1}, []
+			for node, parent, _, detail in cursor.fetchall():
+				depth[node] = depth.get(parent, -1) + 1
+				lines.append("  " * depth[node] + detail)
+			return lines
+		if connection.vendor == "postgresql":
+			cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+			plan = cursor.fetchone()[0]
+			plan = json.loads(plan) if isinstance(plan, str) else plan
+			lines = []
+			_walk_postgres(plan[0]["Plan"], 0, lines)
+			return lines
+		if connection.vendor == "mysql":
+			cursor.execute("EXPLAIN " + sql, params)
+			columns = [column[0] for column in cursor.description]
+			return [
+				"table={table} type={type} key={key} rows={rows} extra={Extra}".format(**dict(zip(columns, row)))
+				for row in cursor.fetchall()
+			]
+	raise NotImplementedError(f"EXPLAIN is not supported for {connection.vendor}.")
+
+
+def _walk_postgres(node: dict, depth: int, lines: list[str]) -> None:
+	relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+	index = f" using {node['Index Name']}" if "Index Name" in node else ""
+	sort = f" by {', '.join(node['Sort Key'])}" if "Sort Key" in node else ""
+	lines.append(f"{'  ' * depth}{node['Node Type']}{relation}{index}{sort}")
+	for child in node.get("Plans", []):
+		_walk_postgres(child, depth + 1, lines)
+
+
+def findings_from_plan(plan: list[str], sql: str) -> list[Finding]:
+	"""Full table scans and sorts the database had to do itself, one per table and kind."""
+
+	aliases = {match["alias"]: match["table"] for match in _ALIAS_RE.finditer(sql)}
+	found: dict[tuple[str, str], Finding] = {}
+
+	def add(kind: str, table: Optional[str], detail: str) -> None:
+		table = aliases.get(table, table) or ""
+		found.setdefault((kind, table), Finding(kind, table, detail))
+
+	for line in (line.strip() for line in plan):
+		if connection.vendor == "sqlite":
+			match = _SQLITE_SCAN_RE.match(line)
+			if match:
+				add("full scan", match["table"], line)
+			elif _SQLITE_TEMP_RE.search(line):
+				add("sort", _ordered_table(sql) if "ORDER BY" in line else None, line)
+		elif connection.vendor == "postgresql":
+			match = re.match(r"Seq Scan on (\w+)", line)
+			if match:
+				add("full scan", match[1], line)
+			elif line.startswith(("Sort", "Incremental Sort")):
+				add("sort", _ordered_table(sql), line)
+		elif connection.vendor == "mysql":
+			match = re.match(r"table=(\S+) type=(\S+)", line)
+			if match and match[2] == "ALL":
+				add("full scan", match[1], line)
+			if "Using filesort" in line:
+				add("sort", _ordered_table(sql), line)
+	return list(found.values())
+
+
+def _segments(sql: str) -> list[str]:
+	"""The statement and each parenthesised subquery, with deeper subqueries blanked out.
+
+	Predicates are read per segment so that, in a statement made of several scalar
+	subqueries, each table scan is matched with the filters of its own subquery.
+	"""
+
+	spans, stack = [(0, len(sql))], []
+	for position, char in enumerate(sql):
+		if char == "(":
+			stack.append(position)
+		elif char == ")" and stack:
+			start = stack.pop()
+			if sql[start + 1 : start + 7].upper() == "SELECT":
+				spans.append((start + 1, position))
+	segments = []
+	for start, end in spans:
+		chars = list(sql[start:end])
+		for inner_start, inner_end in spans:
+			if start < inner_start and inner_end < end:
+				chars[inner_start - start : inner_end - start] = " " * (inner_end - inner_start)
+		segments.append("".join(chars))
+	return segments
+
+
+def _order_clause(segment: str) -> str:
+	position = segment.rfind("ORDER BY")
+	return segment[position:] if position >= 0 else ""
+
+
+def _ordered_table(sql: str) -> Optional[str]:
+	for segment in _segments(sql):
+		match = _ORDER_RE.search(_order_clause(segment))
+		if match:
+			return match["table"]
+	return None
+
+
+def _models_by_table() -> dict[str, type[models.Model]]:
+	return {model._meta.db_table: model for model in apps.get_models()}
+
+
+def propose(finding: Finding, sql: str) -> list[Proposal]:
+	"""Indexes for the table of ``finding``, one per subquery that reads it.
+
+	Equality columns come first, then either one range column or the ORDER BY
+	columns. ``IS NULL`` tests become the condition of a partial index when other
+	columns remain, because open rows are usually a small, hot part of the table.
+	Sorts only get a proposal when the statement is paginated with ``LIMIT``:
+	sorting a whole result costs about the same as reading it.
+	"""
+
+	model = _models_by_table().get(finding.table)
+	if model is None:
+		return []
+	fields_by_column = {f.column: f for f in model._meta.concrete_fields}
+	reads_table = re.compile(rf'(?:FROM|JOIN)\s+"{re.escape(finding.table)}"')
+
+	def columns(pattern: re.Pattern, text: str) -> list[str]:
+		found = []
+		for match in pattern.finditer(text):
+			column = match["column"]
+			if match["table"] != finding.table or column not in fields_by_column or column in found:
+				continue
+			# Negated tests and primary key lookups gain nothing from a new index.
+			if text[: match.start()].rstrip().endswith("NOT (") or column == model._meta.pk.column:
+				continue
+			found.append(column)
+		return found
+
+	proposals = []
+	for segment in _segments(sql):
+		if not reads_table.search(segment):
+			continue
+		order = [
+			("-" if match["direction"] == "DESC" else "") + match["column"]
+			for match in _ORDER_RE.finditer(_order_clause(segment))
+			if match["table"] == finding.table and match["column"] != model._meta.pk.column
+		]
+		if finding.kind == "sort" and (not order or "LIMIT" not in segment):
+			continue
+		equality = columns(_EQUALITY_RE, segment) + columns(_NEGATED_RE, segment)
+		nulls = [column for column in columns(_NULL_RE, segment) if column not in equality]
+		ranges = [column for column in columns(_RANGE_RE, segment) if column not in equality]
+		index_columns = list(dict.fromkeys(equality))
+		if ranges:
+			index_columns.append(ranges[0])
+		elif finding.kind == "sort" or index_columns:
+			index_columns += [column for column in order if column.lstrip("-") not in index_columns]
+		condition = ()
+		if nulls and index_columns:
+			condition = tuple((f"{fields_by_column[column].name}__isnull", True) for column in nulls)
+		else:
+			index_columns += nulls
+		if not index_columns:
+			continue
+		names = tuple(
+			("-" if column.startswith("-") else "") + fields_by_column[column.lstrip("-")].name
+			for column in index_columns
+		)
+		proposal = Proposal(model, names, condition)
+		if proposal not in proposals:
+			proposals.append(proposal)
+	return proposals
+
+
+def covering_index(proposal: Proposal) -> Optional[str]:
+	"""Name of an existing index whose leading columns already match the proposal."""
+
+	opts = proposal.model._meta
+	wanted = [name.lstrip("-") for name in proposal.fields]
+	candidates = []
+	for index in opts.indexes:
+		if index.condition is None or proposal.condition:
+			candidates.append((index.name, [name.lstrip("-") for name in index.fields]))
+	for constraint in opts.constraints:
+		if isinstance(constraint, models.UniqueConstraint) and constraint.fields and constraint.condition is None:
+			candidates.append((constraint.name, list(constraint.fields)))
+	for together in opts.unique_together:
+		candidates.append(("unique_together", list(together)))
+	for model_field in opts.concrete_fields:
+		if model_field.db_index or model_field.unique or model_field.primary_key:
+			candidates.append((f"{model_field.name} (column index)", [model_field.name]))
+	for name, fields in candidates:
+		if fields[: len(wanted)] == wanted:
+			return name
+	return None
+
+
+@dataclass
+class Report:
+	statements: list[Statement]
+	proposals: dict[Proposal, list[Statement]]
+
+
+def analyse(statements: list[Statement], min_rows: int) -> Report:
+	"""EXPLAIN every statement and attach findings and index proposals to it.
+
+	Scans of tables with fewer than ``min_rows`` rows are ignored.
+	"""
+
+	row_counts: dict[str, int] = {}
+	proposals: dict[Proposal, list[Statement]] = defaultdict(list)
+	models_by_table = _models_by_table()
+	for statement in statements:
+		statement.plan = explain(statement.sql, statement.params)
+		for finding in findings_from_plan(statement.plan, statement.sql):
+			model = models_by_table.get(finding.table)
+			if model is not None and finding.table not in row_counts:
+				row_counts[finding.table] = model._default_manager.count()
+			if row_counts.get(finding.table, 0) < min_rows:
+				continue
+			covered = []
+			for proposal in propose(finding, statement.sql):
+				existing = covering_index(proposal)
+				if existing:
+					covered.append(existing)
+				else:
+					finding.proposals.append(proposal)
+					proposals[proposal].append(statement)
+			if not finding.proposals:
+				if covered:
+					finding.note = f"an index exists ({', '.join(covered)}) but the planner did not use it"
+				elif finding.kind == "sort":
+					finding.note = "the whole result is sorted; an index only pays off for paginated queries"
+				else:
+					finding.note = "no usable predicate; the statement reads the whole table"
+			statement.findings.append(finding)
+	return Report(statements, dict(proposals))
@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import itertools
+import json
+import math
+import platform
+import subprocess
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable, Iterator, Optional
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from catalog.models import Book, BookCopy, Category
+from circulation.models import Fine, Loan, Reservation
+
+from .instrumentation import QueryRecorder
+
+# One request of a scenario: HTTP method, path, query or form data.
+Call = tuple[str, str, dict]
+
+
+@dataclass
+class Fixtures:
+	"""Ids sampled once from the seeded database and rotated through by the scenarios."""
+
+	librarian: User
+	member: User
+	book_ids: list[int]
+	category_ids: list[int]
+	search_terms: list[str]
+	borrower_ids: list[int]
+	loan_ids: list[int]
+	reservation_ids: list[int]
+	fine_ids: list[int]
+
+	@classmethod
+	def load(cls, sample: int = 200) -> "Fixtures":
+		librarian = User.objects.filter(role=User.Role.LIBRARIAN).order_by("pk").first()
+		member = (
+			User.objects.filter(role=User.Role.MEMBER, loans__isnull=False).order_by("pk").first()
+			or User.objects.filter(role=User.Role.MEMBER).order_by("pk").first()
+		)
+		if librarian is None or member is None:
+			raise ValueError("The benchmark database needs at least one librarian and one member.")
+		titles = Book.objects.order_by("pk").values_list("title", flat=True)[:sample]
+		terms = sorted({word.strip(".,:;").lower() for title in titles for word in title.split() if len(word) > 4})
+		return cls(
+			librarian=librarian,
+			member=member,
+			book_ids=list(Book.objects.order_by("pk").values_list("pk", flat=True)[:sample]),
+			category_ids=list(Category.objects.order_by("pk").values_list("pk", flat=True)[:sample]),
+			search_terms=terms[:sample] or ["book"],
+			borrower_ids=list(User.objects.filter(role=User.Role.MEMBER).order_by("pk").values_list("pk", flat=True)[:sample]),
+			loan_ids=list(Loan.objects.order_by("-pk").values_list("pk", flat=True)[:sample]),
+			reservation_ids=list(Reservation.objects.order_by("-pk").values_list("pk", flat=True)[:sample]),
+			fine_ids=list(Fine.objects.order_by("-pk").values_list("pk", flat=True)[:sample]),
+		)
+
+
+@dataclass
+class Scenario:
+	name: str
+	user: str
+	calls: Callable[[Fixtures], Iterator[Call]]
+	expect: tuple[int, ...] = (200,)
+	# Runs before every request, outside the timed section (e.g. to measure a cold cache).
+	before: Optional[Callable[[], None]] = None
+
+
+def _cycle(values: list, build: Callable) -> Iterator[Call]:
+	for value in itertools.cycle(values or [0]):
+		yield build(value)
+
+
+def _get(name: str, *args, **params) -> Call:
+	return ("get", reverse(name, args=args or None), params)
+
+
+def _book_search(fx: Fixtures) -> Iterator[Call]:
+	return _cycle(fx.search_terms, lambda term: _get("catalog:book-list", q=term))
+
+
+def _book_filter(fx: Fixtures) -> Iterator[Call]:
+	pairs = list(itertools.product(fx.category_ids[:20], ["", "a", "e"]))
+	return _cycle(pairs, lambda pair: _get("catalog:book-list", category=pair[0], title=pair[1]))
+
+
+def _loan_create(fx: Fixtures) -> Iterator[Call]:
+	copies = BookCopy.objects.filter(status=BookCopy.Status.AVAILABLE).order_by("pk").values_list("pk", flat=True)
+	borrowers = itertools.cycle(fx.borrower_ids)
+	for copy_id in copies.iterator():
+		data = {"copy": copy_id, "borrower": next(borrowers), "issued_by": "", "due_at": "", "notes": ""}
+		yield ("post", reverse("circulation:loan-create"), data)
+
+
+def _loan_return(fx: Fixtures) -> Iterator[Call]:
+	loans = Loan.objects.filter(returned_at__isnull=True).order_by("-pk").values_list("pk", flat=True)
+	for loan_id in loans.iterator():
+		yield ("post", reverse("circulation:loan-return", args=[loan_id]), {"returned_at": "", "notes": ""})
+
+
+def _loan_export(fx: Fixtures) -> Iterator[Call]:
+	issued_from = (timezone.localdate() - timedelta(days=90)).isoformat()
+	return itertools.repeat(_get("reports:loan-export", issued_from=issued_from))
+
+
+def _list_and_detail(name: str, ids: Callable[[Fixtures], list[int]]) -> list[Scenario]:
+	return [
+		Scenario(f"{name}-list", "librarian", lambda fx: itertools.repeat(_get(f"{name}-list"))),
+		Scenario(f"{name}-detail", "librarian", lambda fx: _cycle(ids(fx), lambda pk: _get(f"{name}-detail", pk))),
+	]
+
+
+SCENARIOS: list[Scenario] = [
+	Scenario("catalog:book-list", "member", lambda fx: itertools.repeat(_get("catalog:book-list"))),
+	Scenario("catalog:book-list?q", "member", _book_search),
+	Scenario("catalog:book-list?filters", "member", _book_filter),
+	Scenario("catalog:book-detail", "member", lambda fx: _cycle(fx.book_ids, lambda pk: _get("catalog:book-detail", pk))),
+	Scenario("circulation:loan-list", "member", lambda fx: itertools.repeat(_get("circulation:loan-list"))),
+	Scenario(
+		"circulation:loan-list?status",
+		"librarian",
+		lambda fx: itertools.repeat(_get("circulation:loan-list", status=Loan.Status.OVERDUE)),
+	),
+	Scenario("circulation:my-fines", "member", lambda fx: itertools.repeat(_get("circulation:my-fines"))),
+	Scenario("circulation:my-reservations", "member", lambda fx: itertools.repeat(_get("circulation:my-reservations"))),
+	Scenario("notifications:list", "member", lambda fx: itertools.repeat(_get("notifications:list"))),
+	Scenario("circulation:loan-create", "librarian", _loan_create, expect=(302,)),
+	Scenario("circulation:loan-return", "librarian", _loan_return, expect=(302,)),
+	Scenario("reports:dashboard", "librarian", lambda fx: itertools.repeat(_get("reports:dashboard"))),
+	Scenario(
+		"reports:dashboard (cold cache)",
+		"librarian",
+		lambda fx: itertools.repeat(_get("reports:dashboard")),
+		before=cache.clear,
+	),
+	Scenario("reports:loan-export", "librarian", _loan_export),
+	*_list_and_detail("api:book", lambda fx: fx.book_ids),
+	*_list_and_detail("api:loan", lambda fx: fx.loan_ids),
+	*_list_and_detail("api:reservation", lambda fx: fx.reservation_ids),
+	*_list_and_detail("api:fine", lambda fx: fx.fine_ids),
+]
+
+
+@dataclass
+class ScenarioResult:
+	name: str
+	requests: int = 0
+	errors: int = 0
+	status_codes: dict[str, int] = field(default_factory=dict)
+	latencies_ms: list[float] = field(default_factory=list)
+	queries: list[int] = field(default_factory=list)
+	db_ms: list[float] = field(default_factory=list)
+	bytes: int = 0
+	note: str = ""
+
+	def summary(self) -> dict:
+		latencies = sorted(self.latencies_ms)
+		elapsed = sum(latencies) / 1000
+		data = {
+			"requests": self.requests,
+			"errors": self.errors,
+			"status_codes": self.status_codes,
+			"throughput_rps": round(self.requests / elapsed, 2) if elapsed else 0.0,
+			"mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else None,
+			"min_ms": round(latencies[0], 3) if latencies else None,
+			"p50_ms": percentile(latencies, 50),
+			"p95_ms": percentile(latencies, 95),
+			"p99_ms": percentile(latencies, 99),
+			"max_ms": round(latencies[-1], 3) if latencies else None,
+			"queries_per_request": round(sum(self.queries) / len(self.queries), 2) if self.queries else None,
+			"max_queries": max(self.queries) if self.queries else None,
+			"db_ms_per_request": round(sum(self.db_ms) / len(self.db_ms), 3) if self.db_ms else None,
+			"bytes_per_request": self.bytes // self.requests if self.requests else 0,
+		}
+		if self.note:
+			data["note"] = self.note
+		return data
+
+
+def percentile(ordered: list[float], rank: float) -> Optional[float]:
+	"""Nearest-rank percentile of an already sorted list."""
+
+	if not ordered:
+		return None
+	index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+	return round(ordered[index], 3)
+
+
+class BenchmarkRunner:
+	"""Drive each scenario through the Django test client and time every request.
+
+	Each request runs under a ``QueryRecorder`` so query counts and DB time are
+	recorded next to the latency, and streamed bodies are consumed inside the timer.
+	The cache (which also holds the API throttle history) is cleared before every
+	scenario so the scenarios do not influence each other.
+	"""
+
+	def __init__(self, iterations: int = 50, warmup: int = 5, log: Callable[[str], None] = print):
+		self.iterations = iterations
+		self.warmup = warmup
+		self.log = log
+
+	def run(self, scenarios: list[Scenario]) -> dict:
+		fixtures = Fixtures.load()
+		clients = {}
+		for role, user in (("librarian", fixtures.librarian), ("member", fixtures.member)):
+			clients[role] = Client(raise_request_exception=False)
+			clients[role].force_login(user)
+
+		results = {}
+		for scenario in scenarios:
+			cache.clear()
+			result = self.run_scenario(scenario, clients[scenario.user], fixtures)
+			results[scenario.name] = result.summary()
+			summary = results[scenario.name]
+			self.log(
+				f"{scenario.name:<34} {summary['requests']:>5} req  p50 {summary['p50_ms'] or 0:>8.2f} ms  "
+				f"p95 {summary['p95_ms'] or 0:>8.2f} ms  {summary['queries_per_request'] or 0:>6} queries  "
+				f"{summary['errors']} errors"
+			)
+		return {"meta": self.meta(), "scenarios": results}
+
+	def run_scenario(self, scenario: Scenario, client: Client, fixtures: Fixtures) -> ScenarioResult:
+		result = ScenarioResult(scenario.name)
+		calls = scenario.calls(fixtures)
+		for index in range(self.warmup + self.iterations):
+			call = next(calls, None)
+			if call is None:
+				result.note = f"ran out of data after {index} requests"
+				break
+			method, path, data = call
+			if scenario.before:
+				scenario.before()
+			recorder = QueryRecorder()
+			with ExitStack() as stack:
+				for alias in connections:
+					stack.enter_context(connections[alias].execute_wrapper(recorder))
+				started = time.perf_counter()
+				response = getattr(client, method)(path, data)
+				size = sum(len(chunk) for chunk in response) if response.streaming else len(response.content)
+				elapsed = time.perf_counter() - started
+			if index < self.warmup:
+				continue
+			result.requests += 1
+			status = str(response.status_code)
+			result.status_codes[status] = result.status_codes.get(status, 0) + 1
+			result.errors += response.status_code not in scenario.expect
+			result.latencies_ms.append(elapsed * 1000)
+			result.queries.append(recorder.count)
+			result.db_ms.append(recorder.duration * 1000)
+			result.bytes += size
+		return result
+
+	def meta(self) -> dict:
+		try:
+			commit = subprocess.run(
+				["git", "rev-parse", "--short", "HEAD"],
+				capture_output=True,
+				text=True,
+				cwd=settings.BASE_DIR,
+				timeout=5,
+			).stdout.strip()
+		except (OSError, subprocess.SubprocessError):
+			commit = ""
+		return {
+			"commit": commit or None,
+			"created_at": timezone.now().isoformat(),
+			"python": platform.python_version(),
+			"django": django.get_version(),
+			"database": connection.vendor,
+			"iterations": self.iterations,
+			"warmup": self.warmup,
+			"dataset": {
+				"books": Book.objects.count(),
+				"copies": BookCopy.objects.count(),
+				"members": User.objects.filter(role=User.Role.MEMBER).count(),
+				"loans": Loan.objects.count(),
+				"reservations": Reservation.objects.count(),
+				"fines": Fine.objects.count(),
+			},
+		}
+
+
+@dataclass
+class Regression:
+	scenario: str
+	metric: str
+	baseline: float
+	current: float
+
+	def __str__(self) -> str:
+		return f"{self.scenario}: {self.metric} {self.baseline} -> {self.current}"
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.25) -> list[Regression]:
+	"""Scenarios whose p95 grew by more than ``threshold`` or that now run more queries.
+
+	Query counts are deterministic for a given dataset, so any increase is reported;
+	latency is noisy, hence the relative threshold.
+	"""
+
+	regressions = []
+	for name, now in current["scenarios"].items():
+		before = baseline.get("scenarios", {}).get(name)
+		if not before:
+			continue
+		if before.get("p95_ms") and now.get("p95_ms") and now["p95_ms"] > before["p95_ms"] * (1 + threshold):
+			regressions.append(Regression(name, "p95_ms", before["p95_ms"], now["p95_ms"]))
+		if before.get("max_queries") is not None and (now.get("max_queries") or 0) > before["max_queries"]:
+			regressions.append(Regression(name, "max_queries", before["max_queries"], now["max_queries"]))
+		if now.get("errors", 0) > before.get("errors", 0):
+			regressions.append(Regression(name, "errors", before.get("errors", 0), now["errors"]))
+	return regressions
+
+
+def dump(results: dict, path: str) -> None:
+	with open(path, "w", encoding="utf-8") as handle:
+		json.dump(results, handle, indent=2, sort_keys=False)
+		handle.write("\n")
+
+
+def load(path: str) -> dict:
+	with open(path, encoding="utf-8") as handle:
+		return json.load(handle)
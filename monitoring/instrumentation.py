@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+import time
+import traceback
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Optional
+
+from django.conf import settings
+
+slow_query_logger = logging.getLogger("monitoring.slow_queries")
+
+# "IN (%s, %s, %s)" differs in length per call; collapse it so the N+1 loop that
+# issues it with different batch sizes still shows up as one signature.
+_IN_LIST_RE = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+
+
+@lru_cache(maxsize=4096)
+def query_signature(sql: str) -> str:
+	"""Return ``sql`` with whitespace and placeholder lists normalised."""
+
+	return _IN_LIST_RE.sub("(...)", " ".join(sql.split()))
+
+
+class QueryRecorder:
+	"""``connection.execute_wrapper`` hook that tallies the queries of one request.
+
+	Database time is the time spent inside ``execute`` (fetching from an open cursor
+	afterwards is attributed to the view). One recorder is only ever installed on the
+	connections of a single thread, so it needs no locking.
+	"""
+
+	def __init__(self):
+		self.count = 0
+		self.duration = 0.0
+		self.duplicates = 0
+		self.signatures: Counter[str] = Counter()
+		self._seen: set[tuple[str, str]] = set()
+
+	def __call__(self, execute, sql, params, many, context):
+		started = time.perf_counter()
+		try:
+			return execute(sql, params, many, context)
+		finally:
+			self.duration += time.perf_counter() - started
+			self.count += 1
+			self.signatures[query_signature(sql)] += 1
+			if not many:
+				# Same statement with the same parameters: a result the view could reuse.
+				key = (sql, repr(params))
+				if key in self._seen:
+					self.duplicates += 1
+				else:
+					self._seen.add(key)
+
+	def repeated(self, threshold: int) -> list[tuple[str, int]]:
+		"""Signatures run at least ``threshold`` times, the usual shape of an N+1."""
+
+		return [(signature, count) for signature, count in self.signatures.most_common() if count >= threshold]
+
+
+def log_slow_queries(execute, sql, params, many, context):
+	"""``execute_wrapper`` installed on every connection that logs statements slower than
+	``SLOW_QUERY_MS``.
+
+	The log line carries the statement, its parameters and the innermost project
+	frame that issued it, which is usually the queryset to fix. Fast statements cost
+	two clock reads.
+	"""
+
+	started = time.perf_counter()
+	try:
+		return execute(sql, params, many, context)
+	finally:
+		duration_ms = (time.perf_counter() - started) * 1000
+		threshold = settings.SLOW_QUERY_MS
+		if threshold and duration_ms >= threshold:
+			slow_query_logger.warning(
+				json.dumps(
+					{
+						"duration_ms": round(duration_ms, 2),
+						"alias": context["connection"].alias,
+						"sql": sql[:2000],
+						"params": repr(params)[:500],
+						"many": many,
+						"source": _query_source(),
+					},
+					separators=(",", ":"),
+				)
+			)
+
+
+def _query_source() -> Optional[str]:
+	base = str(settings.BASE_DIR)
+	# Skip this module: QueryRecorder may be wrapped around the same execute call.
+	for frame in reversed(traceback.extract_stack()):
+		if frame.filename.startswith(base) and frame.filename != __file__:
+			return f"{frame.filename[len(base) + 1 :]}:{frame.lineno} in {frame.name}"
+	return None
+
+
+@dataclass
+class RequestSample:
+	view: str
+	method: str
+	status: int
+	total_ms: float
+	view_ms: float
+	render_ms: float
+	sampled: bool
+	queries: int = 0
+	db_ms: float = 0.0
+	duplicate_queries: int = 0
+	repeated_queries: list[tuple[str, int]] = field(default_factory=list)
+
+	def as_log(self) -> dict:
+		data = asdict(self)
+		data["repeated_queries"] = [{"sql": sql[:300], "count": count} for sql, count in self.repeated_queries]
+		for key in ("total_ms", "view_ms", "render_ms", "db_ms"):
+			data[key] = round(data[key], 2)
+		return data
+
+	def server_timing(self) -> str:
+		metrics = []
+		if self.sampled:
+			metrics.append(f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"')
+		metrics.append(f"view;dur={self.view_ms:.1f}")
+		if self.render_ms:
+			metrics.append(f"render;dur={self.render_ms:.1f}")
+		metrics.append(f"total;dur={self.total_ms:.1f}")
+		return ", ".join(metrics)
+
+
+@dataclass
+class ViewStats:
+	"""Running totals for one view. Query figures cover the sampled requests only."""
+
+	requests: int = 0
+	server_errors: int = 0
+	total_ms: float = 0.0
+	max_ms: float = 0.0
+	sampled: int = 0
+	queries: int = 0
+	max_queries: int = 0
+	db_ms: float = 0.0
+	duplicate_queries: int = 0
+	n_plus_one_requests: int = 0
+	worst_repeated_query: Optional[str] = None
+	worst_repeated_count: int = 0
+
+	def add(self, sample: RequestSample) -> None:
+		self.requests += 1
+		self.server_errors += sample.status >= 500
+		self.total_ms += sample.total_ms
+		self.max_ms = max(self.max_ms, sample.total_ms)
+		if not sample.sampled:
+			return
+		self.sampled += 1
+		self.queries += sample.queries
+		self.max_queries = max(self.max_queries, sample.queries)
+		self.db_ms += sample.db_ms
+		self.duplicate_queries += sample.duplicate_queries
+		if sample.repeated_queries:
+			self.n_plus_one_requests += 1
+			signature, count = sample.repeated_queries[0]
+			if count > self.worst_repeated_count:
+				self.worst_repeated_query, self.worst_repeated_count = signature, count
+
+	def as_dict(self) -> dict:
+		data = asdict(self)
+		data["mean_ms"] = round(self.total_ms / self.requests, 2) if self.requests else 0.0
+		data["mean_queries"] = round(self.queries / self.sampled, 2) if self.sampled else 0.0
+		data["mean_db_ms"] = round(self.db_ms / self.sampled, 2) if self.sampled else 0.0
+		for key in ("total_ms", "max_ms", "db_ms"):
+			data[key] = round(data[key], 2)
+		return data
+
+
+class RequestStats:
+	"""Per-view aggregate for the current process, shared by its request threads."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._views: dict[str, ViewStats] = {}
+
+	def record(self, sample: RequestSample) -> None:
+		with self._lock:
+			stats = self._views.get(sample.view)
+			if stats is None:
+				stats = self._views[sample.view] = ViewStats()
+			stats.add(sample)
+
+	def snapshot(self) -> dict[str, dict]:
+		with self._lock:
+			return {view: stats.as_dict() for view, stats in sorted(self._views.items())}
+
+	def reset(self) -> None:
+		with self._lock:
+			self._views.clear()
+
+
+request_stats = RequestStats()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import fnmatch
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from monitoring.benchmarks import SCENARIOS, BenchmarkRunner, compare, dump, load
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with a fixed dataset and time the hot paths "
+        "(catalogue, circulation, dashboard, export, API) through the Django test client."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=2000, help="Books to seed.")
+        parser.add_argument("--members", type=int, default=500, help="Members to seed.")
+        parser.add_argument("--loans", type=int, default=5000, help="Loans to seed.")
+        parser.add_argument("--seed", type=int, default=2025, help="Random seed for the dataset.")
+        parser.add_argument("--iterations", type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=5, help="Untimed requests per scenario before timing.")
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            default=[],
+            help="Only run scenarios matching this glob (repeatable), e.g. 'api:*'.",
+        )
+        parser.add_argument("--list", action="store_true", help="List the scenarios and exit.")
+        parser.add_argument("--output", help="Write the results as JSON to this path.")
+        parser.add_argument("--compare", help="Baseline JSON from an earlier run; fail on regressions.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Allowed relative p95 increase over the baseline (default 0.25).",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Reuse the benchmark database between runs instead of recreating and reseeding it.",
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [
+            scenario
+            for scenario in SCENARIOS
+            if not options["scenario"] or any(fnmatch.fnmatch(scenario.name, pattern) for pattern in options["scenario"])
+        ]
+        if options["list"]:
+            for scenario in SCENARIOS:
+                self.stdout.write(scenario.name)
+            return
+        if not scenarios:
+            raise CommandError("No scenario matches the --scenario filter.")
+        if options["iterations"] < 1 or options["warmup"] < 0:
+            raise CommandError("--iterations must be positive and --warmup cannot be negative.")
+        baseline = load(options["compare"]) if options["compare"] else None
+
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        keepdb = options["keepdb"]
+        try:
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+            # seed_library tops up to its targets, so a kept database is left as it is.
+            self.stdout.write("Seeding the benchmark database...")
+            call_command(
+                "seed_library",
+                books=options["books"],
+                members=options["members"],
+                loans=options["loans"],
+                seed=options["seed"],
+                stdout=StringIO(),
+            )
+            call_command("refresh_rollups", full=True, stdout=StringIO())
+            # Sampling adds its own wrapper; the loan cap would reject the checkout scenario.
+            with override_settings(INSTRUMENTATION_SAMPLE_RATE=0.0, MAX_ACTIVE_LOANS_PER_MEMBER=10**6):
+                runner = BenchmarkRunner(options["iterations"], options["warmup"], log=self.stdout.write)
+                results = runner.run(scenarios)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+            teardown_test_environment()
+
+        if options["output"]:
+            dump(results, options["output"])
+            self.stdout.write(f"Results written to {options['output']}.")
+        errors = sum(summary["errors"] for summary in results["scenarios"].values())
+        if errors:
+            self.stderr.write(f"{errors} requests returned an unexpected status code.")
+        if baseline is None:
+            return
+        regressions = compare(baseline, results, options["threshold"])
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(f"Regression: {regression}")
+            raise CommandError(f"{len(regressions)} regressions against {options['compare']}.")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}."))
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import fnmatch
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from circulation.services import accrue_fines, sweep_overdue_loans
+from monitoring.advisor import analyse, replay
+from monitoring.benchmarks import SCENARIOS
+from reports.snapshot import build_dashboard_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the queries of the main views, viewsets and circulation services, EXPLAIN them "
+        "and propose indexes for full table scans and sorts. Nothing is written: the replay "
+        "runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            default=[],
+            help="Only replay benchmark scenarios matching this glob (repeatable).",
+        )
+        parser.add_argument("--calls", type=int, default=2, help="Requests replayed per scenario.")
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=1000,
+            help="Ignore scans of tables with fewer rows than this; scanning them is cheap.",
+        )
+        parser.add_argument("--plans", action="store_true", help="Print the plan of every flagged statement.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("sqlite", "postgresql", "mysql"):
+            raise CommandError(f"EXPLAIN is not supported for {connection.vendor}.")
+        scenarios = [
+            scenario
+            for scenario in SCENARIOS
+            if not options["scenario"] or any(fnmatch.fnmatch(scenario.name, pattern) for pattern in options["scenario"])
+        ]
+        extra = {
+            "circulation.services.sweep_overdue_loans": sweep_overdue_loans,
+            "circulation.services.accrue_fines": lambda: accrue_fines(sync_fines=True, dry_run=True),
+            "reports.snapshot.build_dashboard_snapshot": build_dashboard_snapshot,
+        }
+        try:
+            statements = replay(scenarios, options["calls"], extra)
+        except ValueError as exc:
+            raise CommandError(f"{exc} Run seed_library first.") from exc
+        report = analyse(statements, options["min_rows"])
+
+        flagged = [statement for statement in report.statements if statement.findings]
+        self.stdout.write(
+            f"Replayed {len(scenarios)} scenarios and {len(extra)} services: "
+            f"{len(report.statements)} distinct SELECTs, {len(flagged)} with scans or sorts."
+        )
+        for statement in flagged:
+            self.stdout.write("")
+            self.stdout.write(f"{', '.join(sorted(statement.sources))} ({statement.runs} runs)")
+            self.stdout.write(f"  {statement.sql[:300]}")
+            for finding in statement.findings:
+                self.stdout.write(f"  [{finding.kind}] {finding.table}: {finding.detail}")
+                if finding.note:
+                    self.stdout.write(f"    {finding.note}")
+                for proposal in finding.proposals:
+                    self.stdout.write(f"    -> {proposal.label}: {proposal.as_code()}")
+            if options["plans"]:
+                for line in statement.plan:
+                    self.stdout.write(f"    | {line}")
+
+        self.stdout.write("")
+        if not report.proposals:
+            self.stdout.write(self.style.SUCCESS("No missing indexes found."))
+            return
+        self.stdout.write(self.style.WARNING("Proposed indexes (add to the model's Meta.indexes):"))
+        ranked = sorted(report.proposals.items(), key=lambda item: -sum(s.runs for s in item[1]))
+        for proposal, statements in ranked:
+            sources = sorted({source for statement in statements for source in statement.sources})
+            self.stdout.write(f"  {proposal.label}: {proposal.as_code()}")
+            self.stdout.write(f"    {len(statements)} statements from {', '.join(sources)}")
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import atexit
+import bisect
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+	"""A named family of samples, one per combination of label values."""
+
+	kind = ""
+
+	def __init__(self, registry: "Registry", name: str, documentation: str, labelnames: Iterable[str] = ()):
+		self.registry = registry
+		self.name = name
+		self.documentation = documentation
+		self.labelnames = tuple(labelnames)
+
+	def _key(self, labels: dict) -> tuple[str, ...]:
+		if set(labels) != set(self.labelnames):
+			raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}.")
+		return tuple(str(labels[name]) for name in self.labelnames)
+
+	def describe(self) -> dict:
+		return {"kind": self.kind, "help": self.documentation, "labelnames": list(self.labelnames)}
+
+
+class Counter(Metric):
+	kind = "counter"
+
+	def inc(self, amount: float = 1, **labels) -> None:
+		if amount < 0:
+			raise ValueError("Counters can only go up.")
+		self.registry.update(self, self._key(labels), amount)
+
+	def inc_on_commit(self, amount: float = 1, **labels) -> None:
+		"""Count a business event once the surrounding transaction has committed."""
+
+		if amount:
+			transaction.on_commit(lambda: self.inc(amount, **labels))
+
+
+class Histogram(Metric):
+	kind = "histogram"
+
+	def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.buckets = tuple(sorted(buckets))
+
+	def observe(self, value: float, **labels) -> None:
+		self.registry.update(self, self._key(labels), value)
+
+	def describe(self) -> dict:
+		return {**super().describe(), "buckets": list(self.buckets)}
+
+
+class Registry:
+	"""Process-local metric values, shared with other processes through small files.
+
+	Each process keeps its values in memory and, at most every
+	``METRICS_FLUSH_INTERVAL`` seconds and at exit, writes them to its own file in
+	``METRICS_DIR``. ``collect()`` sums every file in the directory, so the numbers
+	cover all workers of a multi-process WSGI server plus management commands and job
+	workers. Files of exited processes are kept so counters never go backwards;
+	clear the directory when deploying.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._metrics: dict[str, Metric] = {}
+		self._values: dict[str, dict[tuple[str, ...], object]] = {}
+		self._pid: Optional[int] = None
+		self._path: Optional[Path] = None
+		self._last_flush = 0.0
+		self._dirty = False
+
+	def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+		return self._register(Counter(self, name, documentation, labelnames))
+
+	def histogram(
+		self,
+		name: str,
+		documentation: str,
+		labelnames: Iterable[str] = (),
+		buckets: Iterable[float] = DEFAULT_BUCKETS,
+	) -> Histogram:
+		return self._register(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+	def _register(self, metric: Metric) -> Metric:
+		if metric.name in self._metrics:
+			raise ValueError(f"Metric {metric.name} is already registered.")
+		self._metrics[metric.name] = metric
+		self._values[metric.name] = {}
+		return metric
+
+	def update(self, metric: Metric, key: tuple[str, ...], value: float) -> None:
+		with self._lock:
+			self._check_process()
+			values = self._values[metric.name]
+			if isinstance(metric, Histogram):
+				# Per-bucket (non-cumulative) counts with +Inf last, then sum and count.
+				state = values.get(key)
+				if state is None:
+					state = values[key] = [0] * (len(metric.buckets) + 1) + [0.0, 0]
+				state[bisect.bisect_left(metric.buckets, value)] += 1
+				state[-2] += value
+				state[-1] += 1
+			else:
+				values[key] = values.get(key, 0) + value
+			self._dirty = True
+			due = time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL
+		if due:
+			self.flush()
+
+	def _check_process(self) -> None:
+		# Values inherited through fork() belong to the parent, which reports them itself.
+		pid = os.getpid()
+		if pid != self._pid:
+			if self._pid is None:
+				atexit.register(self.flush)
+			else:
+				for values in self._values.values():
+					values.clear()
+			self._pid = pid
+			self._path = None
+			self._last_flush = time.monotonic()
+
+	def _directory(self) -> Optional[Path]:
+		directory = settings.METRICS_DIR
+		return Path(directory) if directory else None
+
+	def _state(self) -> dict:
+		return {
+			name: {
+				**metric.describe(),
+				"samples": [[list(key), value] for key, value in self._values[name].items()],
+			}
+			for name, metric in self._metrics.items()
+		}
+
+	def flush(self) -> None:
+		directory = self._directory()
+		with self._lock:
+			self._last_flush = time.monotonic()
+			if directory is None or not self._dirty:
+				return
+			if self._path is None:
+				# The random part keeps a recycled PID from overwriting a dead process.
+				self._path = directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+			payload = json.dumps(self._state(), separators=(",", ":"))
+			self._dirty = False
+			path = self._path
+		try:
+			directory.mkdir(parents=True, exist_ok=True)
+			temporary = path.with_suffix(".tmp")
+			temporary.write_text(payload)
+			os.replace(temporary, path)
+		except OSError:
+			logger.exception("Could not write metrics to %s", path)
+
+	def collect(self) -> dict:
+		"""Return every metric summed over all processes that have reported."""
+
+		self.flush()
+		directory = self._directory()
+		if directory is None:
+			with self._lock:
+				states = [json.loads(json.dumps(self._state()))]
+		else:
+			states = []
+			for path in sorted(directory.glob("*.json")) if directory.is_dir() else []:
+				try:
+					states.append(json.loads(path.read_text()))
+				except (OSError, ValueError):
+					continue
+		merged = {name: {**metric.describe(), "samples": {}} for name, metric in self._metrics.items()}
+		for state in states:
+			for name, family in state.items():
+				if name not in merged or family.get("kind") != merged[name]["kind"]:
+					continue
+				samples = merged[name]["samples"]
+				for key, value in family["samples"]:
+					key = tuple(key)
+					if isinstance(value, list):
+						current = samples.get(key)
+						samples[key] = value if current is None else [a + b for a, b in zip(current, value)]
+					else:
+						samples[key] = samples.get(key, 0) + value
+		return merged
+
+	def render(self) -> str:
+		"""Render ``collect()`` in the Prometheus text exposition format."""
+
+		lines = []
+		for name, family in self.collect().items():
+			lines.append(f"# HELP {name} {_escape_help(family['help'])}")
+			lines.append(f"# TYPE {name} {family['kind']}")
+			labelnames = family["labelnames"]
+			for key, value in sorted(family["samples"].items()):
+				labels = list(zip(labelnames, key))
+				if family["kind"] != "histogram":
+					lines.append(f"{name}{_labels(labels)} {_number(value)}")
+					continue
+				cumulative = 0
+				bounds = [*family["buckets"], math.inf]
+				for bound, count in zip(bounds, value[: len(bounds)]):
+					cumulative += count
+					lines.append(f"{name}_bucket{_labels(labels + [('le', _number(bound))])} {cumulative}")
+				lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+				lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+		return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+	return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _labels(pairs: list[tuple[str, str]]) -> str:
+	if not pairs:
+		return ""
+	return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _escape_label(value: str) -> str:
+	return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+	if value == math.inf:
+		return "+Inf"
+	if float(value).is_integer():
+		return str(int(value))
+	return repr(float(value))
+
+
+registry = Registry()
+
+# HTTP, recorded by monitoring.middleware.InstrumentationMiddleware.
+HTTP_REQUESTS = registry.counter(
+	"http_requests_total",
+	"Requests handled, by resolved URL name, method and status code.",
+	("view", "method", "status"),
+)
+HTTP_REQUEST_DURATION = registry.histogram(
+	"http_request_duration_seconds",
+	"Time to produce a response, by resolved URL name and method.",
+	("view", "method"),
+)
+
+# Circulation business events, counted once their transaction commits.
+CHECKOUTS = registry.counter("library_checkouts_total", "Loans issued.", ("channel",))
+RETURNS = registry.counter("library_returns_total", "Loans returned.", ("channel",))
+OVERDUE_SWEEPS = registry.counter("library_overdue_sweeps_total", "Runs of the overdue sweep.")
+LOANS_MARKED_OVERDUE = registry.counter("library_loans_marked_overdue_total", "Loans flipped to OVERDUE by sweeps.")
+NOTIFICATIONS_SENT = registry.counter(
+	"library_notifications_sent_total",
+	"Notifications delivered, by category and channel.",
+	("category", "channel"),
+)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .instrumentation import QueryRecorder, RequestSample, request_stats
+from .metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS
+from .profiling import Capture, rule_set
+
+logger = logging.getLogger("monitoring.requests")
+
+UNRESOLVED = "<unresolved>"
+
+
+def view_name(request) -> str:
+	match = getattr(request, "resolver_match", None)
+	return match.view_name if match and match.view_name else UNRESOLVED
+
+
+class InstrumentationMiddleware:
+	"""Time every request and, for a sample of them, count and time its SQL.
+
+	Latency is recorded for all requests, in the per-process aggregate and in the
+	Prometheus metrics, because it costs two clock reads and a dict update. Sampled
+	requests also run under a ``connection.execute_wrapper`` that tallies queries and
+	their signatures; those get a structured log line, and a warning when a query
+	signature repeats often enough to look like an N+1. Every response carries a
+	``Server-Timing`` header so browser dev tools show the breakdown.
+
+	Work done while a streaming response is consumed happens after this middleware
+	returns and is not included.
+	"""
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+
+	def __call__(self, request):
+		if not settings.INSTRUMENTATION_ENABLED:
+			return self.get_response(request)
+
+		started = time.perf_counter()
+		request._instrumentation_view_finished = None
+		recorder = QueryRecorder() if random.random() < settings.INSTRUMENTATION_SAMPLE_RATE else None
+		if recorder is None:
+			response = self.get_response(request)
+		else:
+			with ExitStack() as stack:
+				for connection in connections.all():
+					stack.enter_context(connection.execute_wrapper(recorder))
+				response = self.get_response(request)
+		finished = time.perf_counter()
+
+		view_finished = request._instrumentation_view_finished or finished
+		sample = RequestSample(
+			view=view_name(request),
+			method=request.method,
+			status=response.status_code,
+			total_ms=(finished - started) * 1000,
+			view_ms=(view_finished - started) * 1000,
+			render_ms=(finished - view_finished) * 1000,
+			sampled=recorder is not None,
+		)
+		if recorder is not None:
+			sample.queries = recorder.count
+			sample.db_ms = recorder.duration * 1000
+			sample.duplicate_queries = recorder.duplicates
+			sample.repeated_queries = recorder.repeated(settings.INSTRUMENTATION_N_PLUS_ONE_THRESHOLD)
+			self.log(sample)
+		request_stats.record(sample)
+		HTTP_REQUESTS.inc(view=sample.view, method=sample.method, status=sample.status)
+		HTTP_REQUEST_DURATION.observe(finished - started, view=sample.view, method=sample.method)
+
+		if settings.INSTRUMENTATION_SERVER_TIMING:
+			existing = response.headers.get("Server-Timing")
+			timing = sample.server_timing()
+			response.headers["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+		return response
+
+	def process_template_response(self, request, response):
+		# Template responses render after the view returns; mark the boundary so the
+		# view and render phases can be reported separately.
+		request._instrumentation_view_finished = time.perf_counter()
+		return response
+
+	@staticmethod
+	def log(sample: RequestSample) -> None:
+		slow = sample.total_ms >= settings.INSTRUMENTATION_SLOW_REQUEST_MS
+		level = logging.WARNING if slow or sample.repeated_queries else logging.INFO
+		if logger.isEnabledFor(level):
+			logger.log(level, json.dumps(sample.as_log(), separators=(",", ":")))
+
+
+class ProfilingMiddleware:
+	"""Profile the requests picked by the live ``ProfilingRule`` rows.
+
+	The decision is made in ``process_view``, once the URL name and the user are
+	known, so the profile covers the view, template rendering and the middleware
+	below this one. Captures are written to ``PROFILING_DIR`` and listed at
+	``/monitoring/profiles/``.
+	"""
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+
+	def __call__(self, request):
+		if not settings.PROFILING_ENABLED:
+			return self.get_response(request)
+
+		started = time.perf_counter()
+		request._profiling_capture = None
+		try:
+			response = self.get_response(request)
+		except BaseException:
+			capture = request._profiling_capture
+			if capture is not None:
+				capture.stop()
+			raise
+		capture = request._profiling_capture
+		if capture is not None:
+			capture.finish(request, response, time.perf_counter() - started, view_name(request))
+		return response
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		if not settings.PROFILING_ENABLED:
+			return None
+		user = getattr(request, "user", None)
+		user_id = user.pk if user is not None and user.is_authenticated else None
+		rule = rule_set.select(view_name(request), user_id)
+		if rule is not None:
+			request._profiling_capture = Capture.start(rule)
+		return None
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:49
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProfilingRule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("is_active", models.BooleanField(default=True)),
+                (
+                    "active_until",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Switch the rule off automatically after this time.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "url_names",
+                    models.CharField(
+                        blank=True,
+                        help_text="Space or comma separated URL names; wildcards allowed, e.g. catalog:* api:book-list.",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "sample_rate",
+                    models.FloatField(
+                        default=0.01,
+                        help_text="Share of matching requests to profile, from 0 to 1.",
+                        validators=[
+                            django.core.validators.MinValueValidator(0.0),
+                            django.core.validators.MaxValueValidator(1.0),
+                        ],
+                    ),
+                ),
+                (
+                    "min_duration_ms",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Keep only captures of requests at least this slow (0 keeps all).",
+                    ),
+                ),
+                (
+                    "profiler",
+                    models.CharField(
+                        choices=[
+                            ("sampler", "Statistical sampler"),
+                            ("cprofile", "cProfile"),
+                        ],
+                        default="sampler",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "trace_memory",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Also record allocations with tracemalloc (slows the whole process while active).",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "users",
+                    models.ManyToManyField(
+                        blank=True,
+                        help_text="Only profile requests from these users. Leave empty for everyone.",
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["name", "id"],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+from django.utils import timezone
+
+
+class ProfilingRuleQuerySet(models.QuerySet):
+	def live(self) -> "ProfilingRuleQuerySet":
+		now = timezone.now()
+		return self.filter(is_active=True).filter(models.Q(active_until__isnull=True) | models.Q(active_until__gt=now))
+
+
+class ProfilingRule(models.Model):
+	"""Which requests ``ProfilingMiddleware`` profiles, editable without a restart.
+
+	A request matches when its URL name matches one of ``url_names`` (all URLs when
+	blank) and its user is one of ``users`` (everyone when empty). A matching request
+	is profiled with probability ``sample_rate``; when ``min_duration_ms`` is set the
+	capture is only kept if the request took at least that long.
+	"""
+
+	class Profiler(models.TextChoices):
+		SAMPLER = "sampler", "Statistical sampler"
+		CPROFILE = "cprofile", "cProfile"
+
+	name = models.CharField(max_length=100)
+	is_active = models.BooleanField(default=True)
+	active_until = models.DateTimeField(
+		null=True,
+		blank=True,
+		help_text="Switch the rule off automatically after this time.",
+	)
+	url_names = models.CharField(
+		max_length=255,
+		blank=True,
+		help_text="Space or comma separated URL names; wildcards allowed, e.g. catalog:* api:book-list.",
+	)
+	users = models.ManyToManyField(
+		settings.AUTH_USER_MODEL,
+		blank=True,
+		related_name="+",
+		help_text="Only profile requests from these users. Leave empty for everyone.",
+	)
+	sample_rate = models.FloatField(
+		default=0.01,
+		validators=[MinValueValidator(0.0), MaxValueValidator(1.0)],
+		help_text="Share of matching requests to profile, from 0 to 1.",
+	)
+	min_duration_ms = models.PositiveIntegerField(
+		default=0,
+		help_text="Keep only captures of requests at least this slow (0 keeps all).",
+	)
+	profiler = models.CharField(max_length=20, choices=Profiler.choices, default=Profiler.SAMPLER)
+	trace_memory = models.BooleanField(
+		default=False,
+		help_text="Also record allocations with tracemalloc (slows the whole process while active).",
+	)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	objects = ProfilingRuleQuerySet.as_manager()
+
+	class Meta:
+		ordering = ["name", "id"]
+
+	def __str__(self) -> str:
+		return self.name
+
+	@property
+	def url_patterns(self) -> list[str]:
+		return self.url_names.replace(",", " ").split()
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import cProfile
+import fnmatch
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# File suffix of each artefact a capture can have, keyed by the name used in URLs.
+ARTEFACTS = {
+	"prof": ".prof",
+	"stats": ".stats.txt",
+	"folded": ".folded",
+	"memory": ".memory.txt",
+}
+CAPTURE_ID_RE = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{8}$")
+TRACEMALLOC_FRAMES = 10
+
+# cProfile and tracemalloc are process-wide hooks on current Pythons, so only one
+# capture that uses them runs at a time; the statistical sampler has no such limit.
+_exclusive = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ActiveRule:
+	"""Immutable copy of a ``ProfilingRule`` that request threads can share."""
+
+	id: int
+	name: str
+	url_patterns: tuple[str, ...]
+	user_ids: frozenset[int]
+	sample_rate: float
+	min_duration_ms: int
+	profiler: str
+	trace_memory: bool
+
+	def matches(self, view_name: str, user_id: Optional[int]) -> bool:
+		if self.user_ids and user_id not in self.user_ids:
+			return False
+		return not self.url_patterns or any(fnmatch.fnmatchcase(view_name, pattern) for pattern in self.url_patterns)
+
+
+class RuleSet:
+	"""The live profiling rules, reloaded from the database every few seconds.
+
+	Rules are edited in the admin; each process notices within
+	``PROFILING_RULES_TTL`` seconds (immediately in the process that saved them), so
+	turning profiling on or off needs no restart. With no live rules the per-request
+	cost is one clock read.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._rules: tuple[ActiveRule, ...] = ()
+		self._expires = 0.0
+
+	def invalidate(self) -> None:
+		with self._lock:
+			self._expires = 0.0
+
+	def rules(self) -> tuple[ActiveRule, ...]:
+		now = time.monotonic()
+		if now < self._expires:
+			return self._rules
+		from .models import ProfilingRule
+
+		live = ProfilingRule.objects.live().prefetch_related("users")
+		rules = tuple(
+			ActiveRule(
+				id=rule.pk,
+				name=rule.name,
+				url_patterns=tuple(rule.url_patterns),
+				user_ids=frozenset(user.pk for user in rule.users.all()),
+				sample_rate=rule.sample_rate,
+				min_duration_ms=rule.min_duration_ms,
+				profiler=rule.profiler,
+				trace_memory=rule.trace_memory,
+			)
+			for rule in live
+		)
+		with self._lock:
+			self._rules = rules
+			self._expires = now + settings.PROFILING_RULES_TTL
+		return rules
+
+	def select(self, view_name: str, user_id: Optional[int]) -> Optional[ActiveRule]:
+		for rule in self.rules():
+			if rule.matches(view_name, user_id) and random.random() < rule.sample_rate:
+				return rule
+		return None
+
+
+rule_set = RuleSet()
+
+
+class StackSampler:
+	"""Record the call stack of one thread every ``interval`` seconds.
+
+	The result is a "folded" profile (one ``frame;frame;frame count`` line per
+	distinct stack) that flamegraph.pl, speedscope and inferno read directly. Sampling
+	happens in a helper thread, so the profiled code runs at close to full speed.
+	"""
+
+	def __init__(self, thread_id: int, interval: float):
+		self.thread_id = thread_id
+		self.interval = interval
+		self.stacks: Counter[str] = Counter()
+		self.samples = 0
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+	def start(self) -> None:
+		self._thread.start()
+
+	def stop(self) -> None:
+		self._stop.set()
+		self._thread.join()
+
+	def _run(self) -> None:
+		while not self._stop.wait(self.interval):
+			frame = sys._current_frames().get(self.thread_id)
+			if frame is None:
+				return
+			names = []
+			while frame is not None:
+				code = frame.f_code
+				names.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+				frame = frame.f_back
+			del frame
+			self.stacks[";".join(reversed(names))] += 1
+			self.samples += 1
+
+	def folded(self) -> str:
+		return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+	base = str(settings.BASE_DIR)
+	if filename.startswith(base):
+		return os.path.relpath(filename, base)
+	for entry in sorted(sys.path, key=len, reverse=True):
+		if entry and filename.startswith(entry + os.sep):
+			return filename[len(entry) + 1 :]
+	return filename
+
+
+class Capture:
+	"""Profilers running for one request, and the files they leave behind."""
+
+	def __init__(self, rule: ActiveRule):
+		self.rule = rule
+		self.profile: Optional[cProfile.Profile] = None
+		self.sampler: Optional[StackSampler] = None
+		self.memory_before: Optional[tracemalloc.Snapshot] = None
+		self.memory_after: Optional[tracemalloc.Snapshot] = None
+		self.memory_peak = 0
+		self.started_tracemalloc = False
+		self.exclusive = False
+
+	@classmethod
+	def start(cls, rule: ActiveRule) -> Optional["Capture"]:
+		capture = cls(rule)
+		if rule.profiler == "cprofile" or rule.trace_memory:
+			if not _exclusive.acquire(blocking=False):
+				return None
+			capture.exclusive = True
+		try:
+			if rule.trace_memory:
+				if not tracemalloc.is_tracing():
+					tracemalloc.start(TRACEMALLOC_FRAMES)
+					capture.started_tracemalloc = True
+				tracemalloc.reset_peak()
+				capture.memory_before = tracemalloc.take_snapshot()
+			if rule.profiler == "cprofile":
+				capture.profile = cProfile.Profile()
+				capture.profile.enable()
+			else:
+				capture.sampler = StackSampler(threading.get_ident(), settings.PROFILING_SAMPLER_INTERVAL)
+				capture.sampler.start()
+		except Exception:
+			logger.exception("Could not start profiling for rule %r", rule.name)
+			capture.stop()
+			return None
+		return capture
+
+	def stop(self) -> None:
+		if self.profile is not None:
+			self.profile.disable()
+		if self.sampler is not None:
+			self.sampler.stop()
+		if self.memory_before is not None and tracemalloc.is_tracing():
+			self.memory_after = tracemalloc.take_snapshot()
+			self.memory_peak = tracemalloc.get_traced_memory()[1]
+		if self.started_tracemalloc:
+			tracemalloc.stop()
+		if self.exclusive:
+			self.exclusive = False
+			_exclusive.release()
+
+	def finish(self, request, response, duration: float, view_name: str) -> Optional[str]:
+		"""Stop profiling and, if the request was slow enough, save the capture."""
+
+		self.stop()
+		duration_ms = duration * 1000
+		if duration_ms < self.rule.min_duration_ms:
+			return None
+		try:
+			return self.save(request, response, duration_ms, view_name)
+		except OSError:
+			logger.exception("Could not write the profile of %s", request.path)
+			return None
+
+	def save(self, request, response, duration_ms: float, view_name: str) -> str:
+		directory = Path(settings.PROFILING_DIR)
+		directory.mkdir(parents=True, exist_ok=True)
+		capture_id = f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+		files = {}
+
+		if self.profile is not None:
+			files["prof"] = capture_id + ARTEFACTS["prof"]
+			self.profile.dump_stats(directory / files["prof"])
+			summary = io.StringIO()
+			pstats.Stats(self.profile, stream=summary).sort_stats("cumulative").print_stats(40)
+			files["stats"] = capture_id + ARTEFACTS["stats"]
+			(directory / files["stats"]).write_text(summary.getvalue())
+		if self.sampler is not None:
+			files["folded"] = capture_id + ARTEFACTS["folded"]
+			(directory / files["folded"]).write_text(self.sampler.folded())
+		if self.memory_after is not None:
+			files["memory"] = capture_id + ARTEFACTS["memory"]
+			lines = [f"Peak traced memory: {self.memory_peak / 1024:.1f} KiB", "Top allocations during the request:"]
+			lines += [str(stat) for stat in self.memory_after.compare_to(self.memory_before, "lineno")[:50]]
+			(directory / files["memory"]).write_text("\n".join(lines) + "\n")
+
+		user = getattr(request, "user", None)
+		metadata = {
+			"id": capture_id,
+			"created_at": timezone.now().isoformat(),
+			"rule": self.rule.name,
+			"profiler": self.rule.profiler,
+			"view": view_name,
+			"method": request.method,
+			"path": request.get_full_path()[:500],
+			"user": user.get_username() if user is not None and user.is_authenticated else "",
+			"status": response.status_code,
+			"duration_ms": round(duration_ms, 2),
+			"samples": self.sampler.samples if self.sampler is not None else None,
+			"memory_peak_kib": round(self.memory_peak / 1024, 1) if self.memory_after is not None else None,
+			"pid": os.getpid(),
+			"files": files,
+		}
+		# The metadata file is written last: a capture is listed only once it is complete.
+		(directory / f"{capture_id}.json").write_text(json.dumps(metadata, indent=2))
+		rotate(directory, settings.PROFILING_MAX_CAPTURES)
+		return capture_id
+
+
+def rotate(directory: Path, keep: int) -> None:
+	"""Delete all but the newest ``keep`` captures (ids sort chronologically)."""
+
+	for metadata in sorted(directory.glob("*.json"), reverse=True)[keep:]:
+		for path in directory.glob(f"{metadata.stem}.*"):
+			path.unlink(missing_ok=True)
+
+
+def list_captures() -> list[dict]:
+	directory = Path(settings.PROFILING_DIR)
+	captures = []
+	for path in sorted(directory.glob("*.json"), reverse=True) if directory.is_dir() else []:
+		try:
+			captures.append(json.loads(path.read_text()))
+		except (OSError, ValueError):
+			continue
+	return captures
+
+
+def artefact_path(capture_id: str, kind: str) -> Optional[Path]:
+	"""Path of one file of a capture, or ``None`` for unknown or malformed names."""
+
+	if not CAPTURE_ID_RE.match(capture_id) or kind not in ARTEFACTS:
+		return None
+	path = Path(settings.PROFILING_DIR) / f"{capture_id}{ARTEFACTS[kind]}"
+	return path if path.is_file() else None
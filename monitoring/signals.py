@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .instrumentation import log_slow_queries
+from .models import ProfilingRule
+from .profiling import rule_set
+
+
+@receiver(connection_created)
+def install_slow_query_log(connection, **_: Any) -> None:
+	# The wrapper list outlives reconnects, which send this signal again.
+	if log_slow_queries not in connection.execute_wrappers:
+		connection.execute_wrappers.append(log_slow_queries)
+
+
+@receiver(post_save, sender=ProfilingRule)
+@receiver(post_delete, sender=ProfilingRule)
+@receiver(m2m_changed, sender=ProfilingRule.users.through)
+def reload_profiling_rules(**_: Any) -> None:
+	"""Apply rule edits in this process at once; other processes follow within the TTL."""
+
+	rule_set.invalidate()
@@ -0,0 +1,297 @@
+import io
+import json
+import pstats
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+
+from .advisor import Finding, propose
+from .benchmarks import SCENARIOS, BenchmarkRunner, compare, percentile
+from .instrumentation import log_slow_queries, query_signature, request_stats
+from .metrics import Registry
+from .middleware import InstrumentationMiddleware
+from .models import ProfilingRule
+from .profiling import rotate
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_N_PLUS_ONE_THRESHOLD=3)
+class InstrumentationMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f"user{index}", password="pw") for index in range(4)]
+
+    def setUp(self):
+        request_stats.reset()
+
+    def run_view(self, view):
+        request = RequestFactory().get("/")
+        with self.assertLogs("monitoring.requests", level="INFO") as logs:
+            response = InstrumentationMiddleware(view)(request)
+        return response, logs
+
+    def test_signature_collapses_in_lists(self):
+        self.assertEqual(
+            query_signature('SELECT  "a" FROM "t"\n WHERE "id" IN (%s, %s, %s)'),
+            'SELECT "a" FROM "t" WHERE "id" IN (...)',
+        )
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0)
+    def test_sampled_request_counts_queries_and_flags_repeats(self):
+        def view(request):
+            for user in self.users:
+                User.objects.filter(pk=user.pk).exists()
+            User.objects.filter(pk=self.users[0].pk).exists()
+            return HttpResponse("ok")
+
+        response, logs = self.run_view(view)
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="5 queries", view;dur=[\d.]+, total;dur=')
+        self.assertEqual(logs.records[0].levelname, "WARNING")
+        self.assertIn('"duplicate_queries":1', logs.output[0])
+
+        stats = request_stats.snapshot()["<unresolved>"]
+        self.assertEqual((stats["requests"], stats["sampled"], stats["queries"]), (1, 1, 5))
+        self.assertEqual(stats["n_plus_one_requests"], 1)
+        self.assertEqual(stats["worst_repeated_count"], 5)
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0.0)
+    def test_unsampled_request_only_records_latency(self):
+        request = RequestFactory().get("/")
+        response = InstrumentationMiddleware(lambda request: HttpResponse("ok"))(request)
+        self.assertNotIn("db;", response["Server-Timing"])
+        stats = request_stats.snapshot()["<unresolved>"]
+        self.assertEqual((stats["requests"], stats["sampled"], stats["queries"]), (1, 0, 0))
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(METRICS_DIR=directory.name, METRICS_FLUSH_INTERVAL=3600)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    @staticmethod
+    def make_registry():
+        registry = Registry()
+        requests = registry.counter("requests_total", "Requests.", ("view",))
+        latency = registry.histogram("latency_seconds", "Latency.", ("view",), buckets=(0.1, 1.0))
+        return registry, requests, latency
+
+    def test_values_from_every_process_are_summed(self):
+        # Two registries stand in for two worker processes writing to the same directory.
+        first, first_requests, first_latency = self.make_registry()
+        second, second_requests, second_latency = self.make_registry()
+        first_requests.inc(view="a")
+        first_latency.observe(0.05, view="a")
+        second_requests.inc(2, view="a")
+        second_requests.inc(view='b"c')
+        second_latency.observe(0.5, view="a")
+        second_latency.observe(3, view="a")
+        second.flush()
+
+        self.assertEqual(
+            first.render().splitlines(),
+            [
+                "# HELP requests_total Requests.",
+                "# TYPE requests_total counter",
+                'requests_total{view="a"} 3',
+                'requests_total{view="b\\"c"} 1',
+                "# HELP latency_seconds Latency.",
+                "# TYPE latency_seconds histogram",
+                'latency_seconds_bucket{view="a",le="0.1"} 1',
+                'latency_seconds_bucket{view="a",le="1"} 2',
+                'latency_seconds_bucket{view="a",le="+Inf"} 3',
+                'latency_seconds_sum{view="a"} 3.55',
+                'latency_seconds_count{view="a"} 3',
+            ],
+        )
+
+    def test_labels_must_match(self):
+        registry, requests, _ = self.make_registry()
+        with self.assertRaises(ValueError):
+            requests.inc(status="200")
+
+
+@override_settings(METRICS_TOKEN="s3cret")
+class MetricsViewTests(TestCase):
+    def test_token_or_admin_session_is_required(self):
+        url = reverse("monitoring:metrics")
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 302)
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("# TYPE http_request_duration_seconds histogram", response.content.decode())
+
+        member = User.objects.create_user("member", password="pw", role=User.Role.MEMBER)
+        self.client.force_login(member)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        admin = User.objects.create_user("admin", password="pw", role=User.Role.ADMIN)
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", password="pw", role=User.Role.ADMIN)
+        cls.member = User.objects.create_user("member", password="pw", role=User.Role.MEMBER)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(PROFILING_DIR=directory.name, PROFILING_RULES_TTL=0, PROFILING_SAMPLER_INTERVAL=0.001)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def profiled_request(self, **rule):
+        ProfilingRule.objects.create(name="test", url_names="api:book-*", sample_rate=1.0, **rule)
+        self.client.force_login(self.member)
+        response = self.client.get(reverse("api:book-list"))
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(path.read_text()) for path in sorted(self.directory.glob("*.json"))]
+
+    def test_sampler_writes_folded_stacks(self):
+        [capture] = self.profiled_request()
+        self.assertEqual((capture["view"], capture["user"], capture["status"]), ("api:book-list", "member", 200))
+        self.assertEqual(list(capture["files"]), ["folded"])
+        folded = (self.directory / capture["files"]["folded"]).read_text()
+        if folded:
+            stack, count = folded.splitlines()[0].rsplit(" ", 1)
+            self.assertIn(";", stack)
+            self.assertGreater(int(count), 0)
+
+    def test_cprofile_and_tracemalloc(self):
+        [capture] = self.profiled_request(profiler=ProfilingRule.Profiler.CPROFILE, trace_memory=True)
+        self.assertEqual(sorted(capture["files"]), ["memory", "prof", "stats"])
+        stats = pstats.Stats(str(self.directory / capture["files"]["prof"]))
+        self.assertTrue(any(name == "list" for _, _, name in stats.stats))
+        self.assertIn("Peak traced memory", (self.directory / capture["files"]["memory"]).read_text())
+        self.assertGreater(capture["memory_peak_kib"], 0)
+
+    def test_fast_requests_and_other_urls_and_users_are_skipped(self):
+        self.assertEqual(self.profiled_request(min_duration_ms=60_000), [])
+        ProfilingRule.objects.update(min_duration_ms=0, url_names="catalog:*")
+        self.client.get(reverse("api:book-list"))
+        ProfilingRule.objects.update(url_names="")
+        ProfilingRule.objects.get().users.set([self.admin])
+        self.client.get(reverse("api:book-list"))
+        self.assertEqual(list(self.directory.glob("*.json")), [])
+        ProfilingRule.objects.update(is_active=False)
+        ProfilingRule.objects.get().users.clear()
+        self.client.get(reverse("api:book-list"))
+        self.assertEqual(list(self.directory.glob("*.json")), [])
+
+    def test_rotation_keeps_the_newest_captures(self):
+        for capture_id in ("20250101-000000-00000001", "20250102-000000-00000002", "20250103-000000-00000003"):
+            (self.directory / f"{capture_id}.json").write_text("{}")
+            (self.directory / f"{capture_id}.folded").write_text("")
+        rotate(self.directory, keep=2)
+        self.assertEqual(
+            sorted(path.name for path in self.directory.iterdir()),
+            [
+                "20250102-000000-00000002.folded",
+                "20250102-000000-00000002.json",
+                "20250103-000000-00000003.folded",
+                "20250103-000000-00000003.json",
+            ],
+        )
+
+    def test_download_is_admin_only(self):
+        [capture] = self.profiled_request()
+        url = reverse("monitoring:profile-download", args=[capture["id"], "folded"])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("attachment", response.headers["Content-Disposition"])
+        self.assertEqual(self.client.get(reverse("monitoring:profile-download", args=[capture["id"], "prof"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("monitoring:profile-download", args=["..", "folded"])).status_code, 404)
+
+
+class BenchmarkTests(TestCase):
+    def test_percentile_uses_nearest_rank(self):
+        ordered = [float(value) for value in range(1, 101)]
+        self.assertEqual(percentile(ordered, 50), 50.0)
+        self.assertEqual(percentile(ordered, 95), 95.0)
+        self.assertEqual(percentile([7.0], 99), 7.0)
+        self.assertIsNone(percentile([], 50))
+
+    def test_compare_flags_latency_queries_and_errors(self):
+        baseline = {"scenarios": {"a": {"p95_ms": 10.0, "max_queries": 4, "errors": 0}}}
+        current = {"scenarios": {"a": {"p95_ms": 12.0, "max_queries": 4, "errors": 0}, "b": {"p95_ms": 1.0}}}
+        self.assertEqual(compare(baseline, current, threshold=0.25), [])
+        current["scenarios"]["a"].update(p95_ms=13.0, max_queries=5, errors=1)
+        self.assertEqual(
+            [regression.metric for regression in compare(baseline, current, threshold=0.25)],
+            ["p95_ms", "max_queries", "errors"],
+        )
+
+    def test_runner_times_scenarios(self):
+        User.objects.create_user("librarian", password="pw", role=User.Role.LIBRARIAN)
+        User.objects.create_user("member", password="pw", role=User.Role.MEMBER)
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name == "api:book-list"]
+        results = BenchmarkRunner(iterations=3, warmup=1, log=lambda line: None).run(scenarios)
+        summary = results["scenarios"]["api:book-list"]
+        self.assertEqual(summary["requests"], 3)
+        self.assertEqual(summary["errors"], 0)
+        self.assertEqual(summary["status_codes"], {"200": 3})
+        self.assertGreater(summary["queries_per_request"], 0)
+        self.assertLessEqual(summary["p50_ms"], summary["p95_ms"])
+        self.assertEqual(results["meta"]["dataset"]["members"], 1)
+
+
+class SlowQueryLogTests(TestCase):
+    def test_slow_statements_are_logged_with_their_source(self):
+        self.assertIn(log_slow_queries, connection.execute_wrappers)
+        with override_settings(SLOW_QUERY_MS=1e-9), self.assertLogs("monitoring.slow_queries") as logs:
+            User.objects.filter(username="nobody").exists()
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertIn('"accounts_user"', entry["sql"])
+        self.assertTrue(entry["source"].startswith("monitoring/tests.py:"))
+
+    def test_threshold_zero_disables_the_log(self):
+        with override_settings(SLOW_QUERY_MS=0), self.assertNoLogs("monitoring.slow_queries"):
+            User.objects.exists()
+
+
+class IndexAdvisorTests(TestCase):
+    def test_proposals_follow_each_subquery(self):
+        sql = (
+            'SELECT (SELECT COUNT(*) FROM (SELECT "circulation_loan"."id" FROM "circulation_loan" '
+            'WHERE "circulation_loan"."status" = %s) AS a) AS overdue, '
+            '(SELECT COUNT(*) FROM (SELECT "circulation_fine"."id" FROM "circulation_fine" '
+            'WHERE ("circulation_fine"."member_id" = %s AND NOT "circulation_fine"."is_paid")) AS b) AS unpaid'
+        )
+        [loan] = propose(Finding("full scan", "circulation_loan", ""), sql)
+        self.assertEqual((loan.label, loan.fields, loan.condition), ("circulation.Loan", ("status",), ()))
+        [fine] = propose(Finding("full scan", "circulation_fine", ""), sql)
+        self.assertEqual(fine.fields, ("member", "is_paid"))
+
+    def test_partial_index_for_open_rows_and_paginated_sorts(self):
+        sql = (
+            'SELECT "circulation_loan"."id" FROM "circulation_loan" WHERE ("circulation_loan"."borrower_id" = %s '
+            'AND "circulation_loan"."returned_at" IS NULL AND NOT ("circulation_loan"."status" = %s)) '
+            'ORDER BY "circulation_loan"."due_at" ASC LIMIT 20'
+        )
+        [proposal] = propose(Finding("sort", "circulation_loan", ""), sql)
+        self.assertEqual(proposal.fields, ("borrower", "due_at"))
+        self.assertEqual(proposal.condition, (("returned_at__isnull", True),))
+        self.assertIn('condition=Q(returned_at__isnull=True)', proposal.as_code())
+        self.assertEqual(propose(Finding("sort", "circulation_loan", ""), sql.replace(" LIMIT 20", "")), [])
+
+    def test_command_replays_without_writing(self):
+        User.objects.create_user("librarian", password="pw", role=User.Role.LIBRARIAN)
+        User.objects.create_user("member", password="pw", role=User.Role.MEMBER)
+        users = User.objects.count()
+        out = io.StringIO()
+        call_command("index_advisor", "--scenario", "api:book-*", "--min-rows", "0", stdout=out)
+        self.assertIn("distinct SELECTs", out.getvalue())
+        self.assertEqual(User.objects.count(), users)
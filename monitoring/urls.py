@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = "monitoring"
+
+urlpatterns = [
+    path("requests/", views.RequestStatsView.as_view(), name="request-stats"),
+    path("metrics/", views.MetricsView.as_view(), name="metrics"),
+    path("profiles/", views.ProfileListView.as_view(), name="profiles"),
+    path("profiles/<str:capture_id>/<slug:kind>/", views.ProfileDownloadView.as_view(), name="profile-download"),
+]
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import hmac
+import os
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse
+from django.views.generic import TemplateView, View
+
+from accounts.models import User
+from accounts.permissions import RoleRequiredMixin
+
+from .instrumentation import request_stats
+from .metrics import CONTENT_TYPE, registry
+from .models import ProfilingRule
+from .profiling import artefact_path, list_captures
+
+
+class RequestStatsView(RoleRequiredMixin, View):
+	"""Per-view request aggregate of the worker process that serves this request."""
+
+	required_roles = (User.Role.ADMIN,)
+
+	def get(self, request: HttpRequest) -> HttpResponse:
+		return JsonResponse({"pid": os.getpid(), "views": request_stats.snapshot()})
+
+
+class MetricsView(RoleRequiredMixin, View):
+	"""Prometheus text exposition of the metrics summed over every process.
+
+	Scrapers authenticate with ``Authorization: Bearer <METRICS_TOKEN>``; without a
+	matching token the usual administrator login applies.
+	"""
+
+	required_roles = (User.Role.ADMIN,)
+
+	def dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+		if self.has_valid_token(request):
+			return View.dispatch(self, request, *args, **kwargs)
+		return super().dispatch(request, *args, **kwargs)
+
+	@staticmethod
+	def has_valid_token(request: HttpRequest) -> bool:
+		token = settings.METRICS_TOKEN
+		scheme, _, supplied = request.headers.get("Authorization", "").partition(" ")
+		return bool(token) and scheme.lower() == "bearer" and hmac.compare_digest(supplied.strip(), token)
+
+	def get(self, request: HttpRequest) -> HttpResponse:
+		return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
+
+
+class ProfileListView(RoleRequiredMixin, TemplateView):
+	"""Profiles captured by ``ProfilingMiddleware`` on this host, newest first."""
+
+	template_name = "monitoring/profile_list.html"
+	required_roles = (User.Role.ADMIN,)
+
+	def get_context_data(self, **kwargs):
+		context = super().get_context_data(**kwargs)
+		context["captures"] = list_captures()
+		context["rules"] = ProfilingRule.objects.prefetch_related("users")
+		context["profiling_enabled"] = settings.PROFILING_ENABLED
+		return context
+
+
+class ProfileDownloadView(RoleRequiredMixin, View):
+	required_roles = (User.Role.ADMIN,)
+
+	def get(self, request: HttpRequest, capture_id: str, kind: str) -> HttpResponse:
+		path = artefact_path(capture_id, kind)
+		if path is None:
+			raise Http404("No such profile.")
+		return FileResponse(path.open("rb"), as_attachment=True, filename=path.name)
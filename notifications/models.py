@@ -5,6 +5,8 @@ from django.core.mail import send_mail
 from django.db import models
 from django.utils import timezone
 
+from monitoring import metrics
+
 
 class Notification(models.Model):
 	class Category(models.TextChoices):
@@ -27,6 +29,9 @@ class Notification(models.Model):
 
 	class Meta:
 		ordering = ["-created_at"]
+		indexes = [
+			models.Index(fields=["recipient", "-created_at"], name="notifications_inbox_idx"),
+		]
 
 	def __str__(self) -> str:
 		return f"Notification to {self.recipient} - {self.subject}"
@@ -45,6 +50,7 @@ class Notification(models.Model):
 		)
 		self.sent_at = timezone.now()
 		self.save(update_fields=["sent_at"])
+		metrics.NOTIFICATIONS_SENT.inc(category=self.category, channel="email")
 
 
 class NotificationPreference(models.Model):
@@ -1,3 +1,21 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import CollectionSummary, DailyCirculation, RollupWatermark
+
+
+@admin.register(DailyCirculation)
+class DailyCirculationAdmin(admin.ModelAdmin):
+	list_display = ("day", "category", "language", "issues", "returns", "overdue", "fines_issued", "fines_amount")
+	list_filter = ("day", "category", "language")
+	date_hierarchy = "day"
+
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+	list_display = ("name", "value")
+
+
+@admin.register(CollectionSummary)
+class CollectionSummaryAdmin(admin.ModelAdmin):
+	list_display = ("computed_at", "window_days")
+	readonly_fields = ("computed_at", "window_days", "data")
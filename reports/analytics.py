@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import datetime
+import time
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from catalog.models import Book, BookCopy
+from circulation.models import Loan, Reservation
+
+from .exports import ITERATOR_CHUNK_SIZE, ChunkSink, check_available, pa, pq
+from .models import CollectionSummary
+
+try:
+	import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+	np = None
+
+
+CACHE_KEY = "reports:collection-analytics"
+DEFAULT_WINDOW_DAYS = 365
+# A title whose copies were out for at least this share of the window is saturated.
+BUSY_UTILIZATION = 0.8
+# Waiting members one copy can absorb while keeping the queue to about two loan periods.
+HOLDS_PER_COPY_TARGET = 2
+SECONDS_PER_DAY = 86_400
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+REPORTS = ("utilization", "buy-more", "weed")
+REPORT_FORMATS = ("csv", "parquet")
+REPORT_COLUMNS = (
+	"book_id",
+	"isbn",
+	"title",
+	"copies",
+	"loans",
+	"turnover",
+	"utilization",
+	"idle_copies",
+	"holds",
+	"holds_ratio",
+	"suggested_copies",
+	"last_issued",
+)
+
+
+class AnalyticsUnavailable(Exception):
+	"""Raised when collection analytics are requested without NumPy installed."""
+
+
+def analytics_available() -> bool:
+	return np is not None
+
+
+def check_analytics_available() -> None:
+	if np is None:
+		raise AnalyticsUnavailable("Collection analytics require the numpy package.")
+
+
+def _days(value: Optional[datetime.datetime]) -> float:
+	return value.timestamp() / SECONDS_PER_DAY if value is not None else np.nan
+
+
+@dataclass
+class CollectionMetrics:
+	"""Per-title utilisation figures; every array is aligned with ``book_id``."""
+
+	now: datetime.datetime
+	window_days: int
+	book_id: Any
+	isbn: list[str]
+	title: list[str]
+	copies: Any
+	loans: Any
+	turnover: Any
+	utilization: Any
+	idle_copies: Any
+	holds: Any
+	holds_ratio: Any
+	suggested_copies: Any
+	newest_copy: Any
+	last_issued: Any
+	elapsed: float = 0.0
+
+	def __len__(self) -> int:
+		return len(self.book_id)
+
+	@property
+	def window_start(self) -> datetime.datetime:
+		return self.now - datetime.timedelta(days=self.window_days)
+
+	def buy_more(self, limit: Optional[int] = None):
+		"""Indices of titles that need more copies, most pressing first.
+
+		A title qualifies when its hold queue is longer than its copies can clear, or
+		when its copies were out for most of the window. Ranked by holds per copy, then
+		by utilisation.
+		"""
+
+		candidates = np.flatnonzero(self.suggested_copies > 0)
+		order = np.lexsort((-self.utilization[candidates], -self.holds_ratio[candidates]))
+		return candidates[order][:limit]
+
+	def weed(self, limit: Optional[int] = None):
+		"""Indices of titles with no copy on loan at any point in the window, stalest first.
+
+		Titles with a copy acquired inside the window are left out so new stock gets
+		a full window to circulate. Never-borrowed titles come first, then those with
+		the oldest last loan; larger holdings break ties.
+		"""
+
+		window_start = self.window_start.timestamp() / SECONDS_PER_DAY
+		candidates = np.flatnonzero(
+			(self.copies > 0) & (self.idle_copies == self.copies) & (self.newest_copy <= window_start)
+		)
+		last_issued = np.nan_to_num(self.last_issued[candidates], nan=-np.inf)
+		order = np.lexsort((-self.copies[candidates], last_issued))
+		return candidates[order][:limit]
+
+	def rows(self, indices=None) -> Iterator[dict[str, Any]]:
+		if indices is None:
+			indices = np.arange(len(self))
+		for index in indices.tolist():
+			last_issued = self.last_issued[index]
+			yield {
+				"book_id": int(self.book_id[index]),
+				"isbn": self.isbn[index],
+				"title": self.title[index],
+				"copies": int(self.copies[index]),
+				"loans": int(self.loans[index]),
+				"turnover": round(float(self.turnover[index]), 3),
+				"utilization": round(float(self.utilization[index]), 3),
+				"idle_copies": int(self.idle_copies[index]),
+				"holds": int(self.holds[index]),
+				"holds_ratio": round(float(self.holds_ratio[index]), 3),
+				"suggested_copies": int(self.suggested_copies[index]),
+				"last_issued": None
+				if np.isnan(last_issued)
+				else datetime.datetime.fromtimestamp(last_issued * SECONDS_PER_DAY, tz=datetime.timezone.utc),
+			}
+
+
+def compute_collection_metrics(
+	window_days: int = DEFAULT_WINDOW_DAYS,
+	now: Optional[datetime.datetime] = None,
+) -> CollectionMetrics:
+	"""Measure turnover, utilisation, idle copies and holds pressure for every title.
+
+	Five queries pull books, copies, the loan intervals overlapping the window, open
+	hold counts and each title's last loan into arrays. Everything else is vectorised
+	(``searchsorted`` to join, ``bincount`` to group), so the cost is dominated by
+	reading the rows rather than by Python loops over them. Lost copies are ignored.
+	"""
+
+	check_analytics_available()
+	started = time.monotonic()
+	now = now or timezone.now()
+	now_day = _days(now)
+	window_start_day = now_day - window_days
+
+	books = list(Book.objects.order_by("id").values_list("id", "isbn", "title"))
+	book_id = np.fromiter((row[0] for row in books), dtype=np.int64, count=len(books))
+
+	copies = BookCopy.objects.exclude(status=BookCopy.Status.LOST).order_by("id")
+	copy_rows = list(copies.values_list("id", "book_id", "acquired_at"))
+	copy_id = np.fromiter((row[0] for row in copy_rows), dtype=np.int64, count=len(copy_rows))
+	copy_book = np.searchsorted(
+		book_id, np.fromiter((row[1] for row in copy_rows), dtype=np.int64, count=len(copy_rows))
+	)
+	acquired = np.fromiter(
+		(row[2].toordinal() - _EPOCH_ORDINAL for row in copy_rows), dtype=np.float64, count=len(copy_rows)
+	)
+
+	window = (
+		Loan.objects.filter(issued_at__lt=now)
+		.filter(Q(returned_at__isnull=True) | Q(returned_at__gte=now - datetime.timedelta(days=window_days)))
+		.order_by()
+		.values_list("copy_id", "issued_at", "returned_at")
+	)
+	loan_copy, issued, returned = [], [], []
+	for copy, issued_at, returned_at in window.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+		loan_copy.append(copy)
+		issued.append(_days(issued_at))
+		returned.append(_days(returned_at))
+	loan_copy = np.asarray(loan_copy, dtype=np.int64)
+	loan_index = np.minimum(np.searchsorted(copy_id, loan_copy), max(len(copy_id) - 1, 0))
+	known = copy_id[loan_index] == loan_copy if len(copy_id) else np.zeros(len(loan_copy), dtype=bool)
+	loan_index = loan_index[known]  # drops loans of lost copies
+	issued = np.asarray(issued, dtype=np.float64)[known]
+	ended = np.fmin(np.asarray(returned, dtype=np.float64)[known], now_day)  # open loans run until now
+
+	# Only the part of each loan inside the window (and after the copy arrived) counts.
+	exposure_start = np.maximum(acquired, window_start_day)
+	on_loan_days = np.clip(ended - np.maximum(issued, exposure_start[loan_index]), 0, None)
+	copy_on_loan = np.bincount(loan_index, weights=on_loan_days, minlength=len(copy_id))
+	copy_exposure = np.maximum(now_day - exposure_start, 1.0)
+	copy_loans = np.bincount(loan_index, weights=issued >= window_start_day, minlength=len(copy_id))
+
+	n_books = len(book_id)
+	title_copies = np.bincount(copy_book, minlength=n_books)
+	title_loans = np.bincount(copy_book, weights=copy_loans, minlength=n_books)
+	title_on_loan = np.bincount(copy_book, weights=copy_on_loan, minlength=n_books)
+	title_exposure = np.bincount(copy_book, weights=copy_exposure, minlength=n_books)
+	idle_copies = np.bincount(copy_book, weights=copy_on_loan == 0, minlength=n_books)
+	newest_copy = np.full(n_books, -np.inf)
+	np.maximum.at(newest_copy, copy_book, acquired)
+
+	holds = np.zeros(n_books, dtype=np.int64)
+	open_holds = list(
+		Reservation.objects.filter(status__in=[Reservation.Status.PENDING, Reservation.Status.NOTIFIED])
+		.values_list("book_id")
+		.annotate(total=Count("id"))
+		.order_by()
+	)
+	if open_holds:
+		hold_book, hold_total = zip(*open_holds)
+		holds[np.searchsorted(book_id, hold_book)] = hold_total
+
+	last_issued = np.full(n_books, np.nan)
+	last_loans = list(Loan.objects.values_list("copy__book_id").annotate(last=Max("issued_at")).order_by())
+	if last_loans:
+		loan_book, loan_last = zip(*last_loans)
+		last_issued[np.searchsorted(book_id, loan_book)] = [_days(value) for value in loan_last]
+
+	owned = np.maximum(title_copies, 1)
+	utilization = np.divide(title_on_loan, title_exposure, out=np.zeros(n_books), where=title_exposure > 0)
+	holds_ratio = holds / owned
+	suggested = np.maximum(np.ceil(holds / HOLDS_PER_COPY_TARGET) - title_copies, 0)
+	suggested = np.where((utilization >= BUSY_UTILIZATION) & (suggested == 0), 1, suggested)
+
+	return CollectionMetrics(
+		now=now,
+		window_days=window_days,
+		book_id=book_id,
+		isbn=[row[1] for row in books],
+		title=[row[2] for row in books],
+		copies=title_copies,
+		loans=title_loans.astype(np.int64),
+		turnover=np.divide(title_loans, title_copies, out=np.zeros(n_books), where=title_copies > 0),
+		utilization=np.minimum(utilization, 1.0),
+		idle_copies=idle_copies.astype(np.int64),
+		holds=holds,
+		holds_ratio=holds_ratio,
+		suggested_copies=suggested.astype(np.int64),
+		newest_copy=newest_copy,
+		last_issued=last_issued,
+		elapsed=time.monotonic() - started,
+	)
+
+
+def collection_summary(metrics: CollectionMetrics, limit: int = 5) -> dict[str, Any]:
+	"""Headline figures and the top of both lists as plain, picklable data."""
+
+	stocked = metrics.copies > 0
+	never = stocked & np.isnan(metrics.last_issued)
+	return {
+		"computed_at": metrics.now,
+		"window_days": metrics.window_days,
+		"elapsed": metrics.elapsed,
+		"titles": int(stocked.sum()),
+		"median_utilization": float(np.median(metrics.utilization[stocked])) if stocked.any() else 0.0,
+		"median_turnover": float(np.median(metrics.turnover[stocked])) if stocked.any() else 0.0,
+		"idle_copies": int(metrics.idle_copies.sum()),
+		"never_borrowed": int(never.sum()),
+		"buy_more_count": int((metrics.suggested_copies > 0).sum()),
+		"buy_more": list(metrics.rows(metrics.buy_more(limit))),
+		"weed_count": len(metrics.weed()),
+		"weed": list(metrics.rows(metrics.weed(limit))),
+	}
+
+
+def refresh_collection_summary(window_days: int = DEFAULT_WINDOW_DAYS) -> dict[str, Any]:
+	"""Compute the summary and store it for the dashboard, replacing the previous one.
+
+	This is the expensive part: run it from cron (``refresh_collection_summary``) or
+	the job worker, never from a request.
+	"""
+
+	summary = collection_summary(compute_collection_metrics(window_days=window_days))
+	with transaction.atomic():
+		stored = CollectionSummary.objects.create(
+			computed_at=summary["computed_at"],
+			window_days=window_days,
+			data=summary,
+		)
+		CollectionSummary.objects.exclude(pk=stored.pk).delete()
+	transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+	return summary
+
+
+def _load_summary(data: dict[str, Any]) -> dict[str, Any]:
+	"""Turn the timestamps that JSON stored as strings back into datetimes."""
+
+	data["computed_at"] = parse_datetime(data["computed_at"])
+	for row in data["buy_more"] + data["weed"]:
+		row["last_issued"] = parse_datetime(row["last_issued"]) if row["last_issued"] else None
+	return data
+
+
+def get_collection_summary() -> Optional[dict[str, Any]]:
+	"""Return the stored summary, or None until ``refresh_collection_summary`` has run.
+
+	Only reads: one query, cached for ``COLLECTION_ANALYTICS_CACHE_TIMEOUT`` seconds.
+	NumPy is not needed to show a summary computed elsewhere.
+	"""
+
+	summary = cache.get(CACHE_KEY)
+	if summary is None:
+		stored = CollectionSummary.objects.order_by("-computed_at").values_list("data", flat=True).first()
+		if stored is None:
+			return None
+		summary = _load_summary(stored)
+		cache.set(CACHE_KEY, summary, settings.COLLECTION_ANALYTICS_CACHE_TIMEOUT)
+	return summary
+
+
+def report_indices(metrics: CollectionMetrics, report: str, limit: Optional[int] = None):
+	if report == "buy-more":
+		return metrics.buy_more(limit)
+	if report == "weed":
+		return metrics.weed(limit)
+	return np.arange(len(metrics))[:limit]
+
+
+def report_csv_rows(metrics: CollectionMetrics, indices) -> Iterator[list]:
+	for row in metrics.rows(indices):
+		row["last_issued"] = row["last_issued"].strftime("%Y-%m-%d") if row["last_issued"] else ""
+		yield [row[column] for column in REPORT_COLUMNS]
+
+
+def report_parquet(metrics: CollectionMetrics, indices) -> bytes:
+	"""Write the selected titles to Parquet straight from the metric arrays."""
+
+	check_available("parquet")
+	last_issued = metrics.last_issued[indices]
+	table = pa.table(
+		{
+			"book_id": metrics.book_id[indices],
+			"isbn": [metrics.isbn[index] for index in indices.tolist()],
+			"title": [metrics.title[index] for index in indices.tolist()],
+			"copies": metrics.copies[indices],
+			"loans": metrics.loans[indices],
+			"turnover": metrics.turnover[indices],
+			"utilization": metrics.utilization[indices],
+			"idle_copies": metrics.idle_copies[indices],
+			"holds": metrics.holds[indices],
+			"holds_ratio": metrics.holds_ratio[indices],
+			"suggested_copies": metrics.suggested_copies[indices],
+			"last_issued": pa.array(
+				np.where(np.isnan(last_issued), 0, last_issued * SECONDS_PER_DAY * 1e6).astype(np.int64),
+				type=pa.timestamp("us", tz="UTC"),
+				mask=np.isnan(last_issued),
+			),
+		}
+	)
+	sink = ChunkSink()
+	pq.write_table(table, pa.PythonFile(sink, mode="w"), compression="zstd")
+	return b"".join(sink.chunks)
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import io
+import json
+import zlib
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
+
+from django.db.models import QuerySet
+
+from catalog.models import Book
+from circulation.models import Fine, Loan, Reservation
+
+try:
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is optional
+	pa = pq = None
+
+try:
+	import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+	zstandard = None
+
+
+# Flush the CSV buffer to the client roughly every 64 KiB: large enough to keep the
+# per-yield overhead negligible, small enough that memory stays flat.
+STREAM_BUFFER_SIZE = 64 * 1024
+ITERATOR_CHUNK_SIZE = 2000
+
+LOAN_CSV_HEADER = ["Book", "Borrower", "Issued", "Due", "Returned", "Status", "Fine"]
+LOAN_CSV_FIELDS = (
+	"copy__book__title",
+	"borrower__username",
+	"issued_at",
+	"due_at",
+	"returned_at",
+	"status",
+	"fine_accrued",
+)
+
+
+def loan_csv_rows(queryset) -> Iterator[list]:
+	"""Yield export rows for ``queryset`` without instantiating models or caching results.
+
+	Newest loans first, as in the loan list; the keyset index covers the ordering.
+	"""
+
+	status_labels = dict(Loan.Status.choices)
+	rows = queryset.order_by("-issued_at", "-pk").values_list(*LOAN_CSV_FIELDS).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+	for title, username, issued_at, due_at, returned_at, status, fine in rows:
+		yield [
+			title,
+			username,
+			issued_at.strftime("%Y-%m-%d"),
+			due_at.strftime("%Y-%m-%d"),
+			returned_at.strftime("%Y-%m-%d") if returned_at else "",
+			status_labels.get(status, status),
+			fine,
+		]
+
+
+def stream_csv(header: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+	buffer = io.StringIO()
+	writer = csv.writer(buffer)
+	writer.writerow(header)
+	for row in rows:
+		writer.writerow(row)
+		if buffer.tell() >= STREAM_BUFFER_SIZE:
+			yield buffer.getvalue().encode("utf-8")
+			buffer.seek(0)
+			buffer.truncate()
+	yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+	"""Compress a byte stream incrementally into a single gzip member."""
+
+	compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+	for chunk in chunks:
+		data = compressor.compress(chunk)
+		if data:
+			yield data
+	yield compressor.flush()
+
+
+# --- Dataset exports ----------------------------------------------------------------
+#
+# Typed, analytics-friendly dumps of the main tables. Rows are always read with
+# values_list(...).iterator() and written in record batches, so memory is bounded by
+# the batch size rather than the table size.
+
+EXPORT_FORMATS = ("parquet", "arrow", "jsonl")
+JSONL_COMPRESSIONS = ("gzip", "zstd")
+EXPORT_BATCH_SIZE = 20_000
+
+
+class ExportUnavailable(Exception):
+	"""Raised when a format or compression needs an optional package that is missing."""
+
+
+@dataclass(frozen=True)
+class Column:
+	name: str
+	lookup: str
+	kind: str  # int, str, bool, decimal, date, datetime, json
+
+
+@dataclass(frozen=True)
+class Dataset:
+	name: str
+	queryset: Callable[[], QuerySet]
+	columns: tuple[Column, ...]
+
+	def rows(self, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[tuple]:
+		lookups = [column.lookup for column in self.columns]
+		return self.queryset().order_by("pk").values_list(*lookups).iterator(chunk_size=min(batch_size, 10_000))
+
+
+DATASETS = {
+	dataset.name: dataset
+	for dataset in (
+		Dataset(
+			"loans",
+			lambda: Loan.objects.all(),
+			(
+				Column("id", "id", "int"),
+				Column("copy_id", "copy_id", "int"),
+				Column("barcode", "copy__barcode", "str"),
+				Column("book_id", "copy__book_id", "int"),
+				Column("book_title", "copy__book__title", "str"),
+				Column("borrower_id", "borrower_id", "int"),
+				Column("borrower_username", "borrower__username", "str"),
+				Column("issued_by_id", "issued_by_id", "int"),
+				Column("issued_at", "issued_at", "datetime"),
+				Column("due_at", "due_at", "datetime"),
+				Column("returned_at", "returned_at", "datetime"),
+				Column("status", "status", "str"),
+				Column("fine_accrued", "fine_accrued", "decimal"),
+			),
+		),
+		Dataset(
+			"fines",
+			lambda: Fine.objects.all(),
+			(
+				Column("id", "id", "int"),
+				Column("loan_id", "loan_id", "int"),
+				Column("member_id", "member_id", "int"),
+				Column("member_username", "member__username", "str"),
+				Column("amount", "amount", "decimal"),
+				Column("issued_at", "issued_at", "datetime"),
+				Column("is_paid", "is_paid", "bool"),
+				Column("paid_at", "paid_at", "datetime"),
+			),
+		),
+		Dataset(
+			"reservations",
+			lambda: Reservation.objects.all(),
+			(
+				Column("id", "id", "int"),
+				Column("book_id", "book_id", "int"),
+				Column("book_title", "book__title", "str"),
+				Column("member_id", "member_id", "int"),
+				Column("status", "status", "str"),
+				Column("position", "position", "int"),
+				Column("copy_id", "copy_id", "int"),
+				Column("created_at", "created_at", "datetime"),
+				Column("expires_at", "expires_at", "datetime"),
+				Column("fulfilled_at", "fulfilled_at", "datetime"),
+			),
+		),
+		Dataset(
+			"books",
+			lambda: Book.objects.all(),
+			(
+				Column("id", "id", "int"),
+				Column("isbn", "isbn", "str"),
+				Column("title", "title", "str"),
+				Column("author", "author", "str"),
+				Column("category", "category__name", "str"),
+				Column("publisher", "publisher", "str"),
+				Column("publication_date", "publication_date", "date"),
+				Column("language", "language", "str"),
+				Column("tags", "tags", "json"),
+				Column("total_copies", "total_copies", "int"),
+				Column("available_copies", "available_copies", "int"),
+				Column("created_at", "created_at", "datetime"),
+				Column("updated_at", "updated_at", "datetime"),
+			),
+		),
+	)
+}
+
+
+def file_extension(file_format: str, compression: Optional[str] = None) -> str:
+	extension = {"parquet": "parquet", "arrow": "arrow", "jsonl": "jsonl"}[file_format]
+	if file_format == "jsonl" and compression:
+		extension += {"gzip": ".gz", "zstd": ".zst"}[compression]
+	return extension
+
+
+def check_available(file_format: str, compression: Optional[str] = None) -> None:
+	if file_format in ("parquet", "arrow") and pa is None:
+		raise ExportUnavailable(f"{file_format} export requires the pyarrow package.")
+	if file_format == "jsonl" and compression == "zstd" and zstandard is None:
+		raise ExportUnavailable("zstd compression requires the zstandard package.")
+
+
+# JSON Lines ---------------------------------------------------------------------------
+
+
+def _json_default(value: Any) -> Any:
+	if isinstance(value, (datetime.datetime, datetime.date)):
+		return value.isoformat()
+	if isinstance(value, Decimal):
+		return str(value)
+	raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+def stream_jsonl(dataset: Dataset, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+	names = [column.name for column in dataset.columns]
+	encoder = json.JSONEncoder(default=_json_default, ensure_ascii=False, separators=(",", ":"))
+	buffer = []
+	size = 0
+	for row in dataset.rows(batch_size):
+		line = encoder.encode(dict(zip(names, row)))
+		buffer.append(line)
+		size += len(line) + 1
+		if size >= STREAM_BUFFER_SIZE:
+			yield ("\n".join(buffer) + "\n").encode("utf-8")
+			buffer, size = [], 0
+	if buffer:
+		yield ("\n".join(buffer) + "\n").encode("utf-8")
+
+
+def zstd_stream(chunks: Iterable[bytes], level: int = 3) -> Iterator[bytes]:
+	compressor = zstandard.ZstdCompressor(level=level).compressobj()
+	for chunk in chunks:
+		data = compressor.compress(chunk)
+		if data:
+			yield data
+	yield compressor.flush()
+
+
+def stream_export(
+	dataset: Dataset,
+	file_format: str,
+	compression: Optional[str] = None,
+	batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+	"""Yield the encoded export as bytes; columnar formats are produced batch by batch."""
+
+	check_available(file_format, compression)
+	if file_format != "jsonl":
+		yield from _stream_columnar(dataset, file_format, batch_size)
+		return
+	chunks = stream_jsonl(dataset, batch_size)
+	if compression == "gzip":
+		chunks = gzip_stream(chunks)
+	elif compression == "zstd":
+		chunks = zstd_stream(chunks)
+	yield from chunks
+
+
+# Parquet / Arrow ------------------------------------------------------------------------
+
+
+def arrow_schema(dataset: Dataset):
+	types = {
+		"int": pa.int64(),
+		"str": pa.string(),
+		"bool": pa.bool_(),
+		"decimal": pa.decimal128(10, 2),
+		"date": pa.date32(),
+		"datetime": pa.timestamp("us", tz="UTC"),
+		"json": pa.string(),
+	}
+	return pa.schema([pa.field(column.name, types[column.kind]) for column in dataset.columns])
+
+
+def _record_batch(dataset: Dataset, schema, rows: list[tuple]):
+	columns = []
+	for index, column in enumerate(dataset.columns):
+		values = [row[index] for row in rows]
+		if column.kind == "json":
+			values = [None if value is None else json.dumps(value, ensure_ascii=False) for value in values]
+		columns.append(pa.array(values, type=schema.field(index).type))
+	return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def _batches(dataset: Dataset, schema, batch_size: int):
+	rows: list[tuple] = []
+	for row in dataset.rows(batch_size):
+		rows.append(row)
+		if len(rows) >= batch_size:
+			yield _record_batch(dataset, schema, rows)
+			rows = []
+	if rows:
+		yield _record_batch(dataset, schema, rows)
+
+
+class ChunkSink(io.RawIOBase):
+	"""Write-only file object that hands each write to a list the generator drains."""
+
+	def __init__(self):
+		self.chunks: list[bytes] = []
+		self.position = 0
+
+	def writable(self) -> bool:
+		return True
+
+	def write(self, data) -> int:
+		self.chunks.append(bytes(data))
+		self.position += len(data)
+		return len(data)
+
+	def tell(self) -> int:
+		return self.position
+
+
+def _stream_columnar(dataset: Dataset, file_format: str, batch_size: int) -> Iterator[bytes]:
+	# Both writers only ever append (the Parquet footer comes last), so the output can
+	# be forwarded as it is produced instead of being staged in a temporary file.
+	sink = ChunkSink()
+	schema = arrow_schema(dataset)
+	output = pa.PythonFile(sink, mode="w")
+	if file_format == "parquet":
+		writer = pq.ParquetWriter(output, schema, compression="zstd")
+	else:
+		writer = pa.ipc.new_file(output, schema)
+	with writer:
+		for batch in _batches(dataset, schema, batch_size):
+			writer.write_batch(batch)
+			if sink.chunks:
+				yield b"".join(sink.chunks)
+				sink.chunks.clear()
+	if sink.chunks:
+		yield b"".join(sink.chunks)
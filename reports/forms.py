@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from datetime import datetime, time, timedelta
+
+from django import forms
+from django.utils import timezone
+
+from circulation.models import Loan
+
+from .timeseries import INTERVALS
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class LoanExportFilterForm(forms.Form):
+    issued_from = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    issued_to = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    status = forms.ChoiceField(choices=[("", "All statuses"), *Loan.Status.choices], required=False)
+    borrower = forms.IntegerField(required=False, min_value=1, help_text="Borrower user id.")
+    compress = forms.ChoiceField(choices=[("", "None"), ("gzip", "gzip")], required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            css_class = "form-select" if isinstance(field.widget, forms.Select) else "form-control"
+            field.widget.attrs["class"] = css_class
+
+    def clean(self):
+        cleaned_data = super().clean()
+        issued_from = cleaned_data.get("issued_from")
+        issued_to = cleaned_data.get("issued_to")
+        if issued_from and issued_to and issued_from > issued_to:
+            raise forms.ValidationError("The start date must not be after the end date.")
+        return cleaned_data
+
+    def filter_queryset(self, queryset):
+        data = self.cleaned_data
+        # Compare against datetime bounds rather than issued_at__date so the range
+        # stays sargable on the issued_at index.
+        if data.get("issued_from"):
+            queryset = queryset.filter(issued_at__gte=_start_of_day(data["issued_from"]))
+        if data.get("issued_to"):
+            queryset = queryset.filter(issued_at__lt=_start_of_day(data["issued_to"] + timedelta(days=1)))
+        if data.get("status"):
+            queryset = queryset.filter(status=data["status"])
+        if data.get("borrower"):
+            queryset = queryset.filter(borrower_id=data["borrower"])
+        return queryset
+
+
+class TimeSeriesFilterForm(forms.Form):
+    DEFAULT_SPAN = timedelta(days=365)
+    MAX_DAILY_SPAN = timedelta(days=3 * 366)
+
+    interval = forms.ChoiceField(choices=[(value, value) for value in INTERVALS], required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    category = forms.SlugField(required=False, help_text="Category slug.")
+    language = forms.CharField(required=False, max_length=60)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+        cleaned_data["interval"] = cleaned_data.get("interval") or "day"
+        end = cleaned_data.get("end") or timezone.localdate()
+        start = cleaned_data.get("start") or end - self.DEFAULT_SPAN + timedelta(days=1)
+        if start > end:
+            raise forms.ValidationError("The start date must not be after the end date.")
+        if cleaned_data["interval"] == "day" and end - start > self.MAX_DAILY_SPAN:
+            raise forms.ValidationError("Use a week or month interval for ranges longer than three years.")
+        cleaned_data["start"], cleaned_data["end"] = start, end
+        return cleaned_data
+
+    def series_params(self) -> dict:
+        return {name: self.cleaned_data[name] for name in ("interval", "start", "end", "category", "language")}
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from django.utils import timezone
+
+from circulation.models import Loan
+from jobs.registry import register
+
+from .analytics import (
+	REPORT_COLUMNS,
+	compute_collection_metrics,
+	refresh_collection_summary,
+	report_csv_rows,
+	report_indices,
+	report_parquet,
+)
+from .exports import (
+	DATASETS,
+	EXPORT_BATCH_SIZE,
+	LOAN_CSV_HEADER,
+	Dataset,
+	file_extension,
+	gzip_stream,
+	loan_csv_rows,
+	stream_csv,
+	stream_export,
+)
+from .forms import LoanExportFilterForm
+
+
+def _timestamp() -> str:
+	return timezone.now().strftime("%Y%m%d_%H%M%S")
+
+
+@dataclass(frozen=True)
+class _TrackedDataset(Dataset):
+	"""A dataset whose row iterator reports progress to a running job."""
+
+	context: Any = None
+	total: Optional[int] = None
+
+	def rows(self, batch_size: int = EXPORT_BATCH_SIZE):
+		return self.context.track(super().rows(batch_size), self.total)
+
+
+@register("reports.loan_csv", "Loan CSV export")
+def export_loans_csv(context, filters: dict) -> str:
+	form = LoanExportFilterForm(filters)
+	if not form.is_valid():
+		raise ValueError(form.errors.as_text())
+	queryset = form.filter_queryset(Loan.objects.all())
+	total = queryset.count()
+	chunks = stream_csv(LOAN_CSV_HEADER, context.track(loan_csv_rows(queryset), total))
+	filename = f"loans_{_timestamp()}.csv"
+	if form.cleaned_data.get("compress") == "gzip":
+		chunks = gzip_stream(chunks)
+		filename += ".gz"
+	size = context.save_result(filename, chunks)
+	return f"{total:,} loans, {size / 1_048_576:,.1f} MiB"
+
+
+@register("reports.dataset", "Dataset export")
+def export_dataset(context, dataset: str, format: str = "parquet", compress: Optional[str] = None) -> str:
+	source = DATASETS[dataset]
+	total = source.queryset().count()
+	tracked = _TrackedDataset(source.name, source.queryset, source.columns, context=context, total=total)
+	filename = f"{dataset}_{_timestamp()}.{file_extension(format, compress)}"
+	size = context.save_result(filename, stream_export(tracked, format, compress))
+	return f"{total:,} {dataset}, {size / 1_048_576:,.1f} MiB"
+
+
+@register("reports.collection", "Collection report")
+def export_collection_report(
+	context,
+	report: str,
+	format: str = "csv",
+	window_days: int = 365,
+	limit: Optional[int] = None,
+) -> str:
+	context.progress(0, message="Loading loan history")
+	metrics = compute_collection_metrics(window_days=window_days)
+	indices = report_indices(metrics, report, limit)
+	context.progress(90, 100, f"Writing {len(indices):,} titles")
+	filename = f"{report}_{_timestamp()}.{format}"
+	if format == "parquet":
+		context.save_result(filename, [report_parquet(metrics, indices)])
+	else:
+		context.save_result(filename, stream_csv(REPORT_COLUMNS, report_csv_rows(metrics, indices)))
+	return f"{len(indices):,} titles"
+
+
+@register("reports.collection_summary", "Collection summary refresh")
+def refresh_collection(context, window_days: int = 365) -> str:
+	context.progress(0, message="Loading loan history")
+	summary = refresh_collection_summary(window_days=window_days)
+	return f"{summary['titles']:,} titles in {summary['elapsed']:.1f}s"
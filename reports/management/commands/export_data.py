@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reports.exports import (
+    DATASETS,
+    EXPORT_BATCH_SIZE,
+    EXPORT_FORMATS,
+    JSONL_COMPRESSIONS,
+    ExportUnavailable,
+    check_available,
+    file_extension,
+    stream_export,
+)
+
+
+class Command(BaseCommand):
+    help = "Export loans, fines, reservations or books as Parquet, Arrow IPC or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="parquet")
+        parser.add_argument("--compress", choices=JSONL_COMPRESSIONS, help="Compression for JSON Lines output.")
+        parser.add_argument(
+            "--output",
+            help="File to write, or '-' for stdout (default: <dataset>_<timestamp>.<ext> in the current directory).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=EXPORT_BATCH_SIZE,
+            help="Rows per record batch; bounds memory use regardless of table size.",
+        )
+
+    def handle(self, *args, **options):
+        dataset = DATASETS[options["dataset"]]
+        file_format = options["format"]
+        compression = options["compress"]
+        if compression and file_format != "jsonl":
+            raise CommandError("--compress only applies to --format jsonl.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        try:
+            check_available(file_format, compression)
+        except ExportUnavailable as exc:
+            raise CommandError(str(exc)) from exc
+
+        output = options["output"] or (
+            f"{dataset.name}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{file_extension(file_format, compression)}"
+        )
+        started = time.monotonic()
+        written = 0
+        chunks = stream_export(dataset, file_format, compression, options["batch_size"])
+        if output == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+                written += len(chunk)
+            sys.stdout.buffer.flush()
+            return
+        with open(output, "wb") as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+                written += len(chunk)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {dataset.name} to {output} ({written / 1_048_576:,.1f} MiB) "
+                f"in {time.monotonic() - started:.1f}s."
+            )
+        )
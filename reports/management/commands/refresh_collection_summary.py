@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.analytics import DEFAULT_WINDOW_DAYS, AnalyticsUnavailable, refresh_collection_summary
+
+
+class Command(BaseCommand):
+    help = "Recompute the collection utilization summary shown on the dashboard."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window-days",
+            type=int,
+            default=DEFAULT_WINDOW_DAYS,
+            help="Days of loan history the figures cover.",
+        )
+
+    def handle(self, *args, **options):
+        if options["window_days"] < 1:
+            raise CommandError("--window-days must be at least 1.")
+        try:
+            summary = refresh_collection_summary(window_days=options["window_days"])
+        except AnalyticsUnavailable as exc:
+            raise CommandError(str(exc)) from exc
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Summarised {summary['titles']} titles: {summary['buy_more_count']} need more copies, "
+                f"{summary['weed_count']} are weeding candidates ({summary['elapsed']:.2f}s)."
+            )
+        )
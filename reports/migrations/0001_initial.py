@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:20
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("catalog", "0004_book_keyset_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="DailyCirculation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("language", models.CharField(blank=True, max_length=60)),
+                ("issues", models.PositiveIntegerField(default=0)),
+                ("returns", models.PositiveIntegerField(default=0)),
+                (
+                    "overdue",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Loans that fell overdue on this day."
+                    ),
+                ),
+                ("fines_issued", models.PositiveIntegerField(default=0)),
+                (
+                    "fines_amount",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_circulation",
+                        to="catalog.category",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "daily circulation",
+                "ordering": ["-day", "category", "language"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "category", "language"),
+                        name="reports_daily_circulation_key",
+                    )
+                ],
+            },
+        ),
+    ]
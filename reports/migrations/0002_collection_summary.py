@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:08
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CollectionSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("computed_at", models.DateTimeField()),
+                ("window_days", models.PositiveIntegerField()),
+                (
+                    "data",
+                    models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "collection summaries",
+                "get_latest_by": "computed_at",
+            },
+        ),
+    ]
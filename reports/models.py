@@ -1,3 +1,81 @@
+from __future__ import annotations
+
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-# Create your models here.
+from catalog.models import Category
+
+
+class DailyCirculation(models.Model):
+	"""Circulation activity for one day, book category and language.
+
+	Maintained by ``refresh_rollups``; reports read these rows instead of scanning
+	the loan and fine tables.
+	"""
+
+	day = models.DateField()
+	category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="daily_circulation")
+	language = models.CharField(max_length=60, blank=True)
+	issues = models.PositiveIntegerField(default=0)
+	returns = models.PositiveIntegerField(default=0)
+	overdue = models.PositiveIntegerField(default=0, help_text="Loans that fell overdue on this day.")
+	fines_issued = models.PositiveIntegerField(default=0)
+	fines_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+
+	class Meta:
+		ordering = ["-day", "category", "language"]
+		verbose_name_plural = "daily circulation"
+		constraints = [
+			models.UniqueConstraint(fields=["day", "category", "language"], name="reports_daily_circulation_key"),
+		]
+
+	def __str__(self) -> str:
+		return f"{self.day} {self.category_id} {self.language or '-'}"
+
+
+class DirtyRollupDay(models.Model):
+	"""A day whose rollup rows are stale because a loan or fine dated on it changed.
+
+	Marked in the same transaction as the change, by the loan and fine signal
+	handlers and by the bulk circulation services through ``circulation_changed``.
+	``refresh_rollups`` recomputes the marked days and deletes the marks it read. A
+	day may be marked many times.
+	"""
+
+	day = models.DateField(db_index=True)
+
+	def __str__(self) -> str:
+		return str(self.day)
+
+
+class RollupWatermark(models.Model):
+	"""Point in time up to which a rollup is known to be complete."""
+
+	DAILY_CIRCULATION = "daily_circulation"
+
+	name = models.CharField(max_length=50, unique=True)
+	value = models.DateTimeField()
+
+	def __str__(self) -> str:
+		return f"{self.name} @ {self.value:%Y-%m-%d %H:%M}"
+
+
+class CollectionSummary(models.Model):
+	"""The latest collection analytics summary shown on the dashboard.
+
+	Written by ``refresh_collection_summary`` (a management command or a background
+	job) so the dashboard never runs the NumPy pass itself; only one row is kept.
+	"""
+
+	computed_at = models.DateTimeField()
+	window_days = models.PositiveIntegerField()
+	data = models.JSONField(encoder=DjangoJSONEncoder)
+
+	class Meta:
+		get_latest_by = "computed_at"
+		verbose_name_plural = "collection summaries"
+
+	def __str__(self) -> str:
+		return f"Collection summary @ {self.computed_at:%Y-%m-%d %H:%M}"
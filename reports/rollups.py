@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import datetime
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from circulation.models import Fine, Loan
+
+from .models import DailyCirculation, DirtyRollupDay, RollupWatermark
+from .snapshot import invalidate_dashboard_snapshot
+from .timeseries import invalidate_timeseries
+
+
+WATERMARK = RollupWatermark.DAILY_CIRCULATION
+# Dirty-day marks deleted per statement, well under every backend's parameter limit.
+MARK_DELETE_BATCH = 500
+
+
+@dataclass
+class RefreshResult:
+	first_day: Optional[datetime.date] = None
+	last_day: Optional[datetime.date] = None
+	days: int = 0
+	rows: int = 0
+	watermark: Optional[datetime.datetime] = None
+
+
+def local_days(*moments: Optional[datetime.datetime]) -> set[datetime.date]:
+	"""The local days of the given timestamps, skipping blanks."""
+
+	return {timezone.localdate(moment) for moment in moments if moment is not None}
+
+
+def mark_days_dirty(days: Iterable[datetime.date]) -> None:
+	"""Record that the rollup rows of ``days`` must be recomputed on the next refresh.
+
+	Call it inside the transaction that changes the loans or fines, so the mark and
+	the change commit together.
+	"""
+
+	days = sorted(set(days))
+	if days:
+		DirtyRollupDay.objects.bulk_create([DirtyRollupDay(day=day) for day in days])
+
+
+def _runs(days: Iterable[datetime.date]) -> list[tuple[datetime.date, datetime.date]]:
+	"""Collapse days into ``(first, last)`` runs of consecutive days."""
+
+	runs: list[list[datetime.date]] = []
+	for day in sorted(set(days)):
+		if runs and day - runs[-1][1] == datetime.timedelta(days=1):
+			runs[-1][1] = day
+		else:
+			runs.append([day, day])
+	return [(first, last) for first, last in runs]
+
+
+def _start_of_day(day: datetime.date) -> datetime.datetime:
+	return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _earliest_activity() -> Optional[datetime.date]:
+	candidates = [
+		Loan.objects.aggregate(first=Min("issued_at"))["first"],
+		Fine.objects.aggregate(first=Min("issued_at"))["first"],
+	]
+	candidates = [value for value in candidates if value is not None]
+	return timezone.localdate(min(candidates)) if candidates else None
+
+
+def _grouped(queryset, timestamp: str, book_path: str, **aggregates):
+	"""Group ``queryset`` by local day of ``timestamp`` and the book's category and language."""
+
+	return queryset.values(
+		rollup_day=TruncDate(timestamp),
+		rollup_category=F(f"{book_path}__category_id"),
+		rollup_language=F(f"{book_path}__language"),
+	).annotate(**aggregates).order_by()
+
+
+def compute_days(first_day: datetime.date, last_day: datetime.date, now: datetime.datetime) -> list[DailyCirculation]:
+	"""Aggregate every day in ``[first_day, last_day]`` with four grouped queries."""
+
+	start, end = _start_of_day(first_day), _start_of_day(last_day + datetime.timedelta(days=1))
+	rows: dict[tuple, DailyCirculation] = {}
+
+	def row(values) -> DailyCirculation:
+		key = (values["rollup_day"], values["rollup_category"], values["rollup_language"] or "")
+		if key not in rows:
+			rows[key] = DailyCirculation(day=key[0], category_id=key[1], language=key[2])
+		return rows[key]
+
+	issued = Loan.objects.filter(issued_at__gte=start, issued_at__lt=end)
+	for values in _grouped(issued, "issued_at", "copy__book", total=Count("id")):
+		row(values).issues = values["total"]
+
+	returned = Loan.objects.filter(returned_at__gte=start, returned_at__lt=end)
+	for values in _grouped(returned, "returned_at", "copy__book", total=Count("id")):
+		row(values).returns = values["total"]
+
+	# A loan falls overdue on its due day if it was still out when the due time passed.
+	overdue = Loan.objects.filter(due_at__gte=start, due_at__lt=min(end, now)).filter(
+		Q(returned_at__isnull=True) | Q(returned_at__gt=F("due_at"))
+	)
+	for values in _grouped(overdue, "due_at", "copy__book", total=Count("id")):
+		row(values).overdue = values["total"]
+
+	fines = Fine.objects.filter(issued_at__gte=start, issued_at__lt=end)
+	for values in _grouped(fines, "issued_at", "loan__copy__book", total=Count("id"), amount=Sum("amount")):
+		target = row(values)
+		target.fines_issued = values["total"]
+		target.fines_amount = values["amount"] or Decimal("0.00")
+
+	return list(rows.values())
+
+
+def refresh_daily_rollups(full: bool = False, now: Optional[datetime.datetime] = None) -> RefreshResult:
+	"""Recompute the daily rollup rows touched since the last refresh.
+
+	Every event the rollup counts (issue, return, due date passing, fine) is dated by
+	its own timestamp, so anything that happened since the watermark lands on a day at
+	or after it; those days are always rebuilt. Older days are rebuilt only when a
+	write marked them dirty (see ``mark_days_dirty``): back-dated returns, edited due
+	dates, adjusted fines and deletes. Four grouped queries per run of consecutive
+	days. ``full`` rebuilds all history.
+	"""
+
+	now = now or timezone.now()
+	result = RefreshResult()
+	with transaction.atomic():
+		watermark = RollupWatermark.objects.select_for_update().filter(name=WATERMARK).first()
+		marks = list(DirtyRollupDay.objects.values_list("pk", "day"))
+		last_day = timezone.localdate(now)
+		rebuild = full or watermark is None
+		if rebuild:
+			first_day = _earliest_activity()
+			runs = [(first_day, last_day)] if first_day is not None else []
+		else:
+			since = timezone.localdate(watermark.value)
+			runs = _runs(day for _, day in marks if day < since) + [(since, last_day)]
+
+		rows: list[DailyCirculation] = []
+		stale = Q()
+		for first, last in runs:
+			rows += compute_days(first, last, now)
+			stale |= Q(day__range=(first, last))
+			result.days += (last - first).days + 1
+		if rebuild:
+			DailyCirculation.objects.all().delete()
+		elif runs:
+			DailyCirculation.objects.filter(stale).delete()
+		DailyCirculation.objects.bulk_create(rows, batch_size=2000)
+		if runs:
+			result.first_day, result.last_day, result.rows = runs[0][0], runs[-1][1], len(rows)
+
+		# Only the marks read above: marks committed since then stay for the next run.
+		mark_ids = [pk for pk, _ in marks]
+		for index in range(0, len(mark_ids), MARK_DELETE_BATCH):
+			DirtyRollupDay.objects.filter(pk__in=mark_ids[index : index + MARK_DELETE_BATCH]).delete()
+		RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={"value": now})
+		result.watermark = now
+		invalidate_dashboard_snapshot()
+		invalidate_timeseries()
+	return result
+
+
+def rollup_watermark() -> Optional[datetime.datetime]:
+	return RollupWatermark.objects.filter(name=WATERMARK).values_list("value", flat=True).first()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from catalog.models import Book
+from circulation.models import Fine, Loan, Reservation
+from circulation.signals import circulation_changed
+
+from .rollups import local_days, mark_days_dirty
+from .snapshot import invalidate_dashboard_snapshot
+
+
+# Fields whose change moves a loan or fine between rollup rows.
+LOAN_ROLLUP_FIELDS = ("issued_at", "due_at", "returned_at", "copy")
+FINE_ROLLUP_FIELDS = ("issued_at", "amount", "loan")
+
+
+def _touches(update_fields, fields: tuple[str, ...]) -> bool:
+	return update_fields is None or not set(fields).isdisjoint(update_fields)
+
+
+@receiver(circulation_changed)
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Loan)
+@receiver(post_delete, sender=Loan)
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+@receiver(post_save, sender=Fine)
+@receiver(post_delete, sender=Fine)
+def refresh_dashboard(sender: Any, **_: Any) -> None:
+	"""Invalidate the cached dashboard whenever the figures it shows may have changed."""
+
+	invalidate_dashboard_snapshot()
+
+
+@receiver(pre_save, sender=Loan)
+def mark_previous_loan_days(sender: type[Loan], instance: Loan, update_fields=None, **_: Any) -> None:
+	"""Dirty the days an edited loan counted on before the edit (e.g. a moved due date)."""
+
+	if instance._state.adding or not _touches(update_fields, LOAN_ROLLUP_FIELDS):
+		return
+	stored = Loan.objects.filter(pk=instance.pk).values_list("issued_at", "due_at", "returned_at").first()
+	if stored is not None:
+		mark_days_dirty(local_days(*stored) - local_days(instance.issued_at, instance.due_at, instance.returned_at))
+
+
+@receiver(post_save, sender=Loan)
+@receiver(post_delete, sender=Loan)
+def mark_loan_days(sender: type[Loan], instance: Loan, update_fields=None, **_: Any) -> None:
+	if _touches(update_fields, LOAN_ROLLUP_FIELDS):
+		mark_days_dirty(local_days(instance.issued_at, instance.due_at, instance.returned_at))
+
+
+@receiver(post_save, sender=Fine)
+@receiver(post_delete, sender=Fine)
+def mark_fine_day(sender: type[Fine], instance: Fine, update_fields=None, **_: Any) -> None:
+	if _touches(update_fields, FINE_ROLLUP_FIELDS):
+		mark_days_dirty(local_days(instance.issued_at))
+
+
+@receiver(circulation_changed)
+def mark_bulk_days(sender: Any, days=(), **_: Any) -> None:
+	"""Dirty the days a bulk circulation write reports through ``circulation_changed``."""
+
+	mark_days_dirty(days)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import datetime
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, QuerySet, Sum
+from django.utils import timezone
+
+from accounts.models import User
+from catalog.models import Book
+from circulation.models import Fine, Loan, Reservation
+
+from .models import DailyCirculation, RollupWatermark
+
+
+CACHE_KEY = "reports:dashboard-snapshot"
+ROLLUP_WINDOW_DAYS = 30
+ROLLUP_TOTALS = ("issues", "returns", "overdue", "fines_issued", "fines_amount")
+
+
+def _scalar_counts(**querysets: QuerySet) -> dict[str, int]:
+	"""COUNT(*) several querysets in a single round trip.
+
+	Each queryset becomes a scalar subquery of one ``SELECT``, so every count can still
+	use its own index instead of sharing one scan with conditional aggregates. The
+	statement runs on the database the first queryset reads from; all of them must
+	live there.
+	"""
+
+	using = next(iter(querysets.values())).db
+	columns, params = [], []
+	for name, queryset in querysets.items():
+		sql, query_params = queryset.order_by().values("pk").query.get_compiler(using=using).as_sql()
+		columns.append(f"(SELECT COUNT(*) FROM ({sql}) AS {name}_rows) AS {name}")
+		params.extend(query_params)
+	with connections[using].cursor() as cursor:
+		cursor.execute(f"SELECT {', '.join(columns)}", params)
+		row = cursor.fetchone()
+	return dict(zip(querysets, row))
+
+
+def _circulation_window(days: int = ROLLUP_WINDOW_DAYS) -> dict[str, Any]:
+	"""Summarise the last ``days`` of circulation from the daily rollups.
+
+	One grouped query over at most ``days x categories x languages`` rollup rows; the
+	window totals are the sum of the per-category rows.
+	"""
+
+	since = timezone.localdate() - datetime.timedelta(days=days - 1)
+	per_category = list(
+		DailyCirculation.objects.filter(day__gte=since)
+		.values("category__name")
+		.annotate(**{field: Sum(field) for field in ROLLUP_TOTALS})
+		.order_by("-issues", "category__name")
+	)
+	totals = {field: sum(row[field] for row in per_category) for field in ROLLUP_TOTALS}
+	return {
+		"circulation_window_days": days,
+		"circulation_totals": totals,
+		"busiest_categories": per_category[:5],
+		"rollup_watermark": RollupWatermark.objects.filter(name=RollupWatermark.DAILY_CIRCULATION)
+		.values_list("value", flat=True)
+		.first(),
+	}
+
+
+def build_dashboard_snapshot() -> dict[str, Any]:
+	"""Compute the dashboard figures with five queries and return plain, picklable data.
+
+	Circulation trends come from the daily rollups, so their cost does not grow with
+	the loan table.
+	"""
+
+	snapshot: dict[str, Any] = _scalar_counts(
+		total_books=Book.objects.all(),
+		total_members=User.objects.filter(role=User.Role.MEMBER),
+		active_loans=Loan.objects.filter(returned_at__isnull=True),
+		overdue_loans=Loan.objects.filter(status=Loan.Status.OVERDUE),
+		reservations=Reservation.objects.filter(status=Reservation.Status.PENDING),
+		outstanding_fines=Fine.objects.filter(is_paid=False),
+	)
+	snapshot["recent_loans"] = list(
+		Loan.objects.order_by("-issued_at", "-id").values(
+			"id",
+			"issued_at",
+			"due_at",
+			"copy__book__title",
+			"borrower__username",
+		)[:5]
+	)
+	snapshot["top_categories"] = list(
+		Book.objects.values("category__name").annotate(total=Count("id")).order_by("-total", "category__name")[:5]
+	)
+	snapshot.update(_circulation_window())
+	return snapshot
+
+
+def get_dashboard_snapshot() -> dict[str, Any]:
+	"""Return the cached snapshot, rebuilding it when missing or expired."""
+
+	snapshot = cache.get(CACHE_KEY)
+	if snapshot is None:
+		snapshot = build_dashboard_snapshot()
+		cache.set(CACHE_KEY, snapshot, settings.DASHBOARD_CACHE_TIMEOUT)
+	return snapshot
+
+
+def invalidate_dashboard_snapshot() -> None:
+	"""Drop the cached snapshot once the current transaction commits.
+
+	Deferring to commit stops a concurrent request from caching figures that predate
+	the change while it is still in flight.
+	"""
+
+	transaction.on_commit(lambda: cache.delete(CACHE_KEY))
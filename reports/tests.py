@@ -1,3 +1,490 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from catalog.models import Book, BookCopy, Category
+from circulation.models import Fine, Loan, Reservation
+from circulation.services import accrue_fines, return_batch
+from circulation.signals import circulation_changed
+from jobs.models import Job
+
+from . import exports
+from .analytics import analytics_available, get_collection_summary
+from .models import CollectionSummary, DailyCirculation, DirtyRollupDay
+from .rollups import refresh_daily_rollups
+from .snapshot import CACHE_KEY, get_dashboard_snapshot
+from .timeseries import bucket_start, build_timeseries, get_timeseries
+from .views import DashboardView
+
+
+class ReportsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user("librarian", password="pw", role=User.Role.LIBRARIAN)
+        cls.member = User.objects.create_user("member", password="pw", role=User.Role.MEMBER)
+        cls.fiction = Category.objects.create(name="Fiction")
+        cls.science = Category.objects.create(name="Science")
+        cls.dune = Book.objects.create(title="Dune", author="Frank Herbert", isbn="9780441013593", category=cls.fiction)
+        cls.cosmos = Book.objects.create(
+            title="Cosmos", author="Carl Sagan", isbn="9780345539434", category=cls.science
+        )
+        cls.copies = [
+            BookCopy.objects.create(book=book, barcode=f"{book.pk}-{number}")
+            for book in (cls.dune, cls.cosmos)
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+
+class DashboardSnapshotTests(ReportsTestCase):
+    def dashboard_context(self):
+        request = RequestFactory().get(reverse("reports:dashboard"))
+        request.user = self.librarian
+        return DashboardView.as_view()(request).context_data
+
+    def test_dashboard_query_budget(self):
+        Loan.objects.create(copy=self.copies[0], borrower=self.member)
+        CollectionSummary.objects.create(
+            computed_at=timezone.now(),
+            window_days=90,
+            data={"computed_at": timezone.now(), "buy_more": [], "weed": []},
+        )
+
+        # The five snapshot queries and the stored collection summary.
+        with self.assertNumQueries(6):
+            context = self.dashboard_context()
+        with self.assertNumQueries(0):
+            self.dashboard_context()
+
+        self.assertEqual((context["total_books"], context["active_loans"]), (2, 1))
+        self.assertEqual(context["recent_loans"][0]["copy__book__title"], "Dune")
+        self.assertEqual(context["collection"]["buy_more"], [])
+
+    def assertInvalidatedOnCommit(self, change):
+        get_dashboard_snapshot()
+        with self.captureOnCommitCallbacks() as callbacks:
+            change()
+        self.assertIsNotNone(cache.get(CACHE_KEY))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(CACHE_KEY))
+
+    def test_circulation_writes_invalidate_the_snapshot(self):
+        loan = Loan.objects.create(copy=self.copies[0], borrower=self.member)
+
+        self.assertInvalidatedOnCommit(lambda: Loan.objects.create(copy=self.copies[1], borrower=self.member))
+        self.assertInvalidatedOnCommit(lambda: Reservation.objects.create(book=self.dune, member=self.member))
+        self.assertInvalidatedOnCommit(lambda: Fine.objects.create(member=self.member, loan=loan, amount=Decimal("1")))
+        self.assertInvalidatedOnCommit(lambda: circulation_changed.send(sender=Loan, days=()))
+
+    def test_counts_follow_the_snapshot_rebuild(self):
+        self.assertEqual(get_dashboard_snapshot()["active_loans"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Loan.objects.create(copy=self.copies[0], borrower=self.member)
+
+        self.assertEqual(get_dashboard_snapshot()["active_loans"], 1)
+
+
+class LoanCSVExportTests(ReportsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = User.objects.create_user("other", password="pw", role=User.Role.MEMBER)
+        now = timezone.now()
+        cls.loans = [
+            Loan.objects.create(
+                copy=copy,
+                borrower=borrower,
+                issued_at=now - timedelta(days=days),
+                due_at=now - timedelta(days=days - 14),
+                returned_at=now - timedelta(days=days - 3) if returned else None,
+            )
+            for copy, borrower, days, returned in (
+                (cls.copies[0], cls.member, 40, True),
+                (cls.copies[1], cls.other, 20, False),
+                (cls.copies[2], cls.member, 5, False),
+            )
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.librarian)
+
+    def export(self, **params):
+        response = self.client.get(reverse("reports:loan-export"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response
+
+    def rows(self, content):
+        header, *rows = csv.reader(io.StringIO(content.decode("utf-8")))
+        self.assertEqual(header, ["Book", "Borrower", "Issued", "Due", "Returned", "Status", "Fine"])
+        return rows
+
+    def test_exports_every_loan_newest_first(self):
+        response = self.export()
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertRegex(response["Content-Disposition"], r"filename=loans_\d{8}_\d{6}\.csv$")
+        rows = self.rows(response.getvalue())
+        self.assertEqual(
+            [(row[0], row[1]) for row in rows], [("Cosmos", "member"), ("Dune", "other"), ("Dune", "member")]
+        )
+        self.assertEqual(rows[2][5], "Returned")
+        self.assertEqual(rows[0][4], "")
+
+    def test_filters(self):
+        today = timezone.localdate()
+
+        def usernames(**params):
+            return [row[1] for row in self.rows(self.export(**params).getvalue())]
+
+        self.assertEqual(usernames(borrower=self.member.pk), ["member", "member"])
+        self.assertEqual(usernames(status=Loan.Status.RETURNED), ["member"])
+        self.assertEqual(usernames(issued_from=today - timedelta(days=25)), ["member", "other"])
+        self.assertEqual(usernames(issued_to=today - timedelta(days=20)), ["other", "member"])
+        self.assertEqual(
+            usernames(issued_from=today - timedelta(days=20), issued_to=today - timedelta(days=20)), ["other"]
+        )
+
+    def test_invalid_filters_are_rejected(self):
+        today = timezone.localdate()
+        for params in (
+            {"issued_from": today, "issued_to": today - timedelta(days=1)},
+            {"status": "LOST"},
+            {"borrower": "0"},
+            {"issued_from": "yesterday"},
+            {"compress": "zip"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(reverse("reports:loan-export"), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response["Content-Type"], "text/plain")
+
+    def test_gzip_output_decompresses_to_the_same_csv(self):
+        plain = self.export().getvalue()
+
+        response = self.export(compress="gzip")
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertTrue(response["Content-Disposition"].endswith(".csv.gz"))
+        self.assertEqual(gzip.decompress(response.getvalue()), plain)
+
+    def test_members_cannot_export(self):
+        self.client.force_login(self.member)
+
+        response = self.client.get(reverse("reports:loan-export"))
+
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+        self.assertNotEqual(response.status_code, 200)
+
+
+class DatasetExportTests(ReportsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Book.objects.filter(pk=cls.dune.pk).update(tags=["classic", "desert"])
+        now = timezone.now()
+        loans = [
+            Loan.objects.create(
+                copy=copy, borrower=cls.member, issued_at=now - timedelta(days=20), due_at=now - timedelta(days=6)
+            )
+            for copy in cls.copies[:3]
+        ]
+        loans[0].mark_returned(now - timedelta(days=2))
+        Fine.objects.create(member=cls.member, loan=loans[0], amount=Decimal("2.50"))
+        Fine.objects.create(member=cls.member, loan=loans[1], amount=Decimal("1.00"), is_paid=True, paid_at=now)
+        Reservation.objects.create(book=cls.cosmos, member=cls.librarian)
+
+    def collect(self, name, file_format, compression=None):
+        # A batch size of 2 spreads every dataset over several record batches.
+        return b"".join(exports.stream_export(exports.DATASETS[name], file_format, compression, batch_size=2))
+
+    def jsonl_rows(self, data):
+        return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+    @unittest.skipIf(exports.pa is None, "pyarrow is not installed")
+    def test_columnar_exports_round_trip_with_typed_columns(self):
+        pa, pq = exports.pa, exports.pq
+        for name, dataset in exports.DATASETS.items():
+            expected = dataset.queryset().count()
+            schema = exports.arrow_schema(dataset)
+            with self.subTest(dataset=name, format="parquet"):
+                table = pq.read_table(io.BytesIO(self.collect(name, "parquet")))
+                self.assertEqual(table.schema, schema)
+                self.assertEqual(table.num_rows, expected)
+                self.assertEqual(table.column("id").to_pylist(), sorted(table.column("id").to_pylist()))
+            with self.subTest(dataset=name, format="arrow"):
+                table = pa.ipc.open_file(pa.BufferReader(self.collect(name, "arrow"))).read_all()
+                self.assertEqual(table.schema, schema)
+                self.assertEqual(table.num_rows, expected)
+
+        fines = pq.read_table(io.BytesIO(self.collect("fines", "parquet"))).to_pylist()
+        self.assertEqual([row["amount"] for row in fines], [Decimal("2.50"), Decimal("1.00")])
+        self.assertEqual(fines[1]["paid_at"].utcoffset(), timedelta(0))
+        books = pq.read_table(io.BytesIO(self.collect("books", "parquet"))).to_pylist()
+        self.assertEqual(json.loads(books[0]["tags"]), ["classic", "desert"])
+        self.assertIsNone(books[0]["publication_date"])
+
+    def test_jsonl_rows_match_the_table(self):
+        rows = self.jsonl_rows(self.collect("loans", "jsonl"))
+
+        self.assertEqual([row["id"] for row in rows], list(Loan.objects.order_by("pk").values_list("pk", flat=True)))
+        self.assertEqual(rows[0]["status"], Loan.Status.RETURNED)
+        self.assertEqual(rows[0]["book_title"], "Dune")
+        self.assertEqual(rows[0]["fine_accrued"], "0.00")
+        self.assertIsNone(rows[1]["returned_at"])
+
+    def test_compressed_jsonl_decompresses_to_the_same_rows(self):
+        plain = self.collect("loans", "jsonl")
+
+        self.assertEqual(gzip.decompress(self.collect("loans", "jsonl", "gzip")), plain)
+        if exports.zstandard is not None:
+            compressed = self.collect("loans", "jsonl", "zstd")
+            self.assertEqual(exports.zstandard.ZstdDecompressor().decompressobj().decompress(compressed), plain)
+
+    def test_missing_optional_packages_are_reported(self):
+        with mock.patch.object(exports, "pa", None), self.assertRaises(exports.ExportUnavailable):
+            self.collect("loans", "parquet")
+        with mock.patch.object(exports, "zstandard", None), self.assertRaises(exports.ExportUnavailable):
+            self.collect("loans", "jsonl", "zstd")
+
+    def test_command_writes_the_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output = Path(directory.name) / "fines.jsonl.gz"
+
+        out = StringIO()
+        call_command("export_data", "fines", "--format", "jsonl", "--compress", "gzip", "--output", output, stdout=out)
+
+        self.assertIn("Wrote fines to", out.getvalue())
+        self.assertEqual(len(self.jsonl_rows(gzip.decompress(output.read_bytes()))), 2)
+        with self.assertRaisesMessage(CommandError, "--compress only applies"):
+            call_command("export_data", "fines", "--format", "parquet", "--compress", "gzip")
+        with self.assertRaisesMessage(CommandError, "--batch-size"):
+            call_command("export_data", "fines", "--format", "jsonl", "--batch-size", "0")
+
+    def test_download_view(self):
+        self.client.force_login(self.librarian)
+        url = reverse("reports:dataset-export", args=["reservations"])
+
+        response = self.client.get(url, {"format": "jsonl", "compress": "gzip"})
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertEqual(len(self.jsonl_rows(gzip.decompress(response.getvalue()))), 1)
+        self.assertEqual(self.client.get(url, {"format": "csv"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"format": "parquet", "compress": "gzip"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("reports:dataset-export", args=["users"])).status_code, 404)
+
+
+class RollupRefreshTests(ReportsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+
+    def loan(self, copy, issued, due, returned=None):
+        return Loan.objects.create(
+            copy=copy,
+            borrower=self.member,
+            issued_at=self.now - timedelta(days=issued),
+            due_at=self.now - timedelta(days=due),
+            returned_at=self.now - timedelta(days=returned) if returned is not None else None,
+        )
+
+    def rollup_rows(self):
+        return list(
+            DailyCirculation.objects.order_by("day", "category", "language").values_list(
+                "day", "category", "language", "issues", "returns", "overdue", "fines_issued", "fines_amount"
+            )
+        )
+
+    def test_incremental_refresh_matches_full_rebuild(self):
+        open_loan = self.loan(self.copies[0], issued=40, due=26)
+        returned = self.loan(self.copies[1], issued=60, due=46, returned=50)
+        edited = self.loan(self.copies[2], issued=35, due=21, returned=20)
+        fined = self.loan(self.copies[3], issued=45, due=31)
+        self.loan(BookCopy.objects.create(book=self.cosmos, barcode="batch"), issued=30, due=16)
+        fine = Fine.objects.create(member=self.member, loan=fined, amount=Decimal("1.00"))
+        Fine.objects.filter(pk=fine.pk).update(issued_at=self.now - timedelta(days=25))
+        refresh_daily_rollups(full=True)
+        before = self.rollup_rows()
+
+        # Every change below lands on days long before the watermark.
+        open_loan.returned_at = self.now - timedelta(days=28)  # back-dated, before it fell due
+        open_loan.save()
+        edited.due_at = self.now - timedelta(days=19)
+        edited.save()
+        returned.delete()
+        accrue_fines(sync_fines=True)  # re-bills the old fine with the accrued amount
+        return_batch(["batch"], returned_at=self.now - timedelta(days=18))
+        fine.refresh_from_db()
+        self.assertNotEqual(fine.amount, Decimal("1.00"))
+
+        result = refresh_daily_rollups()
+        incremental = self.rollup_rows()
+        self.assertFalse(DirtyRollupDay.objects.exists())
+        self.assertLess(result.days, 40)
+        refresh_daily_rollups(full=True)
+
+        self.assertNotEqual(incremental, before)
+        self.assertEqual(incremental, self.rollup_rows())
+
+    def test_refresh_without_changes_only_recomputes_today(self):
+        self.loan(self.copies[0], issued=10, due=3)
+        refresh_daily_rollups(full=True)
+
+        result = refresh_daily_rollups()
+
+        self.assertEqual(result.days, 1)
+        self.assertEqual(result.first_day, timezone.localdate())
+
+    def test_saves_that_do_not_move_dates_mark_nothing(self):
+        loan = self.loan(self.copies[0], issued=10, due=3)
+        refresh_daily_rollups(full=True)
+
+        loan.calculate_overdue_fine()
+
+        self.assertFalse(DirtyRollupDay.objects.exists())
+
+
+@unittest.skipUnless(analytics_available(), "numpy is not installed")
+class CollectionSummaryTests(ReportsTestCase):
+    def dashboard_context(self):
+        request = RequestFactory().get(reverse("reports:dashboard"))
+        request.user = self.librarian
+        return DashboardView.as_view()(request).context_data
+
+    def test_dashboard_does_not_compute_on_a_miss(self):
+        context = self.dashboard_context()
+
+        self.assertIsNone(context["collection"])
+        self.assertTrue(context["collection_available"])
+        self.assertFalse(CollectionSummary.objects.exists())
+
+    def test_command_stores_summary_for_the_dashboard(self):
+        Loan.objects.create(
+            copy=self.copies[0],
+            borrower=self.member,
+            issued_at=timezone.now() - timedelta(days=3),
+        )
+
+        call_command("refresh_collection_summary", stdout=StringIO())
+        call_command("refresh_collection_summary", "--window-days", "30", stdout=StringIO())
+
+        self.assertEqual(CollectionSummary.objects.count(), 1)
+        summary = self.dashboard_context()["collection"]
+        self.assertEqual(summary["window_days"], 30)
+        self.assertEqual(summary["titles"], 2)
+        self.assertEqual(summary["never_borrowed"], 1)
+        self.assertIsInstance(summary["computed_at"], type(timezone.now()))
+        self.assertEqual(get_collection_summary(), summary)
+
+    def test_recompute_button_queues_a_job(self):
+        self.client.force_login(self.librarian)
+
+        response = self.client.post(reverse("reports:collection-refresh"))
+
+        job = Job.objects.get()
+        self.assertEqual(job.kind, "reports.collection_summary")
+        self.assertRedirects(response, reverse("jobs:detail", args=[job.pk]), fetch_redirect_response=False)
+
+    def test_members_cannot_queue_a_refresh(self):
+        self.client.force_login(self.member)
+
+        self.client.post(reverse("reports:collection-refresh"))
+
+        self.assertFalse(Job.objects.exists())
+
+
+class TimeSeriesTests(ReportsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        # Loans every few days across three months, on books in two categories; some returned.
+        for index, days in enumerate(range(2, 95, 4)):
+            Loan.objects.create(
+                copy=BookCopy.objects.create(book=(cls.dune, cls.cosmos)[index % 2], barcode=f"TS{index}"),
+                borrower=cls.member,
+                issued_at=now - timedelta(days=days),
+                due_at=now - timedelta(days=days - 14),
+                returned_at=now - timedelta(days=days - 3) if index % 3 else None,
+            )
+        refresh_daily_rollups(full=True)
+
+    def raw_counts(self, interval, field, start, end, category=None):
+        loans = Loan.objects.exclude(**{f"{field}__isnull": True})
+        if category:
+            loans = loans.filter(copy__book__category__slug=category)
+        counts = {}
+        for moment in loans.values_list(field, flat=True):
+            day = timezone.localdate(moment)
+            if start <= day <= end:
+                period = bucket_start(day, interval).isoformat()
+                counts[period] = counts.get(period, 0) + 1
+        return counts
+
+    def test_buckets_match_raw_loan_counts(self):
+        end = timezone.localdate()
+        start = end - timedelta(days=100)
+        for interval in ("day", "week", "month"):
+            for category in (None, self.science.slug):
+                with self.subTest(interval=interval, category=category):
+                    series = build_timeseries(interval, start, end, category=category)
+                    first = bucket_start(start, interval)
+                    for metric, field in (("issues", "issued_at"), ("returns", "returned_at")):
+                        found = {row["period"]: row[metric] for row in series["buckets"] if row[metric]}
+                        self.assertEqual(found, self.raw_counts(interval, field, first, end, category))
+                    periods = [row["period"] for row in series["buckets"]]
+                    self.assertEqual(periods[0], first.isoformat())
+                    self.assertEqual(len(periods), len(set(periods)))
+
+    def test_weeks_start_on_monday_and_months_on_the_first(self):
+        end = timezone.localdate()
+        weeks = build_timeseries("week", end - timedelta(days=30), end)["buckets"]
+        months = build_timeseries("month", end - timedelta(days=90), end)["buckets"]
+
+        self.assertTrue(all(date.fromisoformat(row["period"]).weekday() == 0 for row in weeks))
+        self.assertTrue(all(row["period"].endswith("-01") for row in months))
+
+    def test_rollup_refresh_retires_cached_series(self):
+        end = timezone.localdate()
+        params = {"interval": "day", "start": end - timedelta(days=3), "end": end, "category": None, "language": None}
+        cached = get_timeseries(**params)
+        Loan.objects.create(copy=self.copies[3], borrower=self.member)
+
+        self.assertEqual(get_timeseries(**params), cached)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_daily_rollups()
+
+        fresh = get_timeseries(**params)
+        self.assertEqual(fresh["buckets"][-1]["issues"], cached["buckets"][-1]["issues"] + 1)
+
+    def test_view_validates_its_parameters(self):
+        self.client.force_login(self.librarian)
+        url = reverse("reports:timeseries")
+
+        response = self.client.get(url, {"interval": "month", "category": self.fiction.slug})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["category"], self.fiction.slug)
+        self.assertEqual(self.client.get(url, {"interval": "hour"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"start": "2024-02-01", "end": "2024-01-01"}).status_code, 400)
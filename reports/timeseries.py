@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import time
+from decimal import Decimal
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import DailyCirculation, RollupWatermark
+
+
+INTERVALS = ("day", "week", "month")
+METRICS = ("issues", "returns", "overdue", "fines_issued", "fines_amount")
+VERSION_KEY = "reports:timeseries-version"
+
+_BUCKETS = {
+	"day": F("day"),
+	"week": TruncWeek("day"),
+	"month": TruncMonth("day"),
+}
+
+
+def bucket_start(day: datetime.date, interval: str) -> datetime.date:
+	if interval == "week":
+		return day - datetime.timedelta(days=day.weekday())
+	if interval == "month":
+		return day.replace(day=1)
+	return day
+
+
+def _next_bucket(start: datetime.date, interval: str) -> datetime.date:
+	if interval == "week":
+		return start + datetime.timedelta(weeks=1)
+	if interval == "month":
+		return (start + datetime.timedelta(days=32)).replace(day=1)
+	return start + datetime.timedelta(days=1)
+
+
+def _as_date(value) -> datetime.date:
+	# TruncWeek/TruncMonth on a DateField already yield dates; be lenient with backends
+	# that hand back a datetime.
+	return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def build_timeseries(
+	interval: str,
+	start: datetime.date,
+	end: datetime.date,
+	category: Optional[str] = None,
+	language: Optional[str] = None,
+) -> dict[str, Any]:
+	"""Bucket the daily rollups between ``start`` and ``end`` (inclusive) in one grouped query.
+
+	Issues, returns and fines are dated by ``Loan.issued_at``, ``Loan.returned_at`` and
+	``Fine.issued_at`` respectively. ``start`` is moved back to the start of its bucket
+	so the first bucket is complete; buckets without activity are filled with zeros.
+	"""
+
+	start = bucket_start(start, interval)
+	rows = DailyCirculation.objects.filter(day__gte=start, day__lte=end)
+	if category:
+		rows = rows.filter(category__slug=category)
+	if language:
+		rows = rows.filter(language=language)
+	grouped = (
+		rows.values(period=_BUCKETS[interval])
+		.annotate(**{metric: Sum(metric) for metric in METRICS})
+		.order_by("period")
+	)
+	found = {_as_date(row.pop("period")): row for row in grouped}
+
+	buckets = []
+	period = start
+	while period <= end:
+		row = found.get(period, {})
+		buckets.append(
+			{
+				"period": period.isoformat(),
+				**{metric: row.get(metric) or 0 for metric in METRICS if metric != "fines_amount"},
+				"fines_amount": str(Decimal(row.get("fines_amount") or 0).quantize(Decimal("0.01"))),
+			}
+		)
+		period = _next_bucket(period, interval)
+
+	as_of = RollupWatermark.objects.filter(name=RollupWatermark.DAILY_CIRCULATION).values_list("value", flat=True).first()
+	return {
+		"interval": interval,
+		"start": start.isoformat(),
+		"end": end.isoformat(),
+		"category": category or None,
+		"language": language or None,
+		"as_of": as_of.isoformat() if as_of else None,
+		"buckets": buckets,
+	}
+
+
+def _cache_key(params: dict[str, Any]) -> str:
+	# The version changes on every rollup refresh (or if it is evicted), so stale
+	# entries are simply never read again.
+	version = cache.get_or_set(VERSION_KEY, time.time_ns, None)
+	digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+	return f"reports:timeseries:{version}:{digest}"
+
+
+def get_timeseries(**params: Any) -> dict[str, Any]:
+	"""Return the cached series for this exact parameter set, building it when missing."""
+
+	key = _cache_key(params)
+	series = cache.get(key)
+	if series is None:
+		series = build_timeseries(**params)
+		cache.set(key, series, settings.TIMESERIES_CACHE_TIMEOUT)
+	return series
+
+
+def invalidate_timeseries() -> None:
+	"""Retire every cached series once the current transaction commits."""
+
+	transaction.on_commit(lambda: cache.set(VERSION_KEY, time.time_ns(), None))
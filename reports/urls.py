@@ -7,4 +7,8 @@ app_name = "reports"
 urlpatterns = [
     path("dashboard/", views.DashboardView.as_view(), name="dashboard"),
     path("loans/export/", views.LoanCSVExportView.as_view(), name="loan-export"),
+    path("exports/<slug:dataset>/", views.DatasetExportView.as_view(), name="dataset-export"),
+    path("collection/refresh/", views.CollectionSummaryRefreshView.as_view(), name="collection-refresh"),
+    path("collection/<slug:report>/", views.CollectionReportView.as_view(), name="collection-report"),
+    path("api/timeseries/", views.TimeSeriesView.as_view(), name="timeseries"),
 ]
@@ -1,17 +1,45 @@
 from __future__ import annotations
 
-import csv
-from datetime import datetime
-
-from django.db.models import Count
-from django.http import HttpRequest, HttpResponse
+from django.contrib import messages
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect
 from django.utils import timezone
 from django.views.generic import TemplateView, View
 
 from accounts.models import User
 from accounts.permissions import RoleRequiredMixin
-from catalog.models import Book
-from circulation.models import Fine, Loan, Reservation
+from circulation.models import Loan
+from jobs.registry import enqueue
+
+from .analytics import (
+	REPORT_COLUMNS,
+	REPORT_FORMATS,
+	REPORTS,
+	AnalyticsUnavailable,
+	analytics_available,
+	check_analytics_available,
+	compute_collection_metrics,
+	get_collection_summary,
+	report_csv_rows,
+	report_indices,
+	report_parquet,
+)
+from .exports import (
+	DATASETS,
+	EXPORT_FORMATS,
+	JSONL_COMPRESSIONS,
+	LOAN_CSV_HEADER,
+	ExportUnavailable,
+	check_available,
+	file_extension,
+	gzip_stream,
+	loan_csv_rows,
+	stream_csv,
+	stream_export,
+)
+from .forms import LoanExportFilterForm, TimeSeriesFilterForm
+from .snapshot import get_dashboard_snapshot
+from .timeseries import get_timeseries
 
 
 class DashboardView(RoleRequiredMixin, TemplateView):
@@ -20,47 +48,176 @@ class DashboardView(RoleRequiredMixin, TemplateView):
 
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
-		context.update(
-			{
-				"total_books": Book.objects.count(),
-				"total_members": User.objects.filter(role=User.Role.MEMBER).count(),
-				"active_loans": Loan.objects.filter(returned_at__isnull=True).count(),
-				"overdue_loans": Loan.objects.filter(status=Loan.Status.OVERDUE).count(),
-				"reservations": Reservation.objects.filter(status=Reservation.Status.PENDING).count(),
-				"outstanding_fines": Fine.objects.filter(is_paid=False).count(),
-				"recent_loans": Loan.objects.select_related("copy__book", "borrower")[:5],
-				"top_categories": self._top_categories(),
-			}
-		)
+		context.update(get_dashboard_snapshot())
+		context["export_form"] = LoanExportFilterForm()
+		context["export_datasets"] = list(DATASETS)
+		context["collection"] = get_collection_summary()
+		context["collection_available"] = analytics_available()
 		return context
 
-	def _top_categories(self):
-		return (
-			Book.objects.values("category__name")
-			.annotate(total=Count("id"))
-			.order_by("-total")[:5]
-		)
+
+class QueueJobMixin:
+	"""POSTing to an export view queues the same export as a background job."""
+
+	job_kind: str
+
+	def enqueue(self, request: HttpRequest, params: dict) -> HttpResponse:
+		job = enqueue(self.job_kind, params, user=request.user)
+		messages.success(request, f"{job.label} queued. This page updates when the file is ready.")
+		return redirect("jobs:detail", pk=job.pk)
 
 
-class LoanCSVExportView(RoleRequiredMixin, View):
+class LoanCSVExportView(RoleRequiredMixin, QueueJobMixin, View):
 	required_roles = (User.Role.ADMIN, User.Role.LIBRARIAN)
+	job_kind = "reports.loan_csv"
 
 	def get(self, request: HttpRequest) -> HttpResponse:
-		response = HttpResponse(content_type="text/csv")
-		filename = f"loans_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
+		form = LoanExportFilterForm(request.GET)
+		if not form.is_valid():
+			return HttpResponseBadRequest(form.errors.as_text(), content_type="text/plain")
+		return self.stream(form)
+
+	def post(self, request: HttpRequest) -> HttpResponse:
+		form = LoanExportFilterForm(request.POST)
+		if not form.is_valid():
+			return HttpResponseBadRequest(form.errors.as_text(), content_type="text/plain")
+		if request.POST.get("mode") == "download":
+			return self.stream(form)
+		# Keep the raw values; the job validates them again with the same form.
+		filters = {name: request.POST.get(name, "") for name in form.fields}
+		return self.enqueue(request, {"filters": filters})
+
+	def stream(self, form: LoanExportFilterForm) -> HttpResponse:
+		rows = loan_csv_rows(form.filter_queryset(Loan.objects.all()))
+		chunks = stream_csv(LOAN_CSV_HEADER, rows)
+		filename = f"loans_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
+		if form.cleaned_data.get("compress") == "gzip":
+			response = StreamingHttpResponse(gzip_stream(chunks), content_type="application/gzip")
+			filename += ".gz"
+		else:
+			response = StreamingHttpResponse(chunks, content_type="text/csv")
 		response["Content-Disposition"] = f"attachment; filename={filename}"
-		writer = csv.writer(response)
-		writer.writerow(["Book", "Borrower", "Issued", "Due", "Returned", "Status", "Fine"])
-		for loan in Loan.objects.select_related("copy__book", "borrower"):
-			writer.writerow(
-				[
-					loan.copy.book.title,
-					loan.borrower.username,
-					loan.issued_at.strftime("%Y-%m-%d"),
-					loan.due_at.strftime("%Y-%m-%d"),
-					loan.returned_at.strftime("%Y-%m-%d") if loan.returned_at else "",
-					loan.get_status_display(),
-					loan.fine_accrued,
-				]
+		return response
+
+
+class DatasetExportView(RoleRequiredMixin, QueueJobMixin, View):
+	"""Download loans, fines, reservations or books as Parquet, Arrow or JSON Lines."""
+
+	required_roles = (User.Role.ADMIN, User.Role.LIBRARIAN)
+	job_kind = "reports.dataset"
+	content_types = {
+		"parquet": "application/vnd.apache.parquet",
+		"arrow": "application/vnd.apache.arrow.file",
+		"jsonl": "application/x-ndjson",
+	}
+
+	def parse(self, request: HttpRequest, dataset: str):
+		"""Return ``(params, None)`` for a valid request or ``(None, error_response)``."""
+
+		if dataset not in DATASETS:
+			raise Http404("Unknown dataset.")
+		file_format = request.GET.get("format", "parquet")
+		compression = request.GET.get("compress") or None
+		if file_format not in EXPORT_FORMATS:
+			return None, HttpResponseBadRequest(f"format must be one of: {', '.join(EXPORT_FORMATS)}.")
+		if compression and (file_format != "jsonl" or compression not in JSONL_COMPRESSIONS):
+			return None, HttpResponseBadRequest(f"compress applies to jsonl only: {', '.join(JSONL_COMPRESSIONS)}.")
+		try:
+			check_available(file_format, compression)
+		except ExportUnavailable as exc:
+			return None, HttpResponse(str(exc), status=501, content_type="text/plain")
+		return {"dataset": dataset, "format": file_format, "compress": compression}, None
+
+	def get(self, request: HttpRequest, dataset: str) -> HttpResponse:
+		params, error = self.parse(request, dataset)
+		if error:
+			return error
+		file_format, compression = params["format"], params["compress"]
+		content_type = self.content_types[file_format]
+		if compression:
+			content_type = {"gzip": "application/gzip", "zstd": "application/zstd"}[compression]
+		response = StreamingHttpResponse(stream_export(DATASETS[dataset], file_format, compression), content_type=content_type)
+		filename = f"{dataset}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{file_extension(file_format, compression)}"
+		response["Content-Disposition"] = f"attachment; filename={filename}"
+		return response
+
+	def post(self, request: HttpRequest, dataset: str) -> HttpResponse:
+		params, error = self.parse(request, dataset)
+		return error or self.enqueue(request, params)
+
+
+class CollectionReportView(RoleRequiredMixin, QueueJobMixin, View):
+	"""Per-title utilisation, buy-more and weeding lists as CSV or Parquet."""
+
+	required_roles = (User.Role.ADMIN, User.Role.LIBRARIAN)
+	job_kind = "reports.collection"
+
+	def parse(self, request: HttpRequest, report: str):
+		"""Return ``(params, None)`` for a valid request or ``(None, error_response)``."""
+
+		if report not in REPORTS:
+			raise Http404("Unknown report.")
+		file_format = request.GET.get("format", "csv")
+		if file_format not in REPORT_FORMATS:
+			return None, HttpResponseBadRequest(f"format must be one of: {', '.join(REPORT_FORMATS)}.")
+		try:
+			window_days = int(request.GET.get("window_days", 365))
+			limit = int(request.GET["limit"]) if request.GET.get("limit") else None
+		except ValueError:
+			return None, HttpResponseBadRequest("window_days and limit must be whole numbers.")
+		if window_days < 1 or (limit is not None and limit < 1):
+			return None, HttpResponseBadRequest("window_days and limit must be positive.")
+		try:
+			check_analytics_available()
+			if file_format == "parquet":
+				check_available("parquet")
+		except (AnalyticsUnavailable, ExportUnavailable) as exc:
+			return None, HttpResponse(str(exc), status=501, content_type="text/plain")
+		return {"report": report, "format": file_format, "window_days": window_days, "limit": limit}, None
+
+	def get(self, request: HttpRequest, report: str) -> HttpResponse:
+		params, error = self.parse(request, report)
+		if error:
+			return error
+		metrics = compute_collection_metrics(window_days=params["window_days"])
+		indices = report_indices(metrics, report, params["limit"])
+		filename = f"{report}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{params['format']}"
+		if params["format"] == "parquet":
+			response = HttpResponse(report_parquet(metrics, indices), content_type="application/vnd.apache.parquet")
+		else:
+			response = StreamingHttpResponse(
+				stream_csv(REPORT_COLUMNS, report_csv_rows(metrics, indices)),
+				content_type="text/csv",
 			)
+		response["Content-Disposition"] = f"attachment; filename={filename}"
 		return response
+
+	def post(self, request: HttpRequest, report: str) -> HttpResponse:
+		params, error = self.parse(request, report)
+		return error or self.enqueue(request, params)
+
+
+class CollectionSummaryRefreshView(RoleRequiredMixin, QueueJobMixin, View):
+	"""Queue a recomputation of the dashboard's collection summary."""
+
+	required_roles = (User.Role.ADMIN, User.Role.LIBRARIAN)
+	job_kind = "reports.collection_summary"
+
+	def post(self, request: HttpRequest) -> HttpResponse:
+		try:
+			check_analytics_available()
+		except AnalyticsUnavailable as exc:
+			return HttpResponse(str(exc), status=501, content_type="text/plain")
+		return self.enqueue(request, {})
+
+
+class TimeSeriesView(RoleRequiredMixin, View):
+	"""Checkouts, returns, overdue loans and fines per day, week or month as JSON."""
+
+	required_roles = (User.Role.ADMIN, User.Role.LIBRARIAN)
+
+	def get(self, request: HttpRequest) -> HttpResponse:
+		form = TimeSeriesFilterForm(request.GET)
+		if not form.is_valid():
+			return JsonResponse({"errors": form.errors.get_json_data()}, status=400)
+		return JsonResponse(get_timeseries(**form.series_params()))